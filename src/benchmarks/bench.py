@@ -0,0 +1,368 @@
+"""Headless benchmarks for the telemetry, parse, render and apply hot paths.
+
+Run from src/:
+
+    python -m benchmarks.bench --output before.json
+    python -m benchmarks.bench --compare before.json
+
+Everything runs against tools.simulator / tools.fakeadj, no AMD hardware or
+window is needed. Results are JSON: one entry per benchmark with timings in
+microseconds (or bytes for the memory run), plus the commit they came from.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from tools.telemetry import DumpTableBackend, LibRyzenAdjBackend, parse_dump_table
+from tools.fakeadj import FakeRyzenAdjLib, dump_table_text
+from tools.simulator import SimulatedRyzenAdjLib
+from tools.pmtable import PMTableSnapshot, SnapshotRing
+from tools.layouts import REGISTRY
+from tools.recorder import Recorder
+from tools.apply import ApplyPipeline
+from tools.heatmap import CoreRing
+from tools.derived import DerivedEngine
+from tools.processes import ProcessTracker
+
+
+def measure(fn, repeat, warmup=5):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'n': repeat,
+        'mean_us': sum(samples) / repeat,
+        'p50_us': samples[repeat // 2],
+        'p95_us': samples[min(repeat - 1, int(repeat * 0.95))],
+        'min_us': samples[0],
+    }
+
+
+def bench_parse(repeat):
+    lib = SimulatedRyzenAdjLib(step=1.0)
+    lib.advance(60)
+    text = dump_table_text(lib)
+    snapshot = PMTableSnapshot(lib.table_size, REGISTRY.for_version(lib.table_version, lib.table_size))
+    return measure(lambda: parse_dump_table(text, snapshot), repeat)
+
+
+def sim_backend():
+    backend = LibRyzenAdjBackend(lib=SimulatedRyzenAdjLib(step=1.0))
+    backend.name = 'simulator'
+    return backend
+
+
+def refresh_timer(backend, repeat):
+    backend.open()
+    ring = SnapshotRing()
+
+    def refresh():
+        slot = ring.acquire(backend.table_size, backend.table_version)
+        with backend.lock:
+            backend.read_into(slot)
+        ring.publish(slot)
+    try:
+        return measure(refresh, repeat)
+    finally:
+        backend.close()
+
+
+def bench_refresh(repeat, tmp):
+    results = {}
+    fake = LibRyzenAdjBackend(lib=FakeRyzenAdjLib())
+    results['fake'] = refresh_timer(fake, repeat)
+    results['simulator'] = refresh_timer(sim_backend(), repeat)
+
+    # Record a few minutes of simulated data to replay
+    from tools.recorder import ReplayBackend
+    path = os.path.join(tmp, 'bench.brr')
+    backend = sim_backend()
+    backend.open()
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    recorder = Recorder(path, backend.table_size, backend.table_version)
+    for i in range(600):
+        backend.read_into(snapshot)
+        recorder.append(snapshot, timestamp=1000.0 + i)
+    recorder.close()
+    results['replay'] = refresh_timer(ReplayBackend(path, speed=1000), repeat)
+
+    # The subprocess fallback is slow, keep the sample count small
+    dump = DumpTableBackend([sys.executable, '-m', 'tools.simulator'])
+    results['ryzenadj.exe'] = refresh_timer(dump, max(5, repeat // 50))
+    return results
+
+
+def make_ui_state(tmp):
+    """main.AppState on the simulator with the sampler thread stopped.
+
+    Default settings, and every file the app would write (settings, snapshot
+    cache, recordings, diagnostics) goes to `tmp`, not the user's copies.
+    """
+    import configparser
+    import pyglet
+    pyglet.options['shadow_window'] = False
+    import imgui
+    import main
+
+    main.config = configparser.ConfigParser()
+    main.config.read_dict({'Settings': dict(main.DEFAULT_SETTINGS, telemetry_backend='simulator')})
+    main.CONFIG_PATH = os.path.join(tmp, 'settings.ini')
+    main.CACHE_DIR = os.path.join(tmp, 'cache')
+    main.SNAPSHOT_CACHE = os.path.join(main.CACHE_DIR, 'last_snapshot.bin')
+    main.RECORDINGS_DIR = os.path.join(tmp, 'recordings')
+    main.DIAGNOSTICS_DIR = os.path.join(tmp, 'diagnostics')
+    state = main.AppState()
+    state.sampler.stop()
+    state.backend = None
+    backend = state.get_backend()
+    backend.lib.step = 1.0
+    # Six hours of history at 1 s, on a synthetic clock ending now
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    start = time.monotonic() - 6 * 3600
+    for i in range(6 * 3600):
+        backend.read_into(snapshot)
+        snapshot.timestamp = start + i
+        state.history.record_snapshot(snapshot)
+        state.record_derived(snapshot)
+        state.history.append('cpu', (i % 120) * 0.8, start + i)
+    state.read_metrics()
+    main.state = state
+
+    imgui.create_context()
+    io = imgui.get_io()
+    io.ini_file_name = None  # no imgui.ini in the working directory
+    io.display_size = 1000, 600
+    io.delta_time = 1 / 60
+    io.fonts.get_tex_data_as_rgba32()
+    return main, imgui
+
+
+def bench_render(repeat, tmp):
+    main, imgui = make_ui_state(tmp)
+    results = {}
+
+    def frame(render):
+        imgui.new_frame()
+        imgui.begin('Content')
+        render()
+        imgui.end()
+        imgui.render()
+
+    for page, render in (('monitor', main.render_monitor), ('adjust', main.render_adjust),
+                         ('explorer', main.render_explorer)):
+        main.state.page = page
+        results[page] = measure(lambda: frame(render), repeat)
+
+    # A table far larger than any real one, with a new snapshot every frame:
+    # the explorer draws the rows in view, not the whole table
+    live = main.state.snapshot
+    big = PMTableSnapshot(4096)
+    main.state.page = 'explorer'
+
+    def refresh_and_frame():
+        big.version += 1
+        main.state.snapshot = big
+        frame(main.render_explorer)
+    results['explorer 4096 entries'] = measure(refresh_and_frame, repeat)
+    main.state.snapshot = live
+
+    # Graph ranges with a new sample every frame, so no view is served from cache
+    main.state.page = 'monitor'
+    for index, (label, _) in enumerate(main.GRAPH_RANGES):
+        main.state.graph_range = index
+
+        def sample_and_frame():
+            main.state.sample_cpu()
+            frame(main.render_monitor)
+        results['monitor ' + label] = measure(sample_and_frame, max(5, repeat // 5))
+    main.state.sampler.stop()
+    return results
+
+
+def bench_apply(repeat):
+    backend = sim_backend()
+    pipeline = ApplyPipeline(lambda: backend)
+    low = {'stapm': 15000, 'fast': 20000, 'slow': 15000, 'vrm': 40000, 'vrmsoc': 8000,
+           'edc': 60000, 'edcsoc': 10000, 'max-socclk': 1000, 'min-socclk': 400,
+           'max-gfxclk': 1800, 'min-gfxclk': 400, 'tctl-temp': 85,
+           'apu-skin-temp': 40, 'dgpu-skin-temp': 40}
+    high = {k: v + 1000 if v > 1000 else v + 5 for k, v in low.items()}
+    sets = [low, high]
+    counter = [0]
+
+    def apply():
+        counter[0] += 1
+        pipeline.apply(sets[counter[0] % 2])  # every field changes every time
+    return measure(apply, repeat)
+
+
+def bench_heatmap(repeat):
+    """One new per-core sample plus rasterizing the ring, per core count."""
+    results = {}
+    for cores in (8, 16, 32):
+        ring = CoreRing(cores, 240)
+        rows = [[(i * 7 + c * 13) % 100 for c in range(cores)] for i in range(240)]
+        for row in rows:
+            ring.append(row)
+        counter = [0]
+
+        def update():
+            counter[0] += 1
+            ring.append(rows[counter[0] % 240])
+            ring.rgba()
+        results[f'{cores} cores'] = measure(update, repeat)
+    return results
+
+
+def bench_derived(repeat):
+    """Every DERIVED metric for one simulated snapshot, after an hour of samples."""
+    backend = sim_backend()
+    backend.open()
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    engine = DerivedEngine()
+    for i in range(3600):
+        backend.read_into(snapshot)
+        snapshot.timestamp = float(i)
+        engine.update(snapshot)
+    counter = [3600]
+
+    def update():
+        counter[0] += 1
+        snapshot.timestamp = float(counter[0])
+        snapshot.decoded = None
+        engine.update(snapshot)
+    return {f'{len(engine.bound)} metrics': measure(update, repeat)}
+
+
+def bench_processes(repeat):
+    """One top-process refresh over the processes running on this machine."""
+    tracker = ProcessTracker()
+    tracker.refresh()
+    return {f'{len(tracker)} processes': measure(tracker.refresh, max(5, repeat // 10))}
+
+
+def bench_memory(iterations, tmp):
+    """Heap growth over a long sample + render run, after warm-up."""
+    main, imgui = make_ui_state(tmp)
+    main.state.page = 'monitor'
+
+    def tick():
+        main.state.read_metrics()
+        main.state.sample_cpu()
+        imgui.new_frame()
+        imgui.begin('Content')
+        main.render_monitor()
+        imgui.end()
+        imgui.render()
+
+    for _ in range(200):
+        tick()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        tick()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {'iterations': iterations, 'growth_bytes': growth,
+            'bytes_per_iteration': growth / iterations}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and not any(k.endswith(('_us', '_bytes')) for k in value):
+            yield from flatten(value, name + '.')
+        else:
+            yield name, value
+
+
+def compare(current, baseline):
+    old = dict(flatten(baseline['results']))
+    for name, value in flatten(current['results']):
+        metric = 'p50_us' if 'p50_us' in value else 'growth_bytes'
+        if name in old and metric in old[name] and old[name][metric]:
+            ratio = value[metric] / old[name][metric]
+            print(f"{name:<28} {old[name][metric]:>12.1f} -> {value[metric]:>12.1f} {metric}  x{ratio:.2f}")
+
+
+BENCHMARKS = ['parse', 'refresh', 'render', 'apply', 'heatmap', 'derived', 'processes', 'memory']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Better Ryzen Controller benchmarks')
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--memory-iterations', type=int, default=3000)
+    parser.add_argument('--only', nargs='*', choices=BENCHMARKS)
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--compare', help='Print the change against an earlier JSON result')
+    args = parser.parse_args(argv)
+
+    os.chdir(SRC)  # DumpTableBackend runs `python -m tools.simulator`
+    selected = set(args.only or BENCHMARKS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'parse' in selected:
+            results['parse'] = bench_parse(args.repeat)
+        if 'refresh' in selected:
+            results['refresh'] = bench_refresh(args.repeat, tmp)
+        if 'render' in selected:
+            results['render'] = bench_render(args.repeat, tmp)
+        if 'apply' in selected:
+            results['apply'] = bench_apply(args.repeat)
+        if 'heatmap' in selected:
+            results['heatmap'] = bench_heatmap(args.repeat)
+        if 'derived' in selected:
+            results['derived'] = bench_derived(args.repeat)
+        if 'processes' in selected:
+            results['processes'] = bench_processes(args.repeat)
+        if 'memory' in selected:
+            results['memory'] = bench_memory(args.memory_iterations, tmp)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
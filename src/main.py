@@ -1,13 +1,28 @@
+# Imported first: its import time is the start of the startup breakdown
+from tools.instrument import INSTRUMENTS, STARTUP
 import os
-import subprocess
-import threading
+from concurrent.futures import TimeoutError as CallTimeout
 import pyglet
 import imgui
 from imgui.integrations.pyglet import PygletRenderer
-import psutil
-from array import array
 import configparser
 from tools.ryzenadj import PARAMETERS as RA_PARAMS
+from tools.telemetry import open_backend, BACKENDS
+from tools.pmtable import SnapshotRing, save_snapshot, load_snapshot
+from tools.layouts import REGISTRY as LAYOUTS
+from tools.history import HistoryStore
+from tools.derived import DerivedEngine, DERIVED
+from tools.heatmap import CoreRing, HeatmapTexture
+from tools.processes import ProcessTracker
+from tools.tableview import TableView, format_value
+from tools.sampler import Sampler
+from tools.framepacer import FramePacer
+from tools.profiles import load_profile, save_profile, write_config, DEFAULT_PROFILE
+from tools.rules import RuleEngine, Context, compile_rules, power_source, foreground_process
+from tools import controller as thermal
+from tools.apply import ApplyPipeline, parse_values
+from tools.executor import SMUExecutor
+from tools.fonts import load_ui_font
 import ctypes
 import sys
 import time
@@ -18,20 +33,29 @@ def is_admin():
     except:
         return False
 
-if not is_admin():
-    script = os.path.abspath(sys.argv[0])
-    params = " ".join([f'"{arg}"' for arg in sys.argv[1:]])
-    ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, f'"{script}" {params}', None, 1)
-    sys.exit()
-
 # Configuration
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'settings.ini')
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), 'recordings')
+DIAGNOSTICS_DIR = os.path.join(os.path.dirname(__file__), 'diagnostics')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'cache')
+SNAPSHOT_CACHE = os.path.join(CACHE_DIR, 'last_snapshot.bin')
+GLYPH_CACHE = os.path.join(CACHE_DIR, 'glyphs.json')
+# Sources whose string literals decide the glyphs in the font atlas
+UI_SOURCES = [os.path.join(os.path.dirname(__file__), p)
+              for p in ('main.py', os.path.join('tools', 'tableview.py'))]
 DEFAULT_SETTINGS = {
     'start_with_system': 'False',
     'language': '0',
     'theme': '2',
     'ra_path': 'ryzenadj.exe',
-    'refresh_interval': '5'
+    'refresh_interval': '5',
+    'telemetry_backend': 'auto',
+    'replay_path': '',
+    'fps_cap': '60',
+    'on_demand_render': 'True',
+    'instrumentation': 'False',
+    'shared_memory': 'True',
+    'http_port': '0'
 }
 config = configparser.ConfigParser()
 config.read_dict({'Settings': DEFAULT_SETTINGS})
@@ -46,6 +70,17 @@ else:
 
 def str2bool(s): return s.lower() in ('1', 'true', 'yes', 'on')
 
+# Sampler cadence in seconds; the PM table follows refresh_interval
+CPU_INTERVAL = 0.25
+CLOCK_INTERVAL = 2.0
+# How often the last snapshot is written to SNAPSHOT_CACHE
+SNAPSHOT_SAVE_INTERVAL = 60.0
+RULES_INTERVAL = 1.0
+# Top processes: only measured while the Monitor page is shown or a rule uses `busy`
+PROCESS_INTERVAL = 2.0
+# Samples kept per core for the heatmaps: 1 min of load, 8 min of clocks
+HEATMAP_LENGTH = 240
+
 class AppState:
     def __init__(self):
         s = config['Settings']
@@ -55,100 +90,337 @@ class AppState:
         self.theme = int(s.get('theme', '2'))
         self.ra_path = s.get('ra_path', 'ryzenadj.exe')
         self.refresh_interval = int(s.get('refresh_interval', '5'))
-        self.cpu_history = []
-        self.ra_args = {}
-        self.metrics = {}
+        self.telemetry_backend = s.get('telemetry_backend', 'auto')
+        if self.telemetry_backend not in BACKENDS:
+            self.telemetry_backend = 'auto'
+        self.replay_path = s.get('replay_path', '')
+        self.recorder = None
+        self.record_requested = False
+        self.fps_cap = int(s.get('fps_cap', '60'))
+        self.on_demand_render = str2bool(s.get('on_demand_render', 'True'))
+        INSTRUMENTS.enabled = str2bool(s.get('instrumentation', 'False'))
+        # Snapshot export for other tools; applied at startup
+        self.shared_memory = str2bool(s.get('shared_memory', 'True'))
+        self.http_port = int(s.get('http_port', '0'))
+        self.publisher = None
+        self.http_server = None
+        self.diagnostics_export = None
+        self.backend = None
+        self.backend_key = None
+        self.history = HistoryStore()  # 1 s / 10 s / 1 min tiers, see tools.history
+        self.history.add_series('cpu')
+        self.derived = DerivedEngine()  # headroom, rolling averages, ... see tools.derived
+        self.core_load = None   # CoreRing, created with the first per-core sample
+        self.core_clock = None
+        self.graph_metric = 0
+        self.graph_range = 0
+        self.explorer_query = ''
+        self.explorer_named = False
+        self.explorer_nonzero = False
+        self.ra_args = {k: str(v) for k, v in load_profile(config).items()}
+        self.auto_apply = False
+        # Every backend call goes through this one worker, in order
+        self.executor = SMUExecutor()
+        self.pipeline = ApplyPipeline(self.get_backend, on_report=self.on_apply_report,
+                                      executor=self.executor)
+        self.pipeline_synced = False
+        self.snapshots = SnapshotRing()
+        # Shown until the first live refresh finishes
+        self.snapshot = load_snapshot(SNAPSHOT_CACHE)
+        self.snapshot_cached = self.snapshot is not None
+        self.snapshot_saved = 0.0
+        self.cpu_primed = False
         self.last_error = None
+        if LAYOUTS.errors:
+            self.last_error = "Invalid PM table layout: " + "; ".join(LAYOUTS.errors)
         self.last_update = 0
-        self.is_loading = False
+        self.sampler = Sampler(on_error=self.on_sample_error)
+        self.sampler.add_group('cpu', CPU_INTERVAL, self.sample_cpu)
+        self.sampler.add_group('clocks', CLOCK_INTERVAL, self.sample_clocks)
+        # SMU reads wait on the executor and process scans take milliseconds:
+        # on threads of their own, so they never hold up the CPU sampling
+        self.sampler.add_group('pm', self.refresh_interval, self.read_metrics, blocking=True)
+        self.processes = ProcessTracker()
+        self.sampler.add_group('processes', PROCESS_INTERVAL, self.sample_processes, blocking=True)
+        self.profile_name = DEFAULT_PROFILE
+        self.rules_enabled = True
+        try:
+            rules = compile_rules(config)
+        except ValueError as e:
+            rules = []
+            self.last_error = f"Invalid rule in settings.ini: {e}"
+        self.rules = RuleEngine(rules, on_switch=self.on_rule_switch) if rules else None
+        if self.rules:
+            self.sampler.add_group('rules', RULES_INTERVAL, self.evaluate_rules)
+        self.controller_settings = thermal.load_settings(config)
+        self.controller = None
+        self.controller_log = None
+
+    def get_backend(self):
+        key = (self.ra_path, self.telemetry_backend, self.replay_path)
+        if self.backend is None or self.backend_key != key:
+            if self.backend is not None:
+                self.backend.close()
+            self.backend = None
+            self.backend = open_backend(self.ra_path, self.telemetry_backend, self.replay_path)
+            self.backend_key = key
+        return self.backend
+
+    def sample_cpu(self):
+        import psutil  # deferred to the sampler thread, off the startup path
+        if not self.cpu_primed:
+            # The first call only starts the measurement
+            psutil.cpu_percent(None, percpu=True)
+            self.cpu_primed = True
+            return 0.0
+        # One call for every core; the total is their mean
+        loads = psutil.cpu_percent(None, percpu=True)
+        ring = self.core_load
+        if ring is None or ring.rows != len(loads):
+            ring = self.core_load = CoreRing(len(loads), HEATMAP_LENGTH, 0.0, 100.0)
+        ring.append(loads)
+        cpu = sum(loads) / len(loads)
+        self.history.append('cpu', cpu)
+        return cpu
+
+    def sample_clocks(self):
+        import psutil
+        freqs = psutil.cpu_freq(percpu=True)  # a single entry where per-core clocks are not exposed
+        if not freqs:
+            return float('nan')
+        current = [f.current for f in freqs]
+        top = max(max(f.max for f in freqs), max(current))
+        ring = self.core_clock
+        if ring is None or ring.rows != len(freqs):
+            ring = self.core_clock = CoreRing(len(freqs), HEATMAP_LENGTH, 0.0, top)
+        elif top > ring.hi:
+            ring.set_range(0.0, top)  # boosting past the reported max
+        ring.append(current)
+        return sum(current) / len(current)
+
+    def sample_processes(self):
+        if self.page != 'monitor' and not (self.rules and 'busy' in self.rules.needs):
+            self.processes.reset()  # the next refresh after a pause only primes
+            return None
+        return self.processes.refresh()
+
+    @property
+    def is_loading(self):
+        return self.executor.pending('refresh')
+
+    def read_metrics(self):
+        # Runs on the pm sampler worker; joins a refresh that is already queued
+        return self.executor.call(self.refresh_metrics, key='refresh')
+
+    def refresh_metrics(self):
+        # Runs on the executor thread
+        backend = self.get_backend()
+        slot = self.snapshots.acquire(backend.table_size, backend.table_version)
+        with INSTRUMENTS.span('telemetry.read'), backend.lock:
+            backend.read_into(slot)
+        with INSTRUMENTS.span('telemetry.publish'):
+            self.snapshot = self.snapshots.publish(slot)
+            if not self.pipeline_synced:
+                self.pipeline.sync()
+                self.pipeline_synced = True
+            self.history.record_snapshot(self.snapshot)
+            self.record_derived(self.snapshot)
+            self.update_recorder(self.snapshot)
+        self.last_error = None
+        self.last_update = self.snapshot.timestamp
+        self.publish_shared(self.snapshot)
+        self.snapshot_cached = False
+        STARTUP.once('first fetch')
+        if self.last_update - self.snapshot_saved >= SNAPSHOT_SAVE_INTERVAL:
+            self.save_snapshot()
+        return self.snapshot
+
+    def record_derived(self, snapshot):
+        t = snapshot.timestamp
+        for name, value in self.derived.update(snapshot):
+            self.history.append(name, value, t)
+
+    def start_exports(self):
+        if self.shared_memory:
+            from tools.shm import Publisher
+            self.publisher = Publisher()
+        if self.http_port:
+            from tools.shm import make_server
+            import threading
+            try:
+                self.http_server = make_server(self.http_port, derived=self.derived.items)
+            except OSError as e:
+                self.last_error = f"Could not serve telemetry on port {self.http_port}: {e}"
+                return
+            threading.Thread(target=self.http_server.serve_forever, name='http', daemon=True).start()
+
+    def stop_exports(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server = None
+        publisher, self.publisher = self.publisher, None
+        if publisher is not None:
+            self.executor.call(publisher.close)  # not while a publish is writing
+
+    def publish_shared(self, snapshot):
+        # Runs on the executor thread, right after the SMU read
+        publisher = self.publisher
+        if publisher is None:
+            return
+        try:
+            publisher.publish(snapshot)
+        except OSError as e:
+            self.publisher = None
+            self.last_error = f"Shared-memory export stopped: {e}"
+
+    def save_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None or self.snapshot_cached:
+            return
+        try:
+            save_snapshot(snapshot, SNAPSHOT_CACHE)
+            self.snapshot_saved = snapshot.timestamp
+        except OSError:
+            pass  # only a startup nicety
+
+    def update_recorder(self, snapshot):
+        # Opened, fed and closed on the executor thread only
+        recorder = self.recorder
+        if recorder is not None and (not self.record_requested
+                                     or recorder.size != snapshot.size
+                                     or recorder.table_version != snapshot.table_version):
+            # A recording holds one table layout: after a change (e.g. another
+            # backend) recording goes on in a new file
+            recorder.close()
+            self.recorder = None
+        if self.record_requested and self.recorder is None:
+            from tools.recorder import Recorder
+            os.makedirs(RECORDINGS_DIR, exist_ok=True)
+            path = os.path.join(RECORDINGS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.brr')
+            fields = None if snapshot.layout.raw else snapshot.fields
+            self.recorder = Recorder(path, snapshot.size, snapshot.table_version, fields)
+        if self.recorder is not None:
+            self.recorder.append(snapshot)
+
+    def set_recording(self, enabled):
+        self.record_requested = enabled
         self.fetch_metrics()
 
+    def on_sample_error(self, name, e):
+        import subprocess
+        if isinstance(e, subprocess.CalledProcessError):
+            self.last_error = e.stderr or str(e)
+        elif isinstance(e, subprocess.TimeoutExpired):
+            self.last_error = f"RyzenAdj did not respond within {e.timeout:g} seconds"
+        elif isinstance(e, CallTimeout):
+            self.last_error = "RyzenAdj is still busy with an earlier call"
+        else:
+            self.last_error = f"Unexpected error: {str(e)}"
+
     def fetch_metrics(self):
-        if self.is_loading:
+        self.sampler.trigger('pm')
+
+    def apply_settings(self, immediate=True):
+        self.pipeline.request(parse_values(self.ra_args), immediate)
+
+    def on_apply_report(self, report):
+        # Runs on the executor thread
+        if self.pipeline.error:
+            self.last_error = self.pipeline.error
             return
-            
-        self.is_loading = True
-        
-        OFFSET_NAME_MAP = {
-            "0x0018": "ppt-apu",
-            "0x0020": "tdc-vdd",
-            "0x0028": "tdc-soc",
-            "0x0030": "edc-vdd",
-            "0x0038": "edc-soc",
-            "0x0144": "stapm-value",
-            "0x0150": "ppt-fast",
-            "0x0154": "ppt-slow",
-            "0x02a4": "thm-core",
-            "0x0294": "stt-apu",
-            "0x0060": "stt-dgpu",
-            "0x0068": "max-freq",
-            "0x006c": "base-freq"
-        }
-
-        def run():
-            try:
-                proc = subprocess.run([self.ra_path, '--dump-table'], 
-                                     capture_output=True, text=True, check=True)
-                metrics = {}
-                lines = proc.stdout.splitlines()
-                
-                for line in lines[3:]:  # Skip header
-                    parts = [p.strip() for p in line.split('|') if p.strip()]
-                    if len(parts) >= 3:
-                        offset = parts[0].lower()
-                        hexdata = parts[1]
-                        try:
-                            value = float(parts[2])
-                        except ValueError:
-                            value = float('nan')
-                        
-                        # Apply scaling factors
-                        if offset in ["0x0144", "0x0150", "0x0154"]:  # Power values
-                            value = value / 10  # Assume original is 10x actual
-                        elif offset in ["0x0068", "0x006c"]:  # Frequency values
-                            value = value  # Keep as is (MHz)
-                        
-                        name = OFFSET_NAME_MAP.get(offset, offset)
-                        metrics[name] = {
-                            "offset": offset,
-                            "hexdata": hexdata,
-                            "value": value,
-                            "unit": self.get_unit_for_param(name)
-                        }
-                
-                self.metrics = metrics
-                self.last_error = None
-                self.last_update = time.time()
-            except subprocess.CalledProcessError as e:
-                self.last_error = e.stderr or str(e)
-            except Exception as e:
-                self.last_error = f"Unexpected error: {str(e)}"
-            finally:
-                self.is_loading = False
-
-        threading.Thread(target=run, daemon=True).start()
-
-    def get_unit_for_param(self, param_name):
-        if any(x in param_name for x in ['stapm', 'ppt']):
-            return "W"
-        elif any(x in param_name for x in ['tdc', 'edc']):
-            return "A"
-        elif any(x in param_name for x in ['thm', 'stt']):
-            return "°C"
-        elif any(x in param_name for x in ['freq']):
-            return "MHz"
-        return ""
-
-state = AppState()
-psutil.cpu_percent(None)  # Initialize CPU monitoring
-
-window = pyglet.window.Window(1000, 600, 'Better Ryzen Controller', resizable=True)
-imgui.create_context()
-impl = PygletRenderer(window)
-io = imgui.get_io()
-io.fonts.clear()
-io.fonts.add_font_from_file_ttf(r"C:\\Windows\\Fonts\\msyh.ttc", 20)
-impl.refresh_font_texture()
+        if report:
+            if self.profile_name == DEFAULT_PROFILE and self.controller is None:
+                # Remember what was applied for `main.py --daemon`; as requested,
+                # not as clamped (applied holds the SMU's value then)
+                applied = dict(self.pipeline.applied)
+                applied.update({k: r.requested for k, r in report.items() if not r.code})
+                save_profile(config, DEFAULT_PROFILE, applied)
+                write_config(config, CONFIG_PATH)
+            self.fetch_metrics()
+
+    def evaluate_rules(self):
+        # Runs on the sampler thread; only gathers what the rules refer to
+        needs = self.rules.needs
+        cpu = self.sampler.latest('cpu')
+        snapshot = self.snapshot
+        ctx = Context(
+            time=time.monotonic(),
+            power=power_source() if 'power' in needs else None,
+            cpu=cpu.value if cpu and 'cpu' in needs else None,
+            temp=snapshot.get('thm-core') if snapshot is not None and 'temp' in needs else None,
+            process=foreground_process() if 'process' in needs else None,
+            busy=self.processes.shares if 'busy' in needs else None,
+        )
+        if self.rules_enabled:
+            self.rules.evaluate(ctx)
+        return self.rules.profile
+
+    def on_rule_switch(self, rule, profile):
+        self.profile_name = profile
+        values = load_profile(config, profile)
+        self.ra_args = {k: str(v) for k, v in values.items()}
+        # The pipeline diffs against what is applied, so only changed limits are sent
+        self.pipeline.request(values, immediate=True)
+
+    def set_controller(self, enabled):
+        if enabled and self.controller is None:
+            os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+            path = os.path.join(DIAGNOSTICS_DIR, 'controller-' + time.strftime('%Y%m%d-%H%M%S') + '.csv')
+            self.controller_log = thermal.CsvLog(path)
+            controller = thermal.ThermalController(self.controller_settings, log=self.on_controller_step)
+            # Bumpless: continue from the slow limit in effect
+            start = self.pipeline.applied.get('slow', self.controller_settings['min_power'])
+            controller.start(start, time.monotonic())
+            self.controller = controller
+            self.sampler.add_group('controller', self.controller_settings['interval'], self.run_controller,
+                                   blocking=True)
+        elif not enabled and self.controller is not None:
+            self.sampler.remove_group('controller')
+            self.controller = None
+            self.controller_log.close()
+            self.controller_log = None
+            # Hand the power limits back to the active profile
+            self.pipeline.request(load_profile(config, self.profile_name), immediate=True)
+
+    def configure_controller(self):
+        if self.controller is not None:
+            self.controller.configure(self.controller_settings)
+            self.sampler.set_interval('controller', self.controller_settings['interval'])
+
+    def run_controller(self):
+        # Runs on its sampler worker: fresh reading, new limits, apply the deltas
+        controller = self.controller
+        if controller is None:
+            return None
+        snapshot = self.read_metrics()
+        limits = controller.update(snapshot.get(controller.sensor), time.monotonic())
+        if limits:
+            self.pipeline.request(limits, immediate=True)
+        return controller.last_step
+
+    def on_controller_step(self, step):
+        self.history.append('controller.reading', step.reading)
+        self.history.append('controller.power', step.power / 1000)
+        log = self.controller_log
+        if log is not None:
+            log(step)
+
+    def set_refresh_interval(self, seconds):
+        self.refresh_interval = seconds
+        self.sampler.set_interval('pm', seconds)
+
+    def export_diagnostics(self):
+        os.makedirs(DIAGNOSTICS_DIR, exist_ok=True)
+        path = os.path.join(DIAGNOSTICS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+        INSTRUMENTS.export(path, STARTUP)
+        self.diagnostics_export = path
+
+# Created by main(); module level so the page renderers can be driven
+# headless (see benchmarks/)
+state = None
+window = None
+impl = None
+pacer = None
 
 themes = [
     {'bg': (30/255,30/255,30/255,1), 'text': (230/255,230/255,230/255,1)},  # Dark
@@ -190,9 +462,9 @@ def render_welcome():
 def render_adjust():
     imgui.text('Adjust RyzenAdj Parameters')
     imgui.separator()
-    metrics = state.metrics
+    snapshot = state.snapshot
     
-    if state.is_loading:
+    if state.is_loading and snapshot is None:
         imgui.text_colored("Loading parameters...", 1, 1, 0)
         return
     
@@ -201,9 +473,9 @@ def render_adjust():
         open_, _ = imgui.collapsing_header(group)
         if open_:
             for key, desc in params:
-                raw = metrics.get(key)
-                if raw:
-                    default = int(raw["value"])
+                raw = snapshot.get(key) if snapshot else None
+                if raw is not None:
+                    default = int(raw)
                     maximum = int(default * 1.5)  # Allow 50% over default
                     estimated = False
                 else:
@@ -229,6 +501,8 @@ def render_adjust():
                 changed2, val_inp = imgui.input_int(f"{key}_inp", val, step=1)
                 if changed: state.ra_args[key] = str(val_new)
                 if changed2: state.ra_args[key] = str(val_inp)
+                if (changed or changed2) and state.auto_apply:
+                    state.apply_settings(immediate=False)
                 
                 if imgui.is_item_hovered() and desc:
                     imgui.begin_tooltip()
@@ -238,59 +512,222 @@ def render_adjust():
     imgui.end_child()
     
     if imgui.button('Apply Settings'):
-        if not os.path.isfile(state.ra_path):
-            state.last_error = f"Invalid RyzenAdj path: {state.ra_path}"
-        else:
-            def apply():
-                try:
-                    args = [f"--{k}={v}" for k, v in state.ra_args.items() if v]
-                    subprocess.run([state.ra_path] + args, check=True)
-                    state.last_error = None
-                    state.fetch_metrics()  # Refresh after applying
-                except subprocess.CalledProcessError as e:
-                    state.last_error = e.stderr or str(e)
-            threading.Thread(target=apply, daemon=True).start()
+        state.apply_settings()
     
     imgui.same_line()
     if imgui.button('Reset to Defaults'):
         state.ra_args = {}
         state.fetch_metrics()
+    
+    imgui.same_line()
+    _, state.auto_apply = imgui.checkbox('Apply while editing', state.auto_apply)
+    
+    if state.rules:
+        _, state.rules_enabled = imgui.checkbox('Switch profiles automatically', state.rules_enabled)
+        imgui.same_line()
+        rule = state.rules.rule
+        imgui.text_disabled(f"Profile: {state.profile_name}" + (f" (rule {rule.name})" if rule else ""))
+    
+    render_controller()
+    
+    # Result of the last apply, one line per changed field
+    for result in state.pipeline.report.values():
+        if result.code:
+            imgui.text_colored(f"{result.key}: {result.message}", 1, 0.4, 0.4)
+        elif result.readback is not None and result.message != "applied, verified":
+            imgui.text_colored(f"{result.key}: {result.message}", 1, 0.8, 0.3)
+        else:
+            imgui.text(f"{result.key}: {result.message}")
 
-def render_monitor():
-    # CPU Usage Graph
-    cpu = psutil.cpu_percent(None)
-    state.cpu_history.append(cpu)
-    if len(state.cpu_history) > 100:
-        state.cpu_history.pop(0)
-
-    imgui.text(f'CPU Usage: {cpu:.1f}%')
-    data = array('f', state.cpu_history)
-    imgui.plot_lines('##cpu_history', data, graph_size=(0, 150))
+def render_controller():
+    open_, _ = imgui.collapsing_header('Thermal Controller')
+    if not open_:
+        return
+    s = state.controller_settings
+    changed, enabled = imgui.checkbox('Track a temperature setpoint', state.controller is not None)
+    if changed:
+        state.set_controller(enabled)
     
-    # Auto-refresh logic
-    if time.time() - state.last_update > state.refresh_interval:
-        state.fetch_metrics()
+    edited = False
+    sensor = thermal.SENSORS.index(s['sensor'])
+    c, sensor = imgui.combo('Sensor', sensor, thermal.SENSORS)
+    s['sensor'] = thermal.SENSORS[sensor]
+    edited |= c
+    c, s['setpoint'] = imgui.slider_float('Setpoint (°C)', s['setpoint'], 40.0, 100.0, '%.1f')
+    edited |= c
+    for key, label in (('kp', 'Kp (mW/°C)'), ('ki', 'Ki (mW/°C·s)'), ('kd', 'Kd (mW·s/°C)')):
+        c, s[key] = imgui.input_float(label, s[key], 0, 0, '%.0f')
+        edited |= c
+    c, (low, high) = imgui.input_int2('Power range (mW)', s['min_power'], s['max_power'])
+    if c and 0 < low < high:
+        s['min_power'], s['max_power'] = low, high
+        edited = True
+    c, s['max_step'] = imgui.input_int('Max step (mW/s)', s['max_step'], 500)
+    edited |= c
+    if edited:
+        state.configure_controller()
+    if imgui.button('Save Controller Settings'):
+        thermal.save_settings(config, s)
+        write_config(config, CONFIG_PATH)
     
+    controller = state.controller
+    step = controller.last_step if controller else None
+    if step is not None:
+        imgui.text(f"{s['sensor']} {step.reading:.1f} °C -> limit {step.power / 1000:.1f} W "
+                   f"(P {step.p / 1000:+.1f}  I {step.i / 1000:.1f}  D {step.d / 1000:+.1f})")
+        plot_series('##controller_power', state.history.get('controller.power'), 60)
+        if state.controller_log is not None:
+            imgui.text_disabled(f"Logging to {os.path.basename(state.controller_log.file.name)}")
+
+# Display metrics in a specific order
+PARAM_ORDER = [
+    'stapm-value', 'ppt-fast', 'ppt-slow', 'ppt-apu',
+    'tdc-vdd', 'tdc-soc', 'edc-vdd', 'edc-soc',
+    'thm-core', 'stt-apu', 'stt-dgpu',
+    'max-freq', 'base-freq'
+]
+RAW_ROWS = 64
+# Graphable series: the fields above, then tools.derived metrics
+GRAPH_METRICS = PARAM_ORDER + list(DERIVED)
+
+# Monitor graph time ranges
+GRAPH_RANGES = [('1 min', 60), ('5 min', 300), ('15 min', 900), ('1 h', 3600), ('6 h', 21600)]
+
+# Display strings of the current snapshot, shared by the Monitor and PM Table pages
+table_view = TableView()
+
+# Per-core heatmap textures (UI thread) and pixels per core row
+load_map = HeatmapTexture()
+clock_map = HeatmapTexture()
+HEATMAP_ROW = 6
+
+def plot_series(label, series, height):
+    if series is None or not len(series):
+        return
+    # One point per horizontal pixel, whatever the range
+    width = int(imgui.get_content_region_available_width())
+    values, count = series.view(GRAPH_RANGES[state.graph_range][1], max(width, 16))
+    if count:
+        imgui.plot_lines(label, values, values_count=count, graph_size=(width, height))
+
+def render_heatmap(label, ring, texture, unit):
+    if ring is None:
+        return
+    imgui.text_disabled(f'{label}, {ring.rows} x {ring.length} samples')
+    width = int(imgui.get_content_region_available_width())
+    texture.draw(ring, width, ring.rows * HEATMAP_ROW, unit)
+
+def render_processes():
+    open_, _ = imgui.collapsing_header('Top Processes', flags=imgui.TREE_NODE_DEFAULT_OPEN)
+    if not open_:
+        return
+    tracker = state.processes
+    top = tracker.top
+    if not top:
+        imgui.text_disabled("Measuring...")
+        return
+    imgui.text_disabled(f'{len(tracker)} processes, CPU over the last {tracker.span:.1f} s')
+    flags = imgui.TABLE_BORDERS | imgui.TABLE_ROW_BACKGROUND
+    if imgui.begin_table('process_table', 3, flags):
+        imgui.table_setup_column('Process', imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_setup_column('PID', imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_setup_column('CPU', imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_headers_row()
+        for row in top:
+            imgui.table_next_row()
+            imgui.table_next_column()
+            imgui.text(row.name)
+            imgui.table_next_column()
+            imgui.text(str(row.pid))
+            imgui.table_next_column()
+            imgui.text(f'{row.cpu:.1f}%')
+        imgui.end_table()
+
+def render_derived():
+    items = state.derived.items()
+    if not items:
+        return
+    open_, _ = imgui.collapsing_header('Derived Metrics')
+    if not open_:
+        return
+    events = state.derived.events
+    if events:
+        t, field = events[-1]
+        imgui.text_disabled(f"Last throttle event: {field} at its limit {time.monotonic() - t:.0f} s ago")
+    flags = imgui.TABLE_BORDERS | imgui.TABLE_ROW_BACKGROUND
+    if imgui.begin_table('derived_table', 2, flags):
+        imgui.table_setup_column('Metric', imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_setup_column('Value', imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_headers_row()
+        for name, value, unit in items:
+            imgui.table_next_row()
+            imgui.table_next_column()
+            imgui.text(name)
+            imgui.table_next_column()
+            imgui.text(f"{format_value(value)} {unit}" if unit else format_value(value, True))
+        imgui.end_table()
+
+def render_monitor():
+    # CPU Usage Graph
+    cpu = state.sampler.latest('cpu')
+    clocks = state.sampler.latest('clocks')
+    imgui.text(f'CPU Usage: {cpu.value if cpu else 0.0:.1f}%')
+    if clocks:
+        imgui.same_line()
+        imgui.text_disabled(f'{clocks.value:.0f} MHz')
     imgui.same_line()
+    imgui.push_item_width(100)
+    _, state.graph_range = imgui.combo('Range', state.graph_range, [r[0] for r in GRAPH_RANGES])
+    imgui.pop_item_width()
+    plot_series('##cpu_history', state.history.get('cpu'), 150)
+    render_heatmap('Per-core load', state.core_load, load_map, '%')
+    render_heatmap('Per-core clock', state.core_clock, clock_map, 'MHz')
+    render_processes()
+    
     if imgui.button("Refresh"):
         state.fetch_metrics()
     
     imgui.same_line()
-    _, state.refresh_interval = imgui.slider_int("Interval (s)", state.refresh_interval, 1, 60)
+    changed, interval = imgui.slider_int("Interval (s)", state.refresh_interval, 1, 60)
+    if changed:
+        state.set_refresh_interval(interval)
+    
+    changed, recording = imgui.checkbox('Record', state.record_requested)
+    if changed:
+        state.set_recording(recording)
+    recorder = state.recorder
+    if recorder is not None:
+        imgui.same_line()
+        imgui.text_disabled(f'{os.path.basename(recorder.path)}: {recorder.total} rows')
+    
+    _, state.graph_metric = imgui.combo('Graph', state.graph_metric, GRAPH_METRICS)
+    plot_series('##metric_history', state.history.get(GRAPH_METRICS[state.graph_metric]), 100)
+    render_derived()
     
     imgui.separator()
     
     # Metrics Table
-    if state.is_loading:
+    if state.is_loading and state.snapshot is None:
         imgui.text_colored("Loading metrics...", 1, 1, 0)
         return
     
-    if not state.metrics:
+    snapshot = state.snapshot
+    if snapshot is None:
         imgui.text("No metrics available")
         return
+    if state.snapshot_cached:
+        imgui.text_disabled("Last saved values, waiting for the first refresh...")
+    keys = PARAM_ORDER
+    if snapshot.layout.raw:
+        # No layout file for this table version (see tools/pm_layouts)
+        imgui.text_disabled(f"Unknown PM table version 0x{snapshot.table_version:06x}, "
+                            f"showing the first {RAW_ROWS} raw entries (all of them under PM Table)")
+        keys = snapshot.layout.names[:RAW_ROWS]
     
+    view = table_view
+    view.sync(snapshot)
     flags = (imgui.TABLE_BORDERS | imgui.TABLE_RESIZABLE | 
-             imgui.TABLE_ROW_BG | imgui.TABLE_SCROLLY)
+             imgui.TABLE_ROW_BACKGROUND | imgui.TABLE_SCROLL_Y)
     
     if imgui.begin_table('metric_table', 4, flags):
         # Setup columns
@@ -300,45 +737,119 @@ def render_monitor():
         imgui.table_setup_column('Hex Data', imgui.TABLE_COLUMN_WIDTH_STRETCH)
         imgui.table_headers_row()
         
-        # Display metrics in a specific order
-        param_order = [
-            'stapm-value', 'ppt-fast', 'ppt-slow', 'ppt-apu',
-            'tdc-vdd', 'tdc-soc', 'edc-vdd', 'edc-soc',
-            'thm-core', 'stt-apu', 'stt-dgpu',
-            'max-freq', 'base-freq'
-        ]
-        
-        for key in param_order:
-            info = state.metrics.get(key)
-            if not info:
+        for key in keys:
+            i = view.index.get(key)
+            if i is None:
                 continue
-                
-            value = info.get("value", float("nan"))
-            offset = info.get("offset", "N/A")
-            hexdata = info.get("hexdata", "N/A")
-            unit = info.get("unit", "")
-            
             imgui.table_next_row()
-            
-            # Parameter name
+            draw_table_row(view, i, (view.labels, view.value, view.offsets, view.hex))
+        
+        imgui.end_table()
+
+def draw_table_row(view, i, columns):
+    # Strings come from the view's caches; lists are static, callables per snapshot
+    for column, source in enumerate(columns):
+        imgui.table_set_column_index(column)
+        imgui.text(source(i) if callable(source) else source[i])
+
+def draw_clipped_rows(view, rows, columns):
+    # Manual list clipping (pyimgui has no ListClipper): only the rows in view
+    # are submitted, the ones above and below become spacer rows of the same height
+    row_height = imgui.get_text_line_height() + 2 * imgui.get_style().cell_padding.y
+    count = len(rows)
+    first = min(count, max(0, int(imgui.get_scroll_y() / row_height) - 1))
+    last = min(count, first + int(imgui.get_window_height() / row_height) + 3)
+    if first:
+        # One spacer row for an odd number of hidden rows, two for an even one,
+        # so the row stripes stay in step while scrolling
+        spacers = 2 - first % 2
+        for _ in range(spacers):
+            imgui.table_next_row(0, first * row_height / spacers)
+    for i in rows[first:last]:
+        imgui.table_next_row(0, row_height)
+        draw_table_row(view, i, columns)
+    if last < count:
+        imgui.table_next_row(0, (count - last) * row_height)
+
+def render_explorer():
+    imgui.text('PM Table')
+    imgui.separator()
+    snapshot = state.snapshot
+    if snapshot is None:
+        if state.is_loading:
+            imgui.text_colored("Loading metrics...", 1, 1, 0)
+        else:
+            imgui.text("No metrics available")
+        return
+    view = table_view
+    view.sync(snapshot)
+    
+    imgui.push_item_width(220)
+    _, state.explorer_query = imgui.input_text_with_hint('##pm_search', 'Search name or offset',
+                                                         state.explorer_query, 64)
+    imgui.pop_item_width()
+    imgui.same_line()
+    _, state.explorer_named = imgui.checkbox('Named only', state.explorer_named)
+    imgui.same_line()
+    _, state.explorer_nonzero = imgui.checkbox('Hide zeros', state.explorer_nonzero)
+    rows = view.filter(state.explorer_query, state.explorer_named, state.explorer_nonzero)
+    imgui.text_disabled(f"{len(rows)} of {snapshot.size} entries, table version "
+                        f"0x{snapshot.table_version:06x} ({snapshot.layout.name})")
+    
+    flags = (imgui.TABLE_BORDERS | imgui.TABLE_RESIZABLE |
+             imgui.TABLE_ROW_BACKGROUND | imgui.TABLE_SCROLL_Y)
+    if imgui.begin_table('pm_explorer', 4, flags):
+        imgui.table_setup_scroll_freeze(0, 1)
+        imgui.table_setup_column('Offset', imgui.TABLE_COLUMN_WIDTH_STRETCH, 0.6)
+        imgui.table_setup_column('Name', imgui.TABLE_COLUMN_WIDTH_STRETCH, 1.4)
+        imgui.table_setup_column('Value', imgui.TABLE_COLUMN_WIDTH_STRETCH, 1.0)
+        imgui.table_setup_column('Hex Data', imgui.TABLE_COLUMN_WIDTH_STRETCH, 1.0)
+        imgui.table_headers_row()
+        draw_clipped_rows(view, rows, (view.offsets, view.labels, view.value, view.hex))
+        imgui.end_table()
+
+def render_diagnostics():
+    imgui.text('Diagnostics')
+    imgui.separator()
+    changed, INSTRUMENTS.enabled = imgui.checkbox('Collect timings', INSTRUMENTS.enabled)
+    if changed:
+        save_settings()
+    imgui.same_line()
+    if imgui.button('Reset'):
+        INSTRUMENTS.reset()
+    imgui.same_line()
+    if imgui.button('Export'):
+        try:
+            state.export_diagnostics()
+        except OSError as e:
+            state.last_error = f"Failed to export diagnostics: {str(e)}"
+    if state.diagnostics_export:
+        imgui.text_disabled(state.diagnostics_export)
+    
+    if imgui.tree_node('Startup'):
+        for phase, elapsed, took in STARTUP.phases:
+            imgui.text(f"{phase:<14} {took * 1000:8.1f} ms   at {elapsed * 1000:8.1f} ms")
+        imgui.tree_pop()
+    
+    summary = INSTRUMENTS.summary()
+    if not summary:
+        imgui.text('No timings recorded' if INSTRUMENTS.enabled else 'Timing collection is off')
+        return
+    
+    flags = imgui.TABLE_BORDERS | imgui.TABLE_ROW_BACKGROUND | imgui.TABLE_SCROLL_Y
+    if imgui.begin_table('diagnostics_table', 6, flags):
+        for column in ('Span', 'Count', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)'):
+            imgui.table_setup_column(column, imgui.TABLE_COLUMN_WIDTH_STRETCH)
+        imgui.table_headers_row()
+        for name, s in summary.items():
+            imgui.table_next_row()
             imgui.table_set_column_index(0)
-            imgui.text(key.replace('-', ' ').title())
-            
-            # Value with unit
+            imgui.text(name)
             imgui.table_set_column_index(1)
-            if "freq" in key:
-                imgui.text(f"{value:.0f} {unit}")
-            else:
-                imgui.text(f"{value:.2f} {unit}")
-            
-            # Offset
-            imgui.table_set_column_index(2)
-            imgui.text(offset)
-            
-            # Hex Data
-            imgui.table_set_column_index(3)
-            imgui.text(hexdata)
-        
+            imgui.text(str(s['count']))
+            for column, key in enumerate(('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'), 2):
+                imgui.table_set_column_index(column)
+                imgui.text(f"{s[key]:.3f}")
         imgui.end_table()
 
 def save_settings():
@@ -347,7 +858,14 @@ def save_settings():
         'language': str(state.language),
         'theme': str(state.theme),
         'ra_path': state.ra_path,
-        'refresh_interval': str(state.refresh_interval)
+        'refresh_interval': str(state.refresh_interval),
+        'telemetry_backend': state.telemetry_backend,
+        'replay_path': state.replay_path,
+        'fps_cap': str(state.fps_cap),
+        'on_demand_render': str(state.on_demand_render),
+        'instrumentation': str(INSTRUMENTS.enabled),
+        'shared_memory': str(state.shared_memory),
+        'http_port': str(state.http_port)
     }
     with open(CONFIG_PATH, 'w') as f: 
         config.write(f)
@@ -387,12 +905,34 @@ def render_settings():
         except Exception as e:
             state.last_error = f"Failed to open file dialog: {str(e)}"
     
+    backend_idx = BACKENDS.index(state.telemetry_backend)
+    _, backend_idx = imgui.combo('Telemetry Backend', backend_idx, BACKENDS)
+    state.telemetry_backend = BACKENDS[backend_idx]
+    changed = changed or imgui.is_item_deactivated()
+    if state.telemetry_backend == 'replay':
+        replay_changed, state.replay_path = imgui.input_text('Recording', state.replay_path, 512)
+        changed = changed or replay_changed
+    if state.backend is not None:
+        imgui.text_disabled(f'Active: {state.backend.name}')
+    
     imgui.separator()
     
-    _, state.refresh_interval = imgui.slider_int('Refresh Interval (seconds)', 
-                                               state.refresh_interval, 1, 60)
+    interval_changed, interval = imgui.slider_int('Refresh Interval (seconds)', 
+                                                  state.refresh_interval, 1, 60)
+    if interval_changed:
+        state.set_refresh_interval(interval)
     changed = changed or imgui.is_item_deactivated()
     
+    _, state.on_demand_render = imgui.checkbox('Redraw only on changes', state.on_demand_render)
+    _, state.fps_cap = imgui.slider_int('FPS Cap', state.fps_cap, 10, 144)
+    pacer.on_demand = state.on_demand_render
+    pacer.fps_cap = state.fps_cap
+    
+    _, state.shared_memory = imgui.checkbox('Share telemetry with other tools', state.shared_memory)
+    _, state.http_port = imgui.input_int('HTTP port (0 = off)', state.http_port, 0)
+    state.http_port = max(0, min(state.http_port, 65535))
+    imgui.text_disabled('Export changes apply after a restart')
+    
     imgui.separator()
     
     if imgui.button('Save Settings'):
@@ -401,8 +941,12 @@ def render_settings():
     if not changed:
         imgui.pop_style_var()
 
-@window.event
 def on_draw():
+    with INSTRUMENTS.span('frame'):
+        draw_frame()
+
+def draw_frame():
+    pacer.frame_started()
     window.clear()
     imgui.new_frame()
     apply_theme()
@@ -418,7 +962,8 @@ def on_draw():
     # Sidebar Menu
     imgui.begin_child('Menu', 200, h, border=True)
     for name, label in [('welcome','Welcome'), ('adjust','Adjust'), 
-                       ('monitor','Monitor'), ('settings','Settings')]:
+                       ('monitor','Monitor'), ('explorer','PM Table'), ('diagnostics','Diagnostics'),
+                       ('settings','Settings')]:
         active = state.page == name
         if active:
             imgui.push_style_color(imgui.COLOR_BUTTON, 0.26, 0.59, 0.98, 0.8)
@@ -427,10 +972,11 @@ def on_draw():
         
         if imgui.button(label, 180):
             state.page = name
-            if name == 'monitor':
+            if name in ('monitor', 'explorer'):
                 state.fetch_metrics()
         
         imgui.pop_style_color(1)
+    imgui.text_disabled(f'{pacer.current_fps():.0f} fps  {pacer.frame_ms:.1f} ms')
     imgui.end_child()
     
     # Main Content Area
@@ -443,6 +989,10 @@ def on_draw():
         render_adjust()
     elif state.page == 'monitor': 
         render_monitor()
+    elif state.page == 'explorer':
+        render_explorer()
+    elif state.page == 'diagnostics': 
+        render_diagnostics()
     else: 
         render_settings()
     
@@ -452,8 +1002,9 @@ def on_draw():
     
     imgui.render()
     impl.render(imgui.get_draw_data())
+    pacer.frame_finished()
+    STARTUP.once('first frame')
 
-@window.event
 def on_resize(width, height):
     """Handle window resize events"""
     # Update ImGui display size
@@ -471,9 +1022,119 @@ def on_resize(width, height):
     if width < 800 or height < 600:
         window.set_size(max(800, width), max(600, height))
 
-import win32api
-import win32con
-try:
-    pyglet.app.run()
-except Exception as error:
-    win32api.MessageBox(win32con.ERROR,str(error), 'Error', win32con.MB_OK)
+def data_version():
+    # Pages only need a redraw when the data they show changes
+    groups = state.sampler.groups
+    version = (groups['pm'].version, state.last_error, state.is_loading, id(state.pipeline.report))
+    if state.page == 'monitor':
+        version += (groups['cpu'].version, groups['clocks'].version, groups['processes'].version)
+    elif state.page == 'adjust' and 'controller' in groups:
+        version += (groups['controller'].version,)
+    elif state.page == 'diagnostics':
+        # Timings change every frame; refresh at the CPU cadence instead
+        version += (groups['cpu'].version, INSTRUMENTS.enabled)
+    return version
+
+tick_interval = None
+
+def schedule_tick():
+    global tick_interval
+    interval = pacer.interval()
+    if interval != tick_interval:
+        pyglet.clock.unschedule(tick)
+        if interval is not None:
+            pyglet.clock.schedule_interval(tick, interval)
+        tick_interval = interval
+
+def tick(dt):
+    pacer.watch(data_version())
+    if pacer.should_draw():
+        window.draw(dt)
+    schedule_tick()
+
+def on_input(*args):
+    pacer.invalidate()
+    schedule_tick()
+
+def on_visibility(visible):
+    pacer.set_visible(visible)
+    schedule_tick()
+
+def on_focus(focused):
+    pacer.set_focused(focused)
+    schedule_tick()
+
+def needs_elevation():
+    backend = config['Settings'].get('telemetry_backend', 'auto')
+    # These never touch the SMU
+    if backend in ('fake', 'simulator', 'replay'):
+        return False
+    # A running control service owns the SMU; its clients need no privileges
+    if is_admin() or '--service' in sys.argv[1:]:
+        return not is_admin()
+    if backend in ('auto', 'service'):
+        from tools.service import service_available
+        return not service_available()
+    return True
+
+def main():
+    global state, window, impl, pacer
+    if needs_elevation():
+        script = os.path.abspath(sys.argv[0])
+        params = " ".join([f'"{arg}"' for arg in sys.argv[1:]])
+        ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, f'"{script}" {params}', None, 1)
+        sys.exit()
+
+    if '--daemon' in sys.argv[1:]:
+        # Headless: keep the saved profile applied, no window
+        from tools.watchdog import run_daemon
+        sys.exit(run_daemon(config))
+
+    if '--service' in sys.argv[1:]:
+        # Headless: own the SMU for the GUI and tools/ryzenadj.py clients
+        from tools.service import run_service
+        sys.exit(run_service(config))
+
+    STARTUP.mark('imports')
+    state = AppState()
+    STARTUP.mark('state')
+
+    window = pyglet.window.Window(1000, 600, 'Better Ryzen Controller', resizable=True)
+    imgui.create_context()
+    impl = PygletRenderer(window)
+    STARTUP.mark('window')
+    io = imgui.get_io()
+    ranges = load_ui_font(io, UI_SOURCES, GLYPH_CACHE)  # kept alive until the atlas is built
+    impl.refresh_font_texture()
+    STARTUP.mark('font')
+    # First refresh starts once the window exists; the cached snapshot shows until then
+    state.start_exports()
+    state.sampler.start()
+
+    pacer = FramePacer(fps_cap=state.fps_cap, on_demand=state.on_demand_render)
+    window.event(on_draw)
+    window.event(on_resize)
+
+    # Pushed above the imgui renderer's handlers; returning None lets events through
+    window.push_handlers(
+        on_mouse_motion=on_input, on_mouse_press=on_input, on_mouse_release=on_input,
+        on_mouse_drag=on_input, on_mouse_scroll=on_input, on_mouse_leave=on_input,
+        on_key_press=on_input, on_key_release=on_input, on_text=on_input,
+        on_text_motion=on_input, on_expose=on_input, on_resize=on_input,
+        on_show=lambda: on_visibility(True), on_hide=lambda: on_visibility(False),
+        on_activate=lambda: on_focus(True), on_deactivate=lambda: on_focus(False),
+    )
+
+    import win32api
+    import win32con
+    try:
+        schedule_tick()
+        pyglet.app.run(None)  # Frames are drawn by tick() on demand
+    except Exception as error:
+        win32api.MessageBox(win32con.ERROR,str(error), 'Error', win32con.MB_OK)
+    finally:
+        state.save_snapshot()
+        state.stop_exports()
+
+if __name__ == '__main__':
+    main()
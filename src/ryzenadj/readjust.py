@@ -54,12 +54,35 @@ def enable(field):
         error = error_messages.get(res, "{:s} did fail with {:d}\n")
         sys.stderr.write(error.format(function_name, res));
 
+# Better Ryzen Controller publishes every table it reads (src/tools/shm.py);
+# while it runs, read that instead of polling the SMU a second time
+sys.path.insert(0, os.path.dirname(lib_path))
+try:
+    from tools.shm import Reader
+    shared = Reader()
+except ImportError:
+    shared = None
+adjusted_at = 0.0  # tables published before our own last adjust are out of date
+
+def fast_limit():
+    if shared is not None:
+        try:
+            sample = shared.latest()
+        except (FileNotFoundError, ValueError):
+            sample = None
+        if sample is not None and adjusted_at < sample.time and time.time() - sample.time < 10:
+            value = shared.decode(sample).get('fast-limit')
+            if value is not None:
+                return value
+    lib.refresh_table(ry)
+    return lib.get_fast_limit(ry)
+
 print("Monitor if fast limit is not 35W")
 while True:
-    lib.refresh_table(ry)
-    limit = round(lib.get_fast_limit(ry))
+    limit = round(fast_limit())
     if limit != 35:
         print("reapply limits, because old limit was {:d}".format(limit))
+        adjusted_at = time.time()
         adjust("fast_limit", 35000)
         adjust("slow_limit", 22000)
         adjust("slow_time", 30)
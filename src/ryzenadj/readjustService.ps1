@@ -30,6 +30,8 @@ $monitorPowerSlider = $true
 $updateHWINFOSensors = $false
 # some Zen3 devices have a locked STAPM limit, this workarround resets the stapm timer to have unlimited stapm. Use max stapm_limit and stapm_time (usually 500) to triger as less resets as possible
 $resetSTAPMUsage = $false
+# While Better Ryzen Controller is running, read the PM table it publishes (src/tools/shm.py) instead of polling the SMU a second time
+$useSharedTelemetry = $true
 
 function doAdjust_ACmode {
     $Script:repeatWaitTimeSeconds = 1    #only use values below 5s if you are using $monitorField
@@ -111,6 +113,8 @@ $apiHeader = @'
 
 [DllImport("libryzenadj.dll")] public static extern int refresh_table(IntPtr ry);
 [DllImport("libryzenadj.dll")] public static extern IntPtr get_table_values(IntPtr ry);
+[DllImport("libryzenadj.dll")] public static extern uint get_table_ver(IntPtr ry);
+[DllImport("libryzenadj.dll")] public static extern ulong get_table_size(IntPtr ry);
 [DllImport("libryzenadj.dll")] public static extern float get_stapm_limit(IntPtr ry);
 [DllImport("libryzenadj.dll")] public static extern float get_stapm_value(IntPtr ry);
 [DllImport("libryzenadj.dll")] public static extern float get_stapm_time(IntPtr ry);
@@ -282,6 +286,56 @@ function getMonitorValue {
     return 0
 }
 
+# Copies the newest table of the shared-memory segment (see src/tools/shm.py for the format) into
+# ryzenadj's own table, so every get_* call below reads it without an SMU access.
+# Returns $false when the segment is missing, closed, stale or for another table version.
+$sharedTelemetryName = "BetterRyzenController.telemetry"
+function readSharedTable {
+    if(!$useSharedTelemetry){ return $false }
+    $tablePtr = [ryzen.adj]::get_table_values($ry)
+    if($tablePtr -eq [IntPtr]::Zero){ return $false }
+    try {
+        $mmf = [System.IO.MemoryMappedFiles.MemoryMappedFile]::OpenExisting($sharedTelemetryName,
+            [System.IO.MemoryMappedFiles.MemoryMappedFileRights]::Read)
+    } catch {
+        return $false
+    }
+    try {
+        $view = $mmf.CreateViewAccessor(0, 0, [System.IO.MemoryMappedFiles.MemoryMappedFileAccess]::Read)
+        try {
+            # header '<8sIIIIIQII': magic, format, closed, size, table version, slots, count, layout offset, layout length
+            $magic = New-Object byte[] 8
+            [void]$view.ReadArray(0, $magic, 0, 8)
+            if([Text.Encoding]::ASCII.GetString($magic) -ne "BRCSHM1`0" -or $view.ReadUInt32(12) -ne 0){ return $false }
+            $size = [long]$view.ReadUInt32(16)
+            $slots = [long]$view.ReadUInt32(24)
+            $count = [long]$view.ReadUInt64(28)
+            if($count -eq 0 -or $view.ReadUInt32(20) -ne [ryzen.adj]::get_table_ver($ry) -or
+               $size * 4 -ne [long][ryzen.adj]::get_table_size($ry)){ return $false }
+            # slot '<QdQ': seqlock counter (odd while written), wall-clock time, snapshot version, then the table
+            $offset = [long]$view.ReadUInt32(36) + $view.ReadUInt32(40) + (($count - 1) % $slots) * (24 + 4 * $size)
+            $values = New-Object float[] $size
+            for($try = 0; $try -lt 10; $try++){
+                $seq = $view.ReadUInt64($offset)
+                if($seq % 2){ continue }
+                $published = $view.ReadDouble($offset + 8)
+                [void]$view.ReadArray($offset + 24, $values, 0, $size)
+                if($view.ReadUInt64($offset) -ne $seq){ continue }
+                # published before our own last adjust, or the app stopped refreshing
+                $now = [DateTimeOffset]::UtcNow.ToUnixTimeMilliseconds() / 1000
+                if($published -le $Script:adjustedAt -or $now - $published -gt [math]::max(2 * $Script:repeatWaitTimeSeconds, 10)){ return $false }
+                [System.Runtime.InteropServices.Marshal]::Copy($values, 0, $tablePtr, $size)
+                return $true
+            }
+            return $false
+        } finally {
+            $view.Dispose()
+        }
+    } finally {
+        $mmf.Dispose()
+    }
+}
+
 function createOrDeleteHWINFOSensors {
     if($updateHWINFOSensors){
         New-Item -Path HKCU:\Software\HWiNFO64\Sensors\Custom -Name RyzenAdj -Force > $null
@@ -388,6 +442,7 @@ $systemPowerStatus = New-Object ryzen.adj+SystemPowerStatus
 [void][ryzen.adj]::GetSystemPowerStatus([ref]$systemPowerStatus)
 
 testConfiguration
+$Script:adjustedAt = [DateTimeOffset]::UtcNow.ToUnixTimeMilliseconds() / 1000
 
 <# Example how to get 560 lines of ptable
 $pmTable = [float[]]::new(560)
@@ -407,7 +462,7 @@ if($mtxtArray.Length){
 Write-Host "$processType every $Script:repeatWaitTimeSeconds seconds..."
 while($true) {
     $doAdjust = !$monitorField -and !$monitorPowerSlider
-    if($monitorField -or $updateHWINFOSensors -or $resetSTAPMUsage) {
+    if(($monitorField -or $updateHWINFOSensors -or $resetSTAPMUsage) -and !(readSharedTable)) {
         [void][ryzen.adj]::refresh_table($ry)
         #[System.Runtime.InteropServices.Marshal]::Copy($tablePtr, $pmTable, 0, 560);
     }
@@ -443,6 +498,7 @@ while($true) {
             doAdjust_BatteryMode
         }
         updateMonitorFieldAdjResult
+        $Script:adjustedAt = [DateTimeOffset]::UtcNow.ToUnixTimeMilliseconds() / 1000
         if($oldWait -ne $Script:repeatWaitTimeSeconds ) { Write-Host "$processType every $Script:repeatWaitTimeSeconds seconds..." }
     }
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the app modules the way main.py does, from src/
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
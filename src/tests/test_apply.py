@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from tools.apply import ApplyPipeline
+from tools.fakeadj import FakeRyzenAdjLib, _Func
+from tools.telemetry import LibRyzenAdjBackend
+
+
+@pytest.fixture
+def lib():
+    return FakeRyzenAdjLib()
+
+
+@pytest.fixture
+def backend(lib):
+    backend = LibRyzenAdjBackend(lib=lib)
+    backend.open()
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def pipeline(backend):
+    pipeline = ApplyPipeline(lambda: backend, debounce=0.05)
+    yield pipeline
+    pipeline.executor.stop()
+
+
+def count_sets(lib):
+    """Wrap every set_* the tests use; returns the list of (field, value) sent."""
+    sent = []
+    for field in ('stapm_limit', 'fast_limit', 'slow_limit'):
+        def set_field(ry, value, field=field):
+            sent.append((field, value))
+            return lib._set(field, ry, value)
+        setattr(lib, 'set_' + field, _Func(set_field))
+    return sent
+
+
+def test_only_changed_limits_are_sent(lib, pipeline):
+    sent = count_sets(lib)
+    report = pipeline.apply({'stapm': 20000, 'fast': 30000})
+    assert {k: r.message for k, r in report.items()} == {'stapm': "applied, verified",
+                                                          'fast': "applied, verified"}
+    assert pipeline.apply({'stapm': 20000, 'fast': 30000}) == {}
+    report = pipeline.apply({'stapm': 20000, 'fast': 32000})
+    assert list(report) == ['fast']
+    assert sent == [('stapm_limit', 20000), ('fast_limit', 30000), ('fast_limit', 32000)]
+
+
+def test_rapid_requests_are_coalesced(lib, pipeline):
+    sent = count_sets(lib)
+    done = threading.Event()
+    reports = []
+    pipeline.on_report = lambda report: (reports.append(report), done.set())
+    pipeline.request({'stapm': 20000})
+    pipeline.request({'stapm': 21000, 'fast': 30000})
+    future = pipeline.request({'slow': 22000})
+    future.result(5)
+    assert done.wait(5)
+    assert len(reports) == 1
+    assert sorted(reports[0]) == ['fast', 'slow', 'stapm']
+    assert sorted(sent) == [('fast_limit', 30000), ('slow_limit', 22000), ('stapm_limit', 21000)]
+
+
+def test_clamped_limit_records_the_read_back_value(lib, pipeline):
+    # The SMU caps STAPM at 18 W
+    lib.set_stapm_limit = _Func(lambda ry, value: lib._set('stapm_limit', ry, min(value, 18000)))
+    result = pipeline.apply({'stapm': 20000})['stapm']
+    assert result.code == 0
+    assert result.readback == pytest.approx(18000)
+    assert result.message == "applied, SMU reports 18000"
+    assert pipeline.applied['stapm'] == 18000
+    # Not counted as applied, so the same request is sent again
+    assert 'stapm' in pipeline.apply({'stapm': 20000})
+
+
+def test_rejected_limit_is_reported_per_field(lib, pipeline):
+    lib.set_fast_limit = _Func(lambda ry, value: -4)
+    report = pipeline.apply({'stapm': 20000, 'fast': 30000})
+    assert report['stapm'].code == 0
+    assert report['fast'].code == -4
+    assert report['fast'].message == "set_fast_limit is rejected by SMU"
+    assert report['fast'].readback is None
+    assert 'fast' not in pipeline.applied
+    assert pipeline.applied['stapm'] == 20000
+
+
+def test_failed_apply_is_reported(pipeline):
+    pipeline.get_backend = lambda: (_ for _ in ()).throw(FileNotFoundError(2, 'No such file', 'ryzenadj.exe'))
+    report = pipeline.apply({'stapm': 20000})
+    assert report['stapm'].code == -1
+    assert pipeline.error == "Invalid RyzenAdj path: ryzenadj.exe"
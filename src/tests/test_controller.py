@@ -0,0 +1,33 @@
+import pytest
+
+from tools.controller import DEFAULTS, ThermalController, simulate, summarize
+
+
+@pytest.mark.parametrize('setpoint', [65.0, 75.0])
+def test_settles_against_the_simulator(setpoint):
+    steps = simulate(900, dict(DEFAULTS, setpoint=setpoint), load=1.0)
+    summary = summarize(steps, setpoint)
+    assert summary['overshoot'] < 2.0
+    assert summary['settled'] is not None and summary['settled'] < 120
+    assert abs(summary['error']) < 0.5
+    assert summary['power_swing'] < 500
+
+
+def test_power_moves_at_most_max_step_per_second():
+    steps = simulate(300, dict(DEFAULTS, setpoint=65.0), load=1.0)
+    largest = max(abs(b.power - a.power) for a, b in zip(steps, steps[1:]))
+    assert largest <= DEFAULTS['max_step'] * DEFAULTS['interval'] + 1e-6
+
+
+def test_no_windup_while_saturated():
+    controller = ThermalController()
+    controller.start(20000, 0.0)
+    # Far below the setpoint for ten minutes: the output runs up to max_power
+    for t in range(1, 600):
+        controller.update(50.0, float(t))
+    assert controller.power == DEFAULTS['max_power']
+    # The integral did not pile up meanwhile: the first reading over the
+    # setpoint brings the target most of the way down
+    controller.update(DEFAULTS['setpoint'] + 5.0, 600.0)
+    assert controller.last_step.target < DEFAULTS['max_power'] / 2
+    assert controller.power < DEFAULTS['max_power']
@@ -0,0 +1,37 @@
+import configparser
+
+import pytest
+
+
+@pytest.fixture
+def main(monkeypatch):
+    import pyglet
+    pyglet.options['shadow_window'] = False
+    import main
+    monkeypatch.setattr(main, 'is_admin', lambda: False)
+    monkeypatch.setattr(main.sys, 'argv', ['main.py'])
+    return main
+
+
+def use_backend(main, monkeypatch, backend):
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {'telemetry_backend': backend}})
+    monkeypatch.setattr(main, 'config', config)
+
+
+@pytest.mark.parametrize('backend', ['fake', 'simulator', 'replay'])
+def test_backends_without_the_smu_run_unelevated(main, monkeypatch, backend):
+    use_backend(main, monkeypatch, backend)
+    assert not main.needs_elevation()
+    monkeypatch.setattr(main.sys, 'argv', ['main.py', '--service'])
+    assert not main.needs_elevation()
+
+
+def test_smu_backends_need_elevation(main, monkeypatch):
+    use_backend(main, monkeypatch, 'libryzenadj')
+    assert main.needs_elevation()
+    use_backend(main, monkeypatch, 'auto')
+    monkeypatch.setattr('tools.service.service_available', lambda: True)
+    assert not main.needs_elevation()
+    monkeypatch.setattr('tools.service.service_available', lambda: False)
+    assert main.needs_elevation()
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from tools.executor import SMUExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = SMUExecutor(timeout=5.0)
+    yield executor
+    executor.stop()
+
+
+def hold(executor):
+    """Keep the worker busy until the returned event is set."""
+    release = threading.Event()
+    executor.submit(release.wait)
+    return release
+
+
+def test_same_key_joins_the_queued_operation(executor):
+    release = hold(executor)
+    calls = []
+    first = executor.submit(lambda: calls.append('first') or 'first', key='refresh')
+    second = executor.submit(lambda: calls.append('second') or 'second', key='refresh')
+    assert second is first
+    release.set()
+    assert first.result(5) == 'first'
+    assert calls == ['first']
+
+
+def test_replace_runs_only_the_latest(executor):
+    release = hold(executor)
+    calls = []
+    first = executor.submit(lambda: calls.append(1), key='apply', replace=True)
+    second = executor.submit(lambda: calls.append(2), key='apply', replace=True)
+    release.set()
+    second.result(5)
+    assert first.cancelled()
+    assert calls == [2]
+
+
+def test_order_is_kept_across_keys(executor):
+    release = hold(executor)
+    calls = []
+    futures = [executor.submit(lambda k=k: calls.append(k), key=k) for k in 'abc']
+    futures.append(executor.submit(lambda: calls.append('a again'), key='a'))  # joins 'a'
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert calls == ['a', 'b', 'c']
+
+
+def test_delayed_operation_does_not_block_the_ones_behind_it(executor):
+    calls = []
+    delayed = executor.submit(lambda: calls.append('delayed'), delay=0.2)
+    executor.call(lambda: calls.append('now'))
+    assert calls == ['now']
+    delayed.result(5)
+    assert calls == ['now', 'delayed']
+
+
+def test_stop_cancels_what_is_queued(executor):
+    release = hold(executor)
+    queued = executor.submit(lambda: None)
+    threading.Timer(0.1, release.set).start()
+    executor.stop()
+    assert queued.cancelled()
+    assert executor.thread is None
+
+
+def test_concurrent_first_submits_start_one_worker(monkeypatch):
+    executor = SMUExecutor()
+    started = []
+    real_thread = threading.Thread
+
+    def thread(*args, **kwargs):
+        started.append(1)
+        time.sleep(0.01)  # widen the window between the check and the start
+        return real_thread(*args, **kwargs)
+
+    monkeypatch.setattr(threading, 'Thread', thread)
+    barrier = threading.Barrier(8)
+    submitters = [real_thread(target=lambda: (barrier.wait(), executor.submit(lambda: None)))
+                  for _ in range(8)]
+    for submitter in submitters:
+        submitter.start()
+    for submitter in submitters:
+        submitter.join()
+    monkeypatch.undo()
+    executor.stop()
+    assert len(started) == 1
@@ -0,0 +1,68 @@
+import math
+
+import pytest
+
+from tools.history import Tier, TieredSeries, lttb
+
+
+def filled(seconds, value=lambda t: math.sin(t / 50.0) * 10 + 50):
+    series = TieredSeries()
+    for t in range(seconds):
+        series.append(value(t), float(t))
+    return series
+
+
+def test_buckets_hold_min_max_and_mean():
+    tier = Tier(10.0, 4)
+    for t, value in [(0, 5.0), (3, 1.0), (9, 9.0), (10, 2.0)]:
+        tier.add(value, t)
+    first, second = tier.newest(0.0)
+    assert (tier.lo[first], tier.hi[first], tier.avg[first], tier.n[first]) == (1.0, 9.0, 5.0, 3)
+    assert (tier.t[second], tier.avg[second], tier.n[second]) == (10.0, 2.0, 1)
+
+
+def test_ring_keeps_the_newest_buckets():
+    tier = Tier(1.0, 3)
+    for t in range(5):
+        tier.add(float(t), t)
+    assert [tier.t[i] for i in tier.newest(0.0)] == [2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize('duration, points, width', [
+    (600, 600, 1.0),      # 10 min fit the 1 s tier
+    (3600, 1800, 1.0),    # two buckets per point is still fine
+    (3600, 600, 10.0),    # 3600 1 s buckets are too many for 600 points
+    (6 * 3600, 1200, 10.0),
+    (6 * 3600, 600, 60.0),
+    (7 * 86400, 600, 60.0),  # longer than any tier: the coarsest
+])
+def test_tier_for_picks_the_finest_tier_within_two_buckets_per_point(duration, points, width):
+    series = filled(6 * 3600)
+    assert series.tier_for(duration, points).width == width
+
+
+def test_lttb_keeps_the_ends_and_the_budget():
+    xs = [float(i) for i in range(1000)]
+    ys = [math.sin(i / 20.0) for i in range(1000)]
+    for threshold in (3, 10, 100, 999):
+        selected = lttb(xs, ys, threshold)
+        assert len(selected) == threshold
+        assert selected[0] == 0 and selected[-1] == 999
+        assert selected == sorted(set(selected))
+    assert lttb(xs, ys, 2000) == list(range(1000))
+
+
+def test_view_stays_within_the_budget_and_keeps_spikes():
+    series = filled(6 * 3600, lambda t: 100.0 if t == 10000 else 50.0)
+    for duration, points in [(60, 60), (3600, 200), (6 * 3600, 300)]:
+        values, count = series.view(duration, points)
+        assert 0 < count <= points
+    values, count = series.view(6 * 3600, 300)
+    assert max(values[:count]) == 100.0
+
+
+def test_nan_samples_are_skipped():
+    series = TieredSeries()
+    series.append(1.0, 0.0)
+    series.append(float('nan'), 1.0)
+    assert len(series) == 1 and series.last() == 1.0
@@ -0,0 +1,62 @@
+from tools import fakeadj
+from tools.layouts import REGISTRY, LayoutRegistry, parse_versions
+
+RENOIR = """\
+[Layout]
+name = Renoir / Cezanne
+versions = 0x370000-0x370005, 0x400001-0x400005
+
+[Fields]
+fast-limit = 0x0008, 1, W
+stapm-value = 0x0144, 0.1, W
+"""
+
+
+def table(size):
+    return [float(i) for i in range(size)]
+
+
+def test_known_version_loads_its_layout():
+    layout = REGISTRY.for_version(fakeadj.TABLE_VERSION, fakeadj.TABLE_SIZE)
+    assert not layout.raw
+    assert layout.name == 'Renoir / Cezanne'
+    assert 'stapm-value' in layout.names
+    values = dict(zip(layout.names, layout.decode(table(fakeadj.TABLE_SIZE))))
+    # stapm-value is byte offset 0x144, entry 81, scaled by 0.1
+    assert values['stapm-value'] == 8.1
+    assert values['fast-limit'] == 2.0
+
+
+def test_unknown_version_falls_back_to_raw():
+    layout = REGISTRY.for_version(0x123456, 16)
+    assert layout.raw
+    assert len(layout.names) == 16
+    assert layout.names[:2] == ('0x0000', '0x0004')
+    assert layout.decode(table(16)) == tuple(table(16))
+    assert REGISTRY.for_version(0x123456, 16) is layout
+    assert REGISTRY.for_version(0x654321, 16) is layout
+    assert len(REGISTRY.for_version(0x123456, 8).names) == 8
+
+
+def test_short_table_drops_fields_past_its_end(tmp_path):
+    (tmp_path / 'renoir.ini').write_text(RENOIR, encoding='utf-8')
+    registry = LayoutRegistry(str(tmp_path))
+    full = registry.for_version(0x400005, 560)
+    assert full.names == ('fast-limit', 'stapm-value')
+    short = registry.for_version(0x400005, 40)
+    assert not short.raw
+    assert short.names == ('fast-limit',)
+    assert short.decode(table(40)) == (2.0,)
+    # the registered layout keeps every field
+    assert registry.for_version(0x400005, 560) is full
+
+
+def test_version_ranges_and_malformed_files(tmp_path):
+    assert parse_versions('0x370004-0x370005, 0x400001,') == {0x370004, 0x370005, 0x400001}
+    (tmp_path / 'a.ini').write_text(RENOIR, encoding='utf-8')
+    (tmp_path / 'b.ini').write_text("[Layout]\nname = Broken\n", encoding='utf-8')
+    registry = LayoutRegistry(str(tmp_path))
+    assert len(registry.errors) == 1 and 'b.ini' in registry.errors[0]
+    for version in (0x370000, 0x370005, 0x400001, 0x400005):
+        assert registry.for_version(version, 560).name == 'Renoir / Cezanne'
+    assert registry.for_version(0x370006, 560).raw
@@ -0,0 +1,98 @@
+from collections import namedtuple
+
+import psutil
+
+from tools.processes import ProcessTracker
+
+CpuTimes = namedtuple('CpuTimes', 'user system')
+
+
+class FakeProcess:
+    """A pid's current occupant in `table`: {pid: (create time, name, cpu s)}."""
+    table = {}
+    created_count = 0
+
+    def __init__(self, pid):
+        if pid not in self.table:
+            raise psutil.NoSuchProcess(pid)
+        self.pid = pid
+        self.created, self.name_, self.cpu = self.table[pid]
+        self.info = {'name': self.name_, 'cpu_times': CpuTimes(self.cpu, 0.0)}
+        FakeProcess.created_count += 1
+
+    def create_time(self):
+        return self.created
+
+    def is_running(self):
+        return self.pid in self.table and self.table[self.pid][0] == self.created
+
+    def name(self):
+        return self.name_
+
+    def cpu_times(self):
+        if self.pid not in self.table:
+            raise psutil.NoSuchProcess(self.pid)
+        return CpuTimes(self.table[self.pid][2], 0.0)
+
+    def oneshot(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def fake_psutil(monkeypatch, table):
+    FakeProcess.table = table
+    monkeypatch.setattr(psutil, 'Process', FakeProcess)
+    monkeypatch.setattr(psutil, 'pids', lambda: sorted(table))
+    monkeypatch.setattr(psutil, 'process_iter',
+                        lambda attrs=None, ad_value=None: [FakeProcess(pid) for pid in sorted(table)])
+
+
+def test_reused_pid_starts_a_new_entry(monkeypatch):
+    table = {10: (100.0, 'game.exe', 50.0), 11: (100.0, 'idle.exe', 1.0)}
+    fake_psutil(monkeypatch, table)
+    tracker = ProcessTracker()
+    tracker.refresh()
+    tracker.last -= 1.0  # as if a second passed
+    table[10] = (200.0, 'other.exe', 60.0)  # game.exe exited, pid 10 reused
+    tracker.refresh()
+    assert {pid: e.name for pid, e in tracker.entries.items()} == {10: 'other.exe', 11: 'idle.exe'}
+    assert 'game.exe' not in tracker.shares
+    assert 'other.exe' not in tracker.shares  # no previous CPU time to compare with yet
+
+
+def test_processes_are_created_once(monkeypatch):
+    table = {10: (100.0, 'game.exe', 50.0), 11: (100.0, 'idle.exe', 1.0)}
+    fake_psutil(monkeypatch, table)
+    tracker = ProcessTracker()
+    tracker.refresh()
+    created = FakeProcess.created_count
+    for _ in range(3):
+        tracker.refresh()
+    assert FakeProcess.created_count == created
+    table[12] = (300.0, 'new.exe', 0.0)
+    tracker.refresh()
+    assert FakeProcess.created_count == created + 1
+
+
+def test_exited_process_leaves_the_shares(monkeypatch):
+    table = {10: (100.0, 'game.exe', 50.0)}
+    fake_psutil(monkeypatch, table)
+    tracker = ProcessTracker()
+    tracker.refresh()
+    tracker.last -= 1.0
+    table[10] = (100.0, 'game.exe', 50.5)
+    tracker.refresh()
+    assert tracker.shares['game.exe'] > 0
+    # Listed by pids() but gone by the time its CPU times are read
+    monkeypatch.setattr(psutil, 'pids', lambda: [10])
+    del table[10]
+    tracker.last -= 1.0
+    tracker.refresh()
+    assert tracker.shares == {}
+    assert tracker.top == []
+    assert len(tracker) == 0
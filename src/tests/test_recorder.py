@@ -0,0 +1,84 @@
+import os
+
+from tools import derived
+from tools.fakeadj import FakeRyzenAdjLib
+from tools.layouts import REGISTRY
+from tools.pmtable import PMTableSnapshot
+from tools.recorder import Recorder, Recording
+from tools.telemetry import LibRyzenAdjBackend
+
+
+def read_snapshot():
+    backend = LibRyzenAdjBackend(lib=FakeRyzenAdjLib())
+    backend.open()
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    backend.read_into(snapshot)
+    return snapshot
+
+
+def record(path, rows):
+    snapshot = read_snapshot()
+    recorder = Recorder(path, snapshot.size, snapshot.table_version,
+                        chunk_rows=4, compress=False)
+    for i in range(rows):
+        recorder.append(snapshot, 1000.0 + i)
+    recorder.close()
+    return snapshot, recorder.path
+
+
+def test_uncompressed_recording_closes_after_reads(tmp_path):
+    snapshot, path = record(str(tmp_path / 'test.brr'), 10)
+    recording = Recording(path)
+    rows = list(recording.read_range(recording.start, recording.end))
+    assert [t for t, _ in rows] == [1000.0 + i for i in range(10)]
+    assert rows[0][1] == bytes(snapshot.raw)
+    t, row = recording.row_at(1005.5)
+    assert t == 1005.0 and row == bytes(snapshot.raw)
+    partial = recording.read_range(recording.start, recording.end)
+    next(partial)  # left suspended inside a chunk
+    recording.close()
+
+
+def test_uncompressed_recording_replays(tmp_path):
+    _, path = record(str(tmp_path / 'test.brr'), 10)
+    out = str(tmp_path / 'derived.csv')
+    assert derived.main([path, '-o', out]) == 0
+    with open(out) as f:
+        assert len(f.read().splitlines()) == 11
+
+
+def test_recordings_in_the_same_second_get_their_own_file(tmp_path):
+    path = str(tmp_path / 'test.brr')
+    _, first = record(path, 1)
+    _, second = record(path, 1)
+    _, third = record(path, 1)
+    assert (first, second, third) == (path, str(tmp_path / 'test-2.brr'), str(tmp_path / 'test-3.brr'))
+    assert all(os.path.exists(p + '.idx') for p in (first, second, third))
+
+
+def test_table_change_starts_a_new_recording(tmp_path, monkeypatch):
+    import types
+    import pyglet
+    pyglet.options['shadow_window'] = False
+    import main
+    monkeypatch.setattr(main, 'RECORDINGS_DIR', str(tmp_path))
+    state = types.SimpleNamespace(record_requested=True, recorder=None)
+    snapshot = read_snapshot()
+    main.AppState.update_recorder(state, snapshot)
+    main.AppState.update_recorder(state, snapshot)
+    first = state.recorder
+    # Another backend with a different table
+    other = PMTableSnapshot(snapshot.size + 4, REGISTRY.for_version(0, snapshot.size + 4))
+    main.AppState.update_recorder(state, other)
+    assert state.recorder is not first and state.recorder.size == snapshot.size + 4
+    state.record_requested = False
+    main.AppState.update_recorder(state, other)
+    assert state.recorder is None
+    sizes = []
+    for name in sorted(os.listdir(tmp_path)):
+        if name.endswith('.brr'):
+            recording = Recording(str(tmp_path / name))
+            sizes.append((recording.table_size, len(list(recording.read_range(recording.start, recording.end)))))
+            recording.close()
+    assert sorted(sizes) == sorted([(snapshot.size, 2), (snapshot.size + 4, 1)])
@@ -0,0 +1,124 @@
+import configparser
+
+import pytest
+
+from tools.rules import Context, RuleEngine, compile_rules
+
+
+def rules_from(text):
+    config = configparser.ConfigParser()
+    config.read_string(text)
+    return compile_rules(config)
+
+
+PROFILES = """
+[Profile.quiet]
+stapm = 10000
+[Profile.performance]
+stapm = 40000
+"""
+
+
+def ctx(t, cpu=None, power='ac', temp=None, process=None, busy=None):
+    return Context(t, power, cpu, temp, process, busy)
+
+
+def run(engine, samples):
+    """Feed (time, cpu) samples; returns [(time, profile)] for every switch."""
+    switches = []
+    for t, cpu in samples:
+        profile = engine.evaluate(ctx(t, cpu))
+        if profile is not None:
+            switches.append((t, profile))
+    return switches
+
+
+def test_value_hovering_at_the_threshold_does_not_flap():
+    engine = RuleEngine(rules_from(PROFILES + """
+[Rule.load]
+profile = performance
+cpu_above = 60
+"""))
+    hovering = [61, 59, 62, 57, 60.5, 56, 61]
+    switches = run(engine, enumerate([10] + hovering + [54, 58, 59]))
+    # Switches once up, and only comes back once below 60 - 5
+    assert switches == [(0, 'default'), (1, 'performance'), (8, 'default')]
+
+
+def test_without_hysteresis_the_same_values_flap():
+    engine = RuleEngine(rules_from(PROFILES + """
+[Rule.load]
+profile = performance
+cpu_above = 60
+hysteresis = 0
+"""))
+    switches = run(engine, enumerate([10, 61, 59, 62, 57]))
+    assert [p for _, p in switches] == ['default', 'performance', 'default', 'performance', 'default']
+
+
+def test_conditions_must_hold_for_the_whole_for_time():
+    engine = RuleEngine(rules_from(PROFILES + """
+[Rule.load]
+profile = performance
+cpu_above = 60
+for = 15
+"""))
+    samples = [(0, 10), (1, 80), (10, 80), (12, 40), (13, 80), (27, 80), (28, 80)]
+    assert run(engine, samples) == [(0, 'default'), (28, 'performance')]
+
+
+def test_dwell_keeps_the_profile_after_the_conditions_drop():
+    engine = RuleEngine(rules_from(PROFILES + """
+[Rule.load]
+profile = performance
+cpu_above = 60
+dwell = 60
+"""))
+    samples = [(0, 10), (5, 80), (10, 10), (40, 10), (64, 10), (65, 10)]
+    assert run(engine, samples) == [(0, 'default'), (5, 'performance'), (65, 'default')]
+
+
+def test_highest_priority_active_rule_wins_and_ties_go_to_the_first():
+    rules = rules_from(PROFILES + """
+[Rule.load]
+profile = performance
+cpu_above = 60
+[Rule.hot]
+profile = quiet
+temp_above = 90
+[Rule.battery]
+profile = quiet
+power = battery
+priority = 10
+""")
+    engine = RuleEngine(rules)
+    assert engine.evaluate(ctx(0, cpu=80, temp=95)) == 'performance'  # tie: first in the file
+    assert engine.rule.name == 'load'
+    assert engine.evaluate(ctx(1, cpu=80, power='battery')) == 'quiet'
+    assert engine.rule.name == 'battery'
+    assert engine.evaluate(ctx(2, cpu=80, power='ac')) == 'performance'
+
+
+def test_busy_processes_with_hysteresis():
+    engine = RuleEngine(rules_from(PROFILES + """
+[Rule.compile]
+profile = performance
+busy = cl.exe, rustc.exe
+busy_above = 40
+"""))
+    assert engine.evaluate(ctx(0, busy={'cl.exe': 30.0})) == 'default'
+    assert engine.evaluate(ctx(1, busy={'cl.exe': 25.0, 'rustc.exe': 20.0})) == 'performance'
+    assert engine.evaluate(ctx(2, busy={'cl.exe': 38.0})) is None  # within the hysteresis
+    assert engine.evaluate(ctx(3, busy={'cl.exe': 34.0})) == 'default'
+    assert engine.evaluate(ctx(4, busy=None)) is None  # unknown: not busy
+
+
+@pytest.mark.parametrize('rule, message', [
+    ("[Rule.x]\nprofile = quiet\ncpu_over = 60\n", "unknown option"),
+    ("[Rule.x]\ncpu_above = 60\n", "no profile"),
+    ("[Rule.x]\nprofile = missing\n", "no [Profile.missing] section"),
+    ("[Rule.x]\nprofile = quiet\npower = mains\n", "ac or battery"),
+])
+def test_invalid_rules_are_rejected(rule, message):
+    with pytest.raises(ValueError, match=message.replace('[', r'\[').replace(']', r'\]')):
+        rules_from(PROFILES + rule)
@@ -0,0 +1,57 @@
+import json
+from concurrent.futures import TimeoutError as CallTimeout
+
+import pytest
+
+from tools.ryzenadj import stream
+from tools.service import ConnectionLost, ServiceError
+
+
+class Client:
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.closed = False
+
+    def call(self, op, **args):
+        if self.failures:
+            raise self.failures.pop(0)
+        return {'op': op}
+
+    def close(self):
+        self.closed = True
+
+
+def replies(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize('error', [ServiceError("refused"), RuntimeError("smu"), TimeoutError("slow"),
+                                   CallTimeout("busy")])
+def test_failed_request_is_answered_and_the_stream_goes_on(capsys, error):
+    lines = ['{"id": 1, "op": "limits"}', '{"id": 2, "op": "limits"}']
+    assert stream(Client(error), lines) == 0
+    first, second = replies(capsys)
+    assert first['id'] == 1 and first['ok'] is False and first['error']
+    assert second == {'id': 2, 'ok': True, 'result': {'op': 'limits'}}
+
+
+@pytest.mark.parametrize('error', [ConnectionLost("gone"), EOFError(), ConnectionResetError("reset")])
+def test_lost_connection_reconnects(capsys, error):
+    fresh = Client()
+    lines = ['{"id": 1, "op": "snapshot"}', '{"id": 2, "op": "snapshot"}']
+    assert stream(Client(error), lines, lambda: fresh) == 0
+    first, second = replies(capsys)
+    assert first['ok'] is False
+    assert second == {'id': 2, 'ok': True, 'result': {'op': 'snapshot'}}
+    assert fresh.closed
+
+
+def test_lost_connection_ends_the_stream_when_reconnecting_fails(capsys):
+    def reconnect():
+        raise ServiceError("no control service is running")
+
+    lines = ['{"id": 1, "op": "snapshot"}', '{"id": 2, "op": "snapshot"}']
+    assert stream(Client(ConnectionLost("gone")), lines, reconnect) == 1
+    first, second = replies(capsys)
+    assert first['id'] == 1 and first['ok'] is False
+    assert second == {'id': None, 'ok': False, 'error': "could not reconnect: no control service is running"}
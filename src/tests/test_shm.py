@@ -0,0 +1,39 @@
+import os
+
+from tools.fakeadj import FakeRyzenAdjLib
+from tools.layouts import REGISTRY
+from tools.pmtable import PMTableSnapshot
+from tools.shm import Publisher, Reader, prometheus, snapshot_json
+from tools.telemetry import LibRyzenAdjBackend
+
+
+def read_snapshot():
+    backend = LibRyzenAdjBackend(lib=FakeRyzenAdjLib())
+    backend.open()
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    backend.read_into(snapshot)
+    snapshot.version = 7
+    return snapshot
+
+
+def test_published_snapshot_reads_back():
+    name = f'brc-test-{os.getpid()}'
+    snapshot = read_snapshot()
+    publisher = Publisher(name)
+    reader = Reader(name)
+    try:
+        publisher.publish(snapshot)
+        sample = reader.latest()
+        assert sample.version == 7
+        assert sample.table_version == snapshot.table_version
+        assert bytes(sample.values) == bytes(snapshot.raw)
+        decoded = reader.decode(sample)
+        assert decoded == dict(zip(snapshot.layout.names, snapshot.decode()))
+        assert decoded['ppt-apu'] == 25.0
+        assert decoded['tdc-vdd'] == 60.0
+        assert snapshot_json(reader)['values']['tdc-vdd'] == 60.0
+        assert 'brc_pm{field="ppt-apu",unit="W"} 25\n' in prometheus(reader)
+    finally:
+        reader.close()
+        publisher.close()
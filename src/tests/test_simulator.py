@@ -0,0 +1,90 @@
+import os
+import sys
+import subprocess
+from concurrent.futures import TimeoutError as CallTimeout
+
+import pytest
+
+from tools.fakeadj import TABLE_SIZE, TABLE_VERSION
+from tools.pmtable import PMTableSnapshot
+from tools.ryzenadj import CLIENT_ERRORS
+from tools.service import LocalClient
+from tools.simulator import Faults, SimulatedRyzenAdjLib
+from tools.telemetry import DumpTableBackend, LibRyzenAdjBackend
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def open_simulator(**faults):
+    lib = SimulatedRyzenAdjLib(step=1.0, faults=Faults(**faults))
+    backend = LibRyzenAdjBackend(lib=lib)
+    backend.open()
+    return backend
+
+
+@pytest.fixture
+def client():
+    client = LocalClient(open_simulator())
+    client.service.executor.timeout = 0.2
+    yield client
+    client.close()
+
+
+def test_rejected_and_unsupported_writes_are_reported(client):
+    client.backend.lib.faults.set_errors = {'fast_limit': -4, 'slow_limit': -1}
+    before = client.call('limits')
+    report = client.call('apply', values={'stapm': 20000, 'fast': 30000, 'slow': 26000})
+    assert report['stapm']['code'] == 0
+    assert (report['fast']['code'], report['fast']['message']) == (-4, "set_fast_limit is rejected by SMU")
+    assert (report['slow']['code'], report['slow']['message']) == (-1, "set_slow_limit is not supported on this family")
+    assert client.call('limits') == dict(before, stapm=20000)
+
+
+def test_unreadable_table_raises(client):
+    client.backend.lib.faults.refresh_error = -1
+    with pytest.raises(RuntimeError, match="refresh_table did fail with -1") as e:
+        client.call('snapshot', max_age=0)
+    assert isinstance(e.value, CLIENT_ERRORS)
+    with pytest.raises(RuntimeError, match="could not read the PM table"):
+        open_simulator(refresh_error=-1)
+
+
+def test_failed_init_raises():
+    with pytest.raises(RuntimeError, match="could not get initialized"):
+        open_simulator(fail_init=True)
+
+
+def test_slow_smu_times_out_the_caller(client):
+    client.backend.lib.faults.latency = (1.0, 0.5)
+    with pytest.raises(CallTimeout) as e:
+        client.call('snapshot', max_age=0)
+    assert isinstance(e.value, CLIENT_ERRORS)
+
+
+@pytest.fixture
+def simulator_exe(monkeypatch):
+    monkeypatch.chdir(SRC)  # for -m tools.simulator
+    return [sys.executable, '-m', 'tools.simulator', '--seconds', '5']
+
+
+def test_dump_table_round_trips(simulator_exe):
+    backend = DumpTableBackend(simulator_exe)
+    backend.open()
+    assert (backend.table_size, backend.table_version) == (TABLE_SIZE, TABLE_VERSION)
+    snapshot = PMTableSnapshot(backend.table_size)
+    backend.read_into(snapshot)
+    assert snapshot.table_version == TABLE_VERSION
+    assert snapshot.values[84] > 0  # fast PPT value
+
+
+def test_hung_dump_table_is_killed(simulator_exe):
+    backend = DumpTableBackend(simulator_exe + ['--hang', '10'], timeout=0.5)
+    with pytest.raises(subprocess.TimeoutExpired):
+        backend.open()
+
+
+def test_failed_dump_table_raises(simulator_exe):
+    backend = DumpTableBackend(simulator_exe + ['--fail'])
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        backend.open()
+    assert "Unable to init ryzenadj" in e.value.stderr
@@ -0,0 +1,34 @@
+from tools.sweep import (DEFAULT_GRID, SimulatedWorkload, Sweep, efficiency, grid_points, move,
+                         pareto_front)
+from tools.telemetry import open_backend
+
+
+def sweep_simulator():
+    backend = open_backend('ryzenadj.exe', 'simulator')
+    return Sweep(backend, SimulatedWorkload(backend.lib)), backend
+
+
+def test_move_pushes_the_ordered_limits_along():
+    limits = {'stapm': 30000, 'slow': 30000, 'fast': 35000}
+    assert move(limits, 'stapm', 40000, DEFAULT_GRID) == {'stapm': 40000, 'slow': 40000, 'fast': 45000}
+    assert move(limits, 'fast', 15000, DEFAULT_GRID) == {'stapm': 10000, 'slow': 10000, 'fast': 15000}
+    assert move(limits, 'slow', 20000, DEFAULT_GRID) == {'stapm': 20000, 'slow': 20000, 'fast': 35000}
+    assert move(limits, 'stapm', 60000, DEFAULT_GRID) is None
+    # slow would have to go above its range
+    grid = dict(DEFAULT_GRID, slow=(10000, 30000, 10000))
+    assert move(limits, 'stapm', 40000, grid) is None
+
+
+def test_adaptive_search_gets_close_to_the_grid_optimum():
+    sweep, backend = sweep_simulator()
+    try:
+        grid_best = efficiency(pareto_front(sweep.grid(DEFAULT_GRID))[0])
+    finally:
+        backend.close()
+    sweep, backend = sweep_simulator()
+    try:
+        results = sweep.adaptive(DEFAULT_GRID)
+    finally:
+        backend.close()
+    assert efficiency(pareto_front(results)[0]) >= 0.95 * grid_best
+    assert len(results) < len(grid_points(DEFAULT_GRID))
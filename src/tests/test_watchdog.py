@@ -0,0 +1,52 @@
+import os
+import sys
+import stat
+import threading
+import configparser
+
+import pytest
+
+from tools.apply import read_limits
+from tools.service import ControlService, ServiceBackend, open_smu_backend
+from tools.watchdog import Watchdog
+
+
+@pytest.fixture
+def service(tmp_path):
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {}})
+    service = ControlService(open_smu_backend(config, 'fake'), log=lambda message: None)
+    path = str(tmp_path / 'service.json')
+    service.start(path=path)
+    threading.Thread(target=service.serve_forever, daemon=True).start()
+    try:
+        yield service, path
+    finally:
+        service.stop()
+        service.backend.close()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="Windows uses a DACL, not the mode")
+def test_service_file_is_private(service):
+    _, path = service
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_watchdog_reapplies_through_the_service(service):
+    service, path = service
+    backend = ServiceBackend(path)
+    logs = []
+    watchdog = Watchdog(backend, {'stapm': 20000, 'fast': 30000}, log=logs.append)
+    try:
+        watchdog.apply(list(watchdog.targets))
+        assert watchdog.expected == {'stapm': 20000, 'fast': 30000}
+        assert watchdog.step() > watchdog.min_interval  # nothing drifted
+        # Firmware puts the defaults back; the service still counts ours as applied
+        service.backend.lib.reset_limits()
+        assert read_limits(service.backend)['stapm'] != 20000
+        assert watchdog.step() == watchdog.min_interval
+        assert "reapply stapm, fast" in logs
+        assert read_limits(service.backend)['stapm'] == 20000
+        assert service.pipeline.applied['stapm'] == 20000
+    finally:
+        backend.close()
@@ -0,0 +1,188 @@
+import threading
+import subprocess
+from collections import namedtuple
+
+from tools.ryzenadj import RA_FIELDS, describe_error
+from tools.instrument import INSTRUMENTS
+from tools.executor import SMUExecutor
+
+# Per-field outcome of an apply. code is the set_* result (0 = accepted),
+# readback the value read from the refreshed table in set_* units, or None.
+FieldResult = namedtuple('FieldResult', 'key requested code readback message')
+
+# Read-back may differ a little from the request (float W vs integer mW)
+TOLERANCE = 0.01
+
+
+def describe_exception(e):
+    """One line for an apply that failed before the SMU answered."""
+    if isinstance(e, FileNotFoundError):
+        return f"Invalid RyzenAdj path: {e.filename or e}"
+    if isinstance(e, subprocess.CalledProcessError):
+        return (e.stderr or str(e)).strip()
+    if isinstance(e, subprocess.TimeoutExpired):
+        return f"RyzenAdj did not respond within {e.timeout:g} seconds"
+    return str(e) or type(e).__name__
+
+
+def read_limits(backend):
+    """Value per ryzenadj key with a getter, in set_* units, from a fresh table."""
+    values = {}
+    with backend.lock:
+        backend.refresh()
+        for key, field in RA_FIELDS.items():
+            if field.getter:
+                value = backend.read_field(field.getter)
+                if value == value:
+                    values[key] = round(value * field.scale)
+    return values
+
+
+def parse_values(ra_args):
+    values = {}
+    for key, value in ra_args.items():
+        if key not in RA_FIELDS or value in ('', None):
+            continue
+        try:
+            values[key] = int(float(value))
+        except ValueError:
+            continue
+    return values
+
+
+class ApplyPipeline:
+    """Sends only changed limits to the SMU and verifies them by reading back.
+
+    request() coalesces rapid edits: every call replaces the apply queued on
+    the executor and restarts its debounce delay, so only the merged result
+    is applied once the edits stop. `applied` holds the last accepted value
+    per key, or the read-back one where the SMU differs, and is what
+    requests are diffed against.
+    An apply that raises (no backend, ryzenadj missing, service gone) is
+    reported like a rejected one, with the reason in `error`.
+    """
+
+    def __init__(self, get_backend, debounce=0.4, on_report=None, executor=None):
+        self.get_backend = get_backend
+        self.debounce = debounce
+        self.on_report = on_report
+        self.executor = executor or SMUExecutor()
+        self.applied = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.report = {}
+        self.error = None
+
+    def sync(self):
+        """Seed `applied` from the limits currently in the PM table."""
+        backend = self.get_backend()
+        if hasattr(backend, 'limits'):
+            self.applied.update(backend.limits())
+            return
+        if hasattr(backend, 'adjust'):
+            self.applied.update(read_limits(backend))
+
+    def diff(self, values, force=()):
+        return {k: v for k, v in values.items() if k in force or self.applied.get(k) != v}
+
+    def request(self, values, immediate=False):
+        with self.lock:
+            self.pending.update(values)
+        return self.executor.submit(self.flush, key='apply', replace=True,
+                                    delay=0 if immediate else self.debounce)
+
+    def flush(self):
+        with self.lock:
+            values, self.pending = self.pending, {}
+        if values:
+            return self.apply(values)
+        return {}
+
+    def apply(self, values, force=()):
+        """Apply `values` now; keys in `force` are written even if unchanged."""
+        with INSTRUMENTS.span('apply'):
+            return self._apply(values, force)
+
+    def _apply(self, values, force=()):
+        changes = self.diff(values, force)
+        error = None
+        if not changes:
+            report = {}
+        else:
+            try:
+                report = self.apply_with(self.get_backend(), changes)
+            except Exception as e:
+                error = describe_exception(e)
+                report = {k: FieldResult(k, v, -1, None, error) for k, v in changes.items()}
+        self.error = error
+        self.report = report
+        if self.on_report:
+            self.on_report(report)
+        return report
+
+    def apply_with(self, backend, changes):
+        if hasattr(backend, 'adjust'):
+            return self.apply_in_process(backend, changes)
+        if hasattr(backend, 'apply'):
+            return self.apply_with_service(backend, changes)
+        if hasattr(backend, 'command'):
+            return self.apply_with_process(backend, changes)
+        return {k: FieldResult(k, v, -1, None, f"the {backend.name} backend can not apply limits")
+                for k, v in changes.items()}
+
+    def apply_in_process(self, backend, changes):
+        codes = {}
+        with backend.lock:
+            for key, value in changes.items():
+                codes[key] = backend.adjust(RA_FIELDS[key].setter, value)
+            backend.refresh()
+            readbacks = {}
+            for key in changes:
+                getter = RA_FIELDS[key].getter
+                if getter and not codes[key]:
+                    value = backend.read_field(getter) * RA_FIELDS[key].scale
+                    readbacks[key] = value if value == value else None
+
+        report = {}
+        for key, value in changes.items():
+            code = codes[key]
+            readback = readbacks.get(key)
+            if code:
+                message = describe_error('set_' + RA_FIELDS[key].setter, code)
+            elif readback is None:
+                message = "applied"
+                self.applied[key] = value
+            elif abs(readback - value) <= TOLERANCE * max(1, abs(value)):
+                message = "applied, verified"
+                self.applied[key] = value
+            else:
+                # Clamped by the SMU: what it runs is what the next diff compares to
+                message = f"applied, SMU reports {readback:.0f}"
+                self.applied[key] = round(readback)
+            report[key] = FieldResult(key, value, code, readback, message)
+        return report
+
+    def apply_with_service(self, backend, changes):
+        # tools.service batches and verifies; its applied values are the reference
+        report = backend.apply(changes)
+        self.applied.update(backend.limits())
+        return report
+
+    def apply_with_process(self, backend, changes):
+        # ryzenadj.exe fallback: one process for all changed limits, no read-back
+        args = [f"--{k}={v}" for k, v in changes.items()]
+        try:
+            proc = subprocess.run(backend.command + args, capture_output=True, text=True,
+                                  timeout=backend.timeout)
+        except subprocess.TimeoutExpired:
+            message = f"ryzenadj did not finish within {backend.timeout:g} s"
+            return {k: FieldResult(k, v, -1, None, message) for k, v in changes.items()}
+        report = {}
+        for key, value in changes.items():
+            if proc.returncode:
+                message = (proc.stderr or f"ryzenadj exited with {proc.returncode}").strip()
+            else:
+                message = "applied"
+                self.applied[key] = value
+            report[key] = FieldResult(key, value, proc.returncode, None, message)
+        return report
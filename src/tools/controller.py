@@ -0,0 +1,251 @@
+"""Closed-loop thermal headroom controller.
+
+A PID loop moves the STAPM / slow / fast power limits so a temperature
+reading (thm-core, or stt-apu for skin temperature) tracks a setpoint,
+using the headroom static limits leave unused. The output is rate-limited
+per second and clamped to [min_power, max_power]; the integral stops
+growing while the output is saturated, so a long stretch at a bound does
+not overshoot when the load changes.
+
+Settings live in the [Controller] section of settings.ini. Run
+
+    python -m tools.controller --seconds 900
+
+to see the loop against tools.simulator: it prints overshoot, settling
+time and steady-state error and exits non-zero if the loop did not settle.
+"""
+import sys
+import csv
+import argparse
+from collections import namedtuple
+
+SECTION = 'Controller'
+SENSORS = ['thm-core', 'stt-apu']
+
+# Gains act on °C of error and produce mW of power limit
+DEFAULTS = {
+    'sensor': 'thm-core',
+    'setpoint': 85.0,    # °C
+    'kp': 1500.0,        # mW per °C
+    'ki': 150.0,         # mW per °C·s
+    'kd': 0.0,           # mW per °C/s, on the measurement
+    'min_power': 8000,   # mW
+    'max_power': 54000,  # mW
+    'max_step': 2000,    # mW per second
+    'fast_ratio': 1.0,   # fast limit = power * fast_ratio
+    'interval': 1.0,     # s between updates
+}
+
+# One controller update; powers in mW
+Step = namedtuple('Step', 'time reading error p i d target power')
+
+
+def clamp(value, lo, hi):
+    return lo if value < lo else hi if value > hi else value
+
+
+class PID:
+    """Positional PID with derivative on measurement and conditional integration."""
+
+    def __init__(self, kp, ki, kd, lo, hi):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.lo = lo
+        self.hi = hi
+        self.integral = 0.0
+        self.last = None
+
+    def reset(self, output):
+        # Bumpless start: the first output equals the current power
+        self.integral = clamp(output, self.lo, self.hi)
+        self.last = None
+
+    def update(self, error, measurement, dt):
+        p = self.kp * error
+        d = 0.0
+        if self.last is not None and dt > 0:
+            d = -self.kd * (measurement - self.last) / dt
+        self.last = measurement
+        integral = self.integral + self.ki * error * dt
+        # Anti-windup: integrate only up to where the output saturates
+        if error > 0:
+            integral = min(integral, max(self.integral, self.hi - p - d))
+        elif error < 0:
+            integral = max(integral, min(self.integral, self.lo - p - d))
+        self.integral = clamp(integral, self.lo, self.hi)
+        return clamp(p + self.integral + d, self.lo, self.hi), p, self.integral, d
+
+
+class ThermalController:
+    """Turns temperature readings into ryzenadj power limits (mW)."""
+
+    def __init__(self, settings=None, log=None):
+        self.settings = dict(DEFAULTS, **(settings or {}))
+        s = self.settings
+        self.sensor = s['sensor']
+        self.pid = PID(s['kp'], s['ki'], s['kd'], s['min_power'], s['max_power'])
+        self.log = log
+        self.power = None
+        self.last_time = None
+        self.last_step = None
+
+    def configure(self, settings):
+        """Retune while running; the integral is kept, so the output does not jump."""
+        self.settings.update(settings)
+        s = self.settings
+        self.sensor = s['sensor']
+        pid = self.pid
+        pid.kp, pid.ki, pid.kd, pid.lo, pid.hi = s['kp'], s['ki'], s['kd'], s['min_power'], s['max_power']
+
+    def start(self, power, now):
+        s = self.settings
+        self.power = clamp(power, s['min_power'], s['max_power'])
+        self.pid.reset(self.power)
+        self.last_time = now
+
+    def limits(self):
+        power = int(self.power)
+        fast = int(min(self.settings['max_power'], power * self.settings['fast_ratio']))
+        return {'stapm': power, 'slow': power, 'fast': fast}
+
+    def update(self, reading, now):
+        """New limits for a reading, or None while the reading is unavailable."""
+        if reading is None or reading != reading:
+            return None
+        s = self.settings
+        if self.power is None:
+            self.start(s['min_power'], now)  # not started from the applied limits: start safe
+        dt = now - self.last_time if self.last_time is not None else s['interval']
+        self.last_time = now
+
+        error = s['setpoint'] - reading
+        target, p, i, d = self.pid.update(error, reading, dt)
+        step = s['max_step'] * max(dt, 0.0)
+        self.power = clamp(self.power + clamp(target - self.power, -step, step),
+                           s['min_power'], s['max_power'])
+        self.last_step = Step(now, reading, error, p, i, d, target, self.power)
+        if self.log:
+            self.log(self.last_step)
+        return self.limits()
+
+
+def load_settings(config):
+    settings = dict(DEFAULTS)
+    if SECTION in config:
+        section = config[SECTION]
+        for key, default in DEFAULTS.items():
+            if key not in section:
+                continue
+            value = section[key]
+            try:
+                settings[key] = value if isinstance(default, str) else type(default)(float(value))
+            except ValueError:
+                continue
+    if settings['sensor'] not in SENSORS:
+        settings['sensor'] = DEFAULTS['sensor']
+    return settings
+
+
+def save_settings(config, settings):
+    config[SECTION] = {k: str(settings[k]) for k in DEFAULTS}
+
+
+class CsvLog:
+    """Appends every Step to a CSV file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(Step._fields)
+
+    def __call__(self, step):
+        self.writer.writerow([f"{v:.3f}" for v in step])
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def simulate(seconds, settings=None, load=1.0, log=None):
+    """Run the controller against tools.simulator; returns the list of Steps."""
+    from tools.simulator import SimulatedRyzenAdjLib
+    from tools.telemetry import LibRyzenAdjBackend
+    from tools.pmtable import PMTableSnapshot
+    from tools.layouts import REGISTRY
+    from tools.apply import ApplyPipeline
+
+    steps = []
+
+    def record(step):
+        steps.append(step)
+        if log:
+            log(step)
+
+    controller = ThermalController(settings, log=record)
+    interval = controller.settings['interval']
+    backend = LibRyzenAdjBackend(lib=SimulatedRyzenAdjLib(load=load, step=interval))
+    backend.open()
+    pipeline = ApplyPipeline(lambda: backend)
+    snapshot = PMTableSnapshot(backend.table_size,
+                               REGISTRY.for_version(backend.table_version, backend.table_size))
+    controller.start(backend.read_field('slow_limit') * 1000, 0.0)
+    t = 0.0
+    while t < seconds:
+        backend.read_into(snapshot)
+        limits = controller.update(snapshot.get(controller.sensor), t)
+        if limits:
+            pipeline.apply(limits)
+        t += interval
+    backend.close()
+    return steps
+
+
+def summarize(steps, setpoint, band=1.0):
+    """Overshoot (°C), settling time (s) into ±band and mean error over the last minute."""
+    overshoot = max(0.0, max(s.reading for s in steps) - setpoint)
+    settled = None
+    for step in steps:
+        if abs(step.error) > band:
+            settled = None
+        elif settled is None:
+            settled = step.time
+    tail = [s for s in steps if s.time >= steps[-1].time - 60]
+    error = sum(s.error for s in tail) / len(tail)
+    swing = max(s.power for s in tail) - min(s.power for s in tail)
+    return {'overshoot': overshoot, 'settled': settled, 'error': error, 'power_swing': swing}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Thermal controller against the simulator')
+    parser.add_argument('--seconds', type=float, default=900.0)
+    parser.add_argument('--load', type=float, default=1.0, help='Constant workload 0..1')
+    parser.add_argument('--sensor', choices=SENSORS, default='thm-core')
+    parser.add_argument('--setpoint', type=float, default=75.0)
+    for key in ('kp', 'ki', 'kd', 'max_step'):
+        parser.add_argument('--' + key.replace('_', '-'), type=float, default=DEFAULTS[key])
+    parser.add_argument('--csv', help='Write every step to this file')
+    args = parser.parse_args(argv)
+
+    settings = {'sensor': args.sensor, 'setpoint': args.setpoint, 'kp': args.kp,
+                'ki': args.ki, 'kd': args.kd, 'max_step': args.max_step}
+    log = CsvLog(args.csv) if args.csv else None
+    try:
+        steps = simulate(args.seconds, settings, args.load, log)
+    finally:
+        if log:
+            log.close()
+    result = summarize(steps, args.setpoint)
+    if result['settled'] is None and steps[-1].power >= DEFAULTS['max_power'] and result['error'] > 0:
+        # Demand or other limits keep the reading below the setpoint: nothing to track
+        print(f"setpoint not reached at max_power, {result['error']:.2f} °C of headroom left")
+        return 0
+    settled = 'never' if result['settled'] is None else f"{result['settled']:.0f} s"
+    print(f"overshoot {result['overshoot']:.2f} °C, settled {settled}, "
+          f"steady error {result['error']:+.2f} °C, power swing {result['power_swing'] / 1000:.2f} W "
+          f"(last minute), final limit {steps[-1].power / 1000:.1f} W")
+    return 0 if result['settled'] is not None and abs(result['error']) < 1.0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
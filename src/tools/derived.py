@@ -0,0 +1,337 @@
+"""Derived metrics computed incrementally from PM table snapshots.
+
+DERIVED declares every metric once, over layout field names (see
+tools/pm_layouts): power and thermal headroom against the limits the SMU
+reports, time spent at a limit, rolling averages and maxima, an EWMA of
+the temperature and its trend, throttle events and clock per watt. A
+metric whose fields the current table does not have is left out.
+
+Each operator keeps running state and does O(1) amortized work per
+sample: rolling windows hold (time, weight, value) in a deque with running
+sums, rolling extremes a monotonic deque, so nothing is ever rescanned.
+Averages are weighted by the time each sample covers, which keeps them
+right when the refresh interval changes.
+
+DerivedEngine.update() feeds one snapshot and returns the new values.
+The app appends them to its HistoryStore under their own names, so they
+are graphed like raw fields, and serves them next to the raw fields on
+/metrics. Recordings can be replayed through the engine:
+
+    python -m tools.derived recordings/20240101-120000.brr -o derived.csv
+"""
+import sys
+import csv
+import math
+import argparse
+from collections import deque, namedtuple
+
+# op: operator name (OPERATORS); sources: layout fields it reads;
+# param: window or time constant in seconds where the operator has one
+Derived = namedtuple('Derived', 'op sources param')
+
+# Output name -> declaration, in display order
+DERIVED = {
+    'stapm-headroom': Derived('headroom', ('stapm-value', 'stapm-limit'), None),
+    'fast-headroom': Derived('headroom', ('ppt-fast', 'fast-limit'), None),
+    'slow-headroom': Derived('headroom', ('ppt-slow', 'slow-limit'), None),
+    'thermal-headroom': Derived('headroom', ('thm-core', 'tctl-limit'), None),
+    'stapm-at-limit-5m': Derived('at-limit', ('stapm-value', 'stapm-limit'), 300),
+    'fast-at-limit-5m': Derived('at-limit', ('ppt-fast', 'fast-limit'), 300),
+    'thermal-at-limit-5m': Derived('at-limit', ('thm-core', 'tctl-limit'), 300),
+    'ppt-fast-avg-30s': Derived('mean', ('ppt-fast',), 30),
+    'ppt-fast-avg-5m': Derived('mean', ('ppt-fast',), 300),
+    'ppt-fast-max-30s': Derived('max', ('ppt-fast',), 30),
+    'thm-core-avg-30s': Derived('mean', ('thm-core',), 30),
+    'thm-core-avg-5m': Derived('mean', ('thm-core',), 300),
+    'thm-core-max-5m': Derived('max', ('thm-core',), 300),
+    'thm-core-ewma': Derived('ewma', ('thm-core',), 10),
+    'thm-core-trend': Derived('trend', ('thm-core',), 30),
+    'throttle-events': Derived('throttle', ('stapm-value', 'stapm-limit', 'ppt-fast', 'fast-limit',
+                                            'ppt-slow', 'slow-limit', 'thm-core', 'tctl-limit'), None),
+    'clock-per-watt': Derived('ratio', ('max-freq', 'ppt-fast'), None),
+}
+
+# A value counts as at its limit from AT_LIMIT of it; a throttle event
+# ends once it falls back below RELEASE
+AT_LIMIT = 0.98
+RELEASE = 0.95
+EVENTS_KEPT = 50
+
+NAN = float('nan')
+
+
+class Window:
+    """Time-weighted running mean over the last `window` seconds."""
+    __slots__ = ('window', 'samples', 'weighted', 'weight', 'last')
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()  # (time, weight, value)
+        self.weighted = 0.0
+        self.weight = 0.0
+        self.last = None
+
+    def update(self, t, value):
+        # A sample stands for the time since the previous one
+        dt = t - self.last if self.last is not None else 0.0
+        self.last = t
+        self.samples.append((t, dt, value))
+        self.weighted += dt * value
+        self.weight += dt
+        samples = self.samples
+        since = t - self.window
+        while samples[0][0] <= since:
+            _, w, v = samples.popleft()
+            self.weighted -= w * v
+            self.weight -= w
+        if self.weight <= 1e-9:
+            return value  # only one sample (or several at one time) so far
+        return self.weighted / self.weight
+
+
+class Extreme:
+    """Rolling maximum (or minimum) over the last `window` seconds."""
+    __slots__ = ('window', 'largest', 'samples')
+
+    def __init__(self, window, largest=True):
+        self.window = window
+        self.largest = largest
+        self.samples = deque()  # (time, value), values decreasing (increasing for min)
+
+    def update(self, t, value):
+        samples = self.samples
+        if self.largest:
+            while samples and samples[-1][1] <= value:
+                samples.pop()
+        else:
+            while samples and samples[-1][1] >= value:
+                samples.pop()
+        samples.append((t, value))
+        since = t - self.window
+        while samples[0][0] <= since:
+            samples.popleft()
+        return samples[0][1]
+
+
+class Ewma:
+    """Exponential moving average with time constant `tau` seconds."""
+    __slots__ = ('tau', 'value', 'last')
+
+    def __init__(self, tau):
+        self.tau = tau
+        self.value = None
+        self.last = None
+
+    def update(self, t, value):
+        if self.value is None:
+            self.value = value
+        else:
+            alpha = 1.0 - math.exp(-max(t - self.last, 0.0) / self.tau)
+            self.value += (value - self.value) * alpha
+        self.last = t
+        return self.value
+
+
+class Trend:
+    """Smoothed rate of change, per minute."""
+    __slots__ = ('rate', 'previous', 'last')
+
+    def __init__(self, tau):
+        self.rate = Ewma(tau)
+        self.previous = None
+        self.last = None
+
+    def update(self, t, value):
+        previous, last = self.previous, self.last
+        self.previous, self.last = value, t
+        if previous is None or t <= last:
+            return self.rate.value if self.rate.value is not None else 0.0
+        return self.rate.update(t, (value - previous) * 60.0 / (t - last))
+
+
+class Headroom:
+    """How far below its limit a value is, in % of the limit."""
+    __slots__ = ()
+
+    def update(self, t, value, limit):
+        if limit <= 0:
+            return NAN
+        return 100.0 * (limit - value) / limit
+
+
+class AtLimit:
+    """% of the last `window` seconds spent at the limit."""
+    __slots__ = ('window',)
+
+    def __init__(self, window):
+        self.window = Window(window)
+
+    def update(self, t, value, limit):
+        return self.window.update(t, 100.0 if limit > 0 and value >= limit * AT_LIMIT else 0.0)
+
+
+class Throttle:
+    """Counts the times any (value, limit) pair reaches its limit.
+
+    An event starts at AT_LIMIT of the limit and ends below RELEASE of
+    it, so a value hovering at the limit is a single event. The most
+    recent events are kept in `events` as (time, value field).
+    """
+    __slots__ = ('names', 'active', 'count', 'events')
+
+    def __init__(self, names):
+        self.names = names[::2]
+        self.active = [False] * len(self.names)
+        self.count = 0
+        self.events = deque(maxlen=EVENTS_KEPT)
+
+    def update(self, t, *pairs):
+        active = self.active
+        for i in range(len(active)):
+            value, limit = pairs[2 * i], pairs[2 * i + 1]
+            if limit <= 0:
+                active[i] = False
+            elif active[i]:
+                active[i] = value >= limit * RELEASE
+            elif value >= limit * AT_LIMIT:
+                active[i] = True
+                self.count += 1
+                self.events.append((t, self.names[i]))
+        return float(self.count)
+
+
+class Ratio:
+    __slots__ = ()
+
+    def update(self, t, value, divisor):
+        return value / divisor if divisor > 0 else NAN
+
+
+# Operator name -> (factory(param, sources), unit(source units))
+OPERATORS = {
+    'headroom': (lambda param, sources: Headroom(), lambda units: '%'),
+    'at-limit': (lambda param, sources: AtLimit(param), lambda units: '%'),
+    'mean': (lambda param, sources: Window(param), lambda units: units[0]),
+    'max': (lambda param, sources: Extreme(param, True), lambda units: units[0]),
+    'min': (lambda param, sources: Extreme(param, False), lambda units: units[0]),
+    'ewma': (lambda param, sources: Ewma(param), lambda units: units[0]),
+    'trend': (lambda param, sources: Trend(param), lambda units: units[0] + '/min'),
+    'throttle': (lambda param, sources: Throttle(sources), lambda units: ''),
+    'ratio': (lambda param, sources: Ratio(), lambda units: f"{units[0]}/{units[1]}"),
+}
+
+
+class DerivedEngine:
+    """Runs the DERIVED operators over a stream of snapshots.
+
+    Operators are built per layout, so a table version change restarts
+    them. `values` holds the latest output per metric; a metric whose
+    inputs were NaN in a sample keeps its previous value.
+    """
+
+    def __init__(self, specs=DERIVED):
+        self.specs = specs
+        self.layout = None
+        self.bound = []   # (name, operator, positions in layout.names)
+        self.units = {}
+        self.values = {}
+        self.throttle = None
+
+    def bind(self, layout):
+        self.layout = layout
+        self.bound = []
+        self.units = {}
+        self.values = {}
+        self.throttle = None
+        if layout.raw:
+            return
+        position = {name: i for i, name in enumerate(layout.names)}
+        for name, spec in self.specs.items():
+            if not all(source in position for source in spec.sources):
+                continue
+            factory, unit = OPERATORS[spec.op]
+            operator = factory(spec.param, spec.sources)
+            self.bound.append((name, operator, tuple(position[s] for s in spec.sources)))
+            self.units[name] = unit([layout.fields[s][2] for s in spec.sources])
+            if isinstance(operator, Throttle):
+                self.throttle = operator
+
+    def update(self, snapshot):
+        """Feed one snapshot; returns [(name, value)] for this sample."""
+        return self.update_values(snapshot.layout, snapshot.timestamp, snapshot.decode())
+
+    def update_values(self, layout, t, decoded):
+        if layout is not self.layout:
+            self.bind(layout)
+        out = []
+        values = self.values
+        for name, operator, positions in self.bound:
+            inputs = [decoded[i] for i in positions]
+            if any(x != x for x in inputs):
+                continue  # not in this sample
+            value = operator.update(t, *inputs)
+            values[name] = value
+            out.append((name, value))
+        return out
+
+    @property
+    def events(self):
+        """Recent throttle events, oldest first, as (time, value field)."""
+        return list(self.throttle.events) if self.throttle is not None else []
+
+    def items(self):
+        """(name, value, unit) of every metric with a value, in DERIVED order."""
+        values = dict(self.values)  # may be updated meanwhile on the executor thread
+        units = self.units
+        return [(name, values[name], units.get(name, '')) for name in self.specs if name in values]
+
+
+def replay(path, out):
+    """Write the raw fields and derived metrics of a recording as CSV."""
+    from tools.recorder import Recording
+    from tools.layouts import REGISTRY
+    from array import array
+
+    recording = Recording(path)
+    try:
+        layout = REGISTRY.for_version(recording.table_version, recording.table_size)
+        engine = DerivedEngine()
+        engine.bind(layout)
+        names = [name for name, _, _ in engine.bound]
+        writer = csv.writer(out)
+        writer.writerow(['time'] + list(layout.names) + names)
+        rows = 0
+        for t, row in recording.read_range(recording.start, recording.end):
+            values = array('f')
+            values.frombytes(row)
+            decoded = layout.decode(values)
+            engine.update_values(layout, t, decoded)
+            latest = engine.values
+            writer.writerow([f"{t:.3f}"] + [f"{v:g}" for v in decoded]
+                            + [f"{latest[n]:g}" if n in latest else '' for n in names])
+            rows += 1
+        return rows
+    finally:
+        recording.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute derived metrics over a recording')
+    parser.add_argument('recording', help='.brr file written by the Record option')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: stdout)')
+    args = parser.parse_args(argv)
+    try:
+        if args.output:
+            with open(args.output, 'w', newline='') as f:
+                rows = replay(args.recording, f)
+            print(f"{rows} rows written to {args.output}", file=sys.stderr)
+        else:
+            replay(args.recording, sys.stdout)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
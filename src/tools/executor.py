@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Seconds a caller waits for an SMU / ryzenadj operation before giving up
+DEFAULT_TIMEOUT = 10.0
+
+
+class _Op:
+    __slots__ = ('fn', 'key', 'future', 'not_before')
+
+    def __init__(self, fn, key, not_before):
+        self.fn = fn
+        self.key = key
+        self.future = Future()
+        self.not_before = not_before
+
+
+class SMUExecutor:
+    """Runs every ryzenadj / SMU operation on one worker thread.
+
+    Operations run in submission order, so a refresh queued after an apply
+    sees the applied limits and never a half-written state. Operations can
+    carry a key: submitting a key that is still queued either joins the
+    queued operation (refreshes, replace=False) or cancels it and takes its
+    place (applies, replace=True), so the queue holds at most one operation
+    per key however fast requests come in. A `delay` holds an operation back
+    without blocking the ones queued behind it, which is how applies are
+    debounced. An operation that is already running is never interrupted;
+    bounding how long it may take is up to the call itself (e.g. a
+    subprocess timeout).
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.running = None
+        self.stopping = False
+        self.thread = None
+
+    def start(self):
+        # Under the lock (an RLock), so concurrent first submits start one worker
+        with self.cond:
+            if self.thread is None:
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run, name='smu', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            for op in self.queue:
+                op.future.cancel()
+            self.queue.clear()
+            self.cond.notify()
+            thread = self.thread
+        if thread is not None:
+            thread.join(self.timeout)
+            with self.cond:
+                if self.thread is thread:
+                    self.thread = None
+
+    def submit(self, fn, key=None, replace=False, delay=0.0):
+        """Queue fn(); returns a concurrent.futures.Future for its result."""
+        with self.cond:
+            if key is not None:
+                for op in self.queue:
+                    if op.key == key:
+                        if not replace:
+                            return op.future
+                        op.future.cancel()
+                        self.queue.remove(op)
+                        break
+            op = _Op(fn, key, time.monotonic() + delay)
+            self.queue.append(op)
+            self.cond.notify()
+            self.start()
+        return op.future
+
+    def call(self, fn, key=None, timeout=None):
+        """Run fn() on the worker and wait for it; raises concurrent.futures.TimeoutError."""
+        future = self.submit(fn, key)
+        return future.result(self.timeout if timeout is None else timeout)
+
+    def pending(self, key):
+        """Whether an operation with this key is queued or running."""
+        with self.cond:
+            running = self.running
+            return ((running is not None and running.key == key)
+                    or any(op.key == key for op in self.queue))
+
+    def next_op(self):
+        # Called with self.cond held: first ready operation in queue order
+        while not self.stopping:
+            now = time.monotonic()
+            wait = None
+            for op in self.queue:
+                if op.not_before <= now:
+                    self.queue.remove(op)
+                    return op
+                remaining = op.not_before - now
+                wait = remaining if wait is None else min(wait, remaining)
+            self.cond.wait(wait)
+        return None
+
+    def run(self):
+        while True:
+            with self.cond:
+                op = self.next_op()
+                if op is None:
+                    return
+                self.running = op
+            try:
+                if op.future.set_running_or_notify_cancel():
+                    try:
+                        op.future.set_result(op.fn())
+                    except BaseException as e:
+                        op.future.set_exception(e)
+            finally:
+                with self.cond:
+                    self.running = None
+
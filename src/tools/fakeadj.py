@@ -0,0 +1,144 @@
+"""Python stand-in for libryzenadj, for running the telemetry path without AMD hardware.
+
+FakeRyzenAdjLib exposes the same calls that readjust.py and pmtable-example.py
+make through ctypes, so it can be handed to LibRyzenAdjBackend(lib=...).
+Running this file with --dump-table prints a table in ryzenadj.exe format,
+which lets DumpTableBackend([sys.executable, 'fakeadj.py']) be exercised too.
+"""
+import sys
+import math
+import struct
+from ctypes import c_float, POINTER, cast
+
+TABLE_VERSION = 0x400005
+TABLE_SIZE = 560  # entries, get_table_size() reports bytes
+
+# Table index of every get_* field
+FIELD_INDEX = {
+    'stapm_limit': 0, 'stapm_value': 1,
+    'fast_limit': 2, 'fast_value': 3,
+    'slow_limit': 4, 'slow_value': 5,
+    'apu_slow_limit': 6, 'apu_slow_value': 7,
+    'vrm_current': 8, 'vrm_current_value': 9,
+    'vrmsoc_current': 10, 'vrmsoc_current_value': 11,
+    'vrmmax_current': 12, 'vrmmax_current_value': 13,
+    'vrmsocmax_current': 14, 'vrmsocmax_current_value': 15,
+    'tctl_temp': 16, 'tctl_temp_value': 17,
+    'apu_skin_temp_limit': 22, 'apu_skin_temp_value': 23,
+    'dgpu_skin_temp_limit': 24, 'dgpu_skin_temp_value': 25,
+}
+
+# set_* value is in mW / mA, the table holds W / A
+SET_SCALE = {
+    'stapm_limit': 0.001, 'fast_limit': 0.001, 'slow_limit': 0.001, 'apu_slow_limit': 0.001,
+    'vrm_current': 0.001, 'vrmsoc_current': 0.001, 'vrmmax_current': 0.001, 'vrmsocmax_current': 0.001,
+}
+
+DEFAULT_TABLE = {
+    0: 25.0, 2: 35.0, 4: 25.0, 6: 25.0,
+    8: 60.0, 10: 10.0, 12: 90.0, 14: 15.0,
+    16: 95.0, 22: 45.0, 24: 45.0,
+    26: 4300.0, 27: 1800.0,
+    81: 180.0, 84: 250.0, 85: 190.0,  # shown as 10x in the GUI map
+    165: 42.0, 169: 68.0,
+}
+
+
+class _Func:
+    """Callable that accepts argtypes/restype like a ctypes function."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.argtypes = None
+        self.restype = None
+
+    def __call__(self, *args):
+        return self.fn(*args)
+
+
+class FakeRyzenAdjLib:
+    HANDLE = 1
+
+    def __init__(self, table_version=TABLE_VERSION, table_size=TABLE_SIZE):
+        self.table_version = table_version
+        self.table_size = table_size
+        self.table = (c_float * table_size)()
+        for index, value in DEFAULT_TABLE.items():
+            self.table[index] = value
+        self.extra = {}  # set_* fields without a table slot (clocks, times)
+        self.ticks = 0
+        self.init_ryzenadj = _Func(lambda: self.HANDLE)
+        self.cleanup_ryzenadj = _Func(lambda ry: None)
+        self.get_table_ver = _Func(lambda ry: self.table_version)
+        self.get_table_size = _Func(lambda ry: self.table_size * 4)
+        self.get_table_values = _Func(lambda ry: cast(self.table, POINTER(c_float)))
+        self.refresh_table = _Func(self._refresh)
+
+    def _refresh(self, ry):
+        self.ticks += 1
+        load = 0.5 + 0.4 * math.sin(self.ticks / 5)
+        t = self.table
+        t[1] = t[0] * load
+        t[3] = t[2] * load
+        t[5] = t[4] * load
+        t[7] = t[6] * load
+        t[9] = t[8] * load
+        t[11] = t[10] * load
+        t[13] = t[12] * load
+        t[15] = t[14] * load
+        t[17] = 45.0 + 40.0 * load
+        t[23] = 35.0 + 10.0 * load
+        t[81] = t[1] * 10
+        t[165] = t[23]
+        t[169] = t[17]
+        return 0
+
+    def reset_limits(self):
+        """Put every limit back to its default, like firmware reverting them."""
+        for index, value in DEFAULT_TABLE.items():
+            if index < 26:
+                self.table[index] = value
+
+    def _set(self, field, ry, value=None):
+        if field in FIELD_INDEX:
+            self.table[FIELD_INDEX[field]] = value * SET_SCALE.get(field, 1)
+        else:
+            self.extra[field] = value
+        return 0
+
+    def _get(self, field, ry):
+        if field in FIELD_INDEX:
+            return self.table[FIELD_INDEX[field]]
+        return float('nan')
+
+    def __getattr__(self, name):
+        # set_fast_limit, get_tctl_temp, ... resolve lazily like ctypes does
+        if name.startswith('set_'):
+            fn = _Func(lambda ry, value=None, field=name[4:]: self._set(field, ry, value))
+        elif name.startswith('get_'):
+            fn = _Func(lambda ry, field=name[4:]: self._get(field, ry))
+        else:
+            raise AttributeError(name)
+        setattr(self, name, fn)
+        return fn
+
+
+def dump_table_text(lib):
+    """Format lib's table the way `ryzenadj --dump-table` does."""
+    lines = [
+        f"PM Table Version: {lib.table_version:x}",
+        " Offset |    Data    |   Value   ",
+        "--------|------------|-----------",
+    ]
+    for index in range(lib.table_size):
+        value = lib.table[index]
+        bits = struct.unpack('<I', struct.pack('<f', value))[0]
+        lines.append(f"| 0x{index * 4:04x} | 0x{bits:08x} | {value:>10.6f} |")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    if '--dump-table' in sys.argv[1:]:
+        lib = FakeRyzenAdjLib()
+        lib.refresh_table(lib.HANDLE)
+        sys.stdout.write(dump_table_text(lib))
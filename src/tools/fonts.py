@@ -0,0 +1,83 @@
+"""UI font loading limited to the glyphs the UI actually draws.
+
+The glyph set is every character outside Basic Latin / Latin-1 found in the
+string literals of the UI sources, cached on disk keyed by the sources'
+size and mtime so startup does not re-tokenize them. pyimgui can not load a
+baked atlas back (there is no way to restore glyph metrics), so the atlas
+itself is still built at startup, but only for these ranges.
+"""
+import os
+import json
+import tokenize
+
+import imgui
+
+FONT_PATH = r"C:\\Windows\\Fonts\\msyh.ttc"
+FONT_SIZE = 20
+
+# Always included: printable ASCII and Latin-1 (°, µ, ...)
+BASE_RANGES = [(0x20, 0xFF)]
+
+
+def source_key(sources):
+    key = []
+    for path in sources:
+        st = os.stat(path)
+        key.append([os.path.basename(path), st.st_size, int(st.st_mtime)])
+    return key
+
+
+def ui_codepoints(sources):
+    """Code points above Latin-1 used in string literals of the given files."""
+    codepoints = set()
+    for path in sources:
+        with tokenize.open(path) as f:
+            for token in tokenize.generate_tokens(f.readline):
+                if token.type == tokenize.STRING:
+                    codepoints.update(ord(c) for c in token.string if ord(c) > 0xFF)
+    return sorted(codepoints)
+
+
+def cached_codepoints(sources, cache_path):
+    key = source_key(sources)
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get('key') == key:
+            return cached['codepoints']
+    except (OSError, ValueError):
+        pass
+    codepoints = ui_codepoints(sources)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump({'key': key, 'codepoints': codepoints}, f)
+    except OSError:
+        pass  # read-only install: rescan next time
+    return codepoints
+
+
+def glyph_ranges(codepoints):
+    """Flat, 0-terminated [first, last, first, last, ..., 0] list for ImGui."""
+    ranges = list(BASE_RANGES)
+    for cp in sorted(codepoints):
+        first, last = ranges[-1]
+        if first <= cp <= last + 1:
+            ranges[-1] = (first, max(last, cp))
+        else:
+            ranges.append((cp, cp))
+    flat = [n for pair in ranges for n in pair]
+    flat.append(0)
+    return flat
+
+
+def load_ui_font(io, sources, cache_path, path=FONT_PATH, size=FONT_SIZE):
+    """Add the UI font to io.fonts; returns the GlyphRanges, which must be kept
+    alive until the font texture is built."""
+    io.fonts.clear()
+    if not os.path.exists(path):
+        io.fonts.add_font_default()
+        return None
+    ranges = imgui.core.GlyphRanges(glyph_ranges(cached_codepoints(sources, cache_path)))
+    io.fonts.add_font_from_file_ttf(path, size, glyph_ranges=ranges)
+    return ranges
@@ -0,0 +1,87 @@
+import time
+
+
+class FramePacer:
+    """Decides when the window needs a new frame and how often to check.
+
+    In on-demand mode a frame is drawn only after input or when the watched
+    data version changes. Input keeps the UI at the FPS cap for `linger`
+    seconds so ImGui hover/active states settle, after which the check rate
+    drops to `idle_interval`, or `background_interval` when unfocused. A
+    hidden (minimized) window is not ticked at all.
+    """
+
+    def __init__(self, fps_cap=60, on_demand=True, idle_interval=0.25,
+                 background_interval=1.0, linger=0.5):
+        self.fps_cap = fps_cap
+        self.on_demand = on_demand
+        self.idle_interval = idle_interval
+        self.background_interval = background_interval
+        self.linger = linger
+        self.visible = True
+        self.focused = True
+        self.pending = True
+        self.active_until = 0.0
+        self.last_version = None
+        # Frame counter
+        self.frame_start = 0.0
+        self.window_start = time.perf_counter()
+        self.window_frames = 0
+        self.window_busy = 0.0
+        self.fps = 0.0
+        self.frame_ms = 0.0
+        self.frames = 0
+
+    def invalidate(self):
+        self.pending = True
+        self.active_until = time.monotonic() + self.linger
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.invalidate()
+
+    def set_focused(self, focused):
+        self.focused = focused
+        self.invalidate()
+
+    def watch(self, version):
+        if version != self.last_version:
+            self.last_version = version
+            self.pending = True
+
+    def animating(self):
+        return not self.on_demand or time.monotonic() < self.active_until
+
+    def interval(self):
+        """Seconds until the next check, or None to stop ticking."""
+        if not self.visible:
+            return None
+        if self.animating():
+            return 1.0 / max(1, self.fps_cap)
+        return self.idle_interval if self.focused else self.background_interval
+
+    def should_draw(self):
+        return self.visible and (self.pending or self.animating())
+
+    def frame_started(self):
+        self.pending = False
+        self.frame_start = time.perf_counter()
+
+    def frame_finished(self):
+        now = time.perf_counter()
+        self.frames += 1
+        self.window_frames += 1
+        self.window_busy += now - self.frame_start
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.fps = self.window_frames / elapsed
+            self.frame_ms = self.window_busy * 1000 / self.window_frames
+            self.window_start = now
+            self.window_frames = 0
+            self.window_busy = 0.0
+
+    def current_fps(self):
+        # Decay to zero when nothing was drawn for a while
+        if time.perf_counter() - self.window_start > 2.0:
+            return 0.0
+        return self.fps
@@ -0,0 +1,136 @@
+"""Per-core load and clock history, drawn as one texture.
+
+CoreRing keeps the last `length` samples of `rows` values (one per logical
+core) in an array('f'), one run of `length` entries per core, and next to it
+the same samples quantized to levels 1..255 in a bytearray (0 = no sample
+yet). Turning the ring into an RGBA image is then slicing plus
+bytes.translate() through a palette, all in C, and HeatmapTexture sends
+that image to the GPU once per new sample. Drawing it is a single
+imgui.image() whatever the number of cores, instead of one rectangle per
+core and sample every frame.
+"""
+from array import array
+
+import imgui
+
+
+def make_palette():
+    """R, G, B, A translate tables: level 0 transparent, then dark blue to
+    cyan, yellow and red."""
+    stops = [(0.0, (20, 30, 90)), (0.35, (20, 170, 200)), (0.7, (240, 220, 40)), (1.0, (230, 40, 30))]
+    tables = [bytearray(256) for _ in range(4)]
+    for level in range(1, 256):
+        x = (level - 1) / 254
+        for (x0, c0), (x1, c1) in zip(stops, stops[1:]):
+            if x <= x1:
+                f = (x - x0) / (x1 - x0)
+                for channel in range(3):
+                    tables[channel][level] = round(c0[channel] + (c1[channel] - c0[channel]) * f)
+                break
+        tables[3][level] = 255
+    return [bytes(t) for t in tables]
+
+
+PALETTE = make_palette()
+
+
+class CoreRing:
+    """`length` columns (samples) by `rows` cores, oldest column overwritten."""
+
+    def __init__(self, rows, length, lo=0.0, hi=100.0):
+        self.rows = rows
+        self.length = length
+        self.lo = lo
+        self.hi = hi
+        self.values = array('f', [float('nan')]) * (rows * length)
+        self.levels = bytearray(rows * length)
+        self.head = 0  # column the next sample goes to
+        self.count = 0
+        self.version = 0
+
+    def quantize(self, value):
+        if value != value:
+            return 0
+        level = int((value - self.lo) * 254 / (self.hi - self.lo)) + 1
+        return 1 if level < 1 else 255 if level > 255 else level
+
+    def append(self, row):
+        """One sample: a value per core; missing cores are left empty."""
+        column = self.head
+        length = self.length
+        values = self.values
+        levels = self.levels
+        quantize = self.quantize
+        for r in range(self.rows):
+            value = row[r] if r < len(row) else float('nan')
+            values[r * length + column] = value
+            levels[r * length + column] = quantize(value)
+        self.head = (column + 1) % length
+        self.count = min(self.count + 1, length)
+        self.version += 1
+
+    def set_range(self, lo, hi):
+        """Change the value range; requantizes the stored samples."""
+        if (lo, hi) != (self.lo, self.hi):
+            self.lo, self.hi = lo, hi
+            self.levels[:] = bytes(map(self.quantize, self.values))
+            self.version += 1
+
+    def value(self, row, column):
+        """Value of a core at a display column (0 = oldest), NaN if empty."""
+        return self.values[row * self.length + (self.head + column) % self.length]
+
+    def rgba(self, palette=PALETTE):
+        """The ring as RGBA rows, core 0 first, oldest sample left."""
+        length = self.length
+        head = self.head
+        levels = bytearray(len(self.levels))
+        source = self.levels
+        for r in range(self.rows):
+            base = r * length
+            levels[base:base + length - head] = source[base + head:base + length]
+            levels[base + length - head:base + length] = source[base:base + head]
+        image = bytearray(4 * len(levels))
+        for channel in range(4):
+            image[channel::4] = levels.translate(palette[channel])
+        return image
+
+
+class HeatmapTexture:
+    """GPU copy of a CoreRing, re-uploaded only when the ring changed."""
+
+    def __init__(self):
+        self.texture = None
+        self.size = None
+        self.version = None
+
+    def update(self, ring):
+        if ring.version == self.version:
+            return
+        from pyglet import gl, image
+        data = ring.rgba()
+        self.version = ring.version
+        if gl.current_context is None:
+            return  # headless (benchmarks): nothing to upload to
+        if self.texture is None or self.size != (ring.length, ring.rows):
+            self.texture = image.Texture.create(ring.length, ring.rows,
+                                                min_filter=gl.GL_NEAREST, mag_filter=gl.GL_NEAREST)
+            self.size = (ring.length, ring.rows)
+        # ImageData row 0 is texture row 0, drawn at the top by imgui.image()
+        self.texture.blit_into(image.ImageData(ring.length, ring.rows, 'RGBA', bytes(data)), 0, 0, 0)
+
+    def draw(self, ring, width, height, unit=''):
+        """The heatmap at the cursor, with the hovered cell in a tooltip."""
+        self.update(ring)
+        if self.texture is None:
+            imgui.dummy(width, height)
+        else:
+            imgui.image(self.texture.id, width, height)
+        if imgui.is_item_hovered():
+            x0, y0 = imgui.get_item_rect_min()
+            mx, my = imgui.get_mouse_pos()
+            column = min(ring.length - 1, max(0, int((mx - x0) * ring.length / width)))
+            row = min(ring.rows - 1, max(0, int((my - y0) * ring.rows / height)))
+            value = ring.value(row, column)
+            if value == value:
+                imgui.set_tooltip(f"Core {row}: {value:.0f} {unit}")
@@ -0,0 +1,198 @@
+import time
+from array import array
+
+# (bucket width in seconds, buckets kept): 1 h at 1 s, 6 h at 10 s, 24 h at 1 min
+DEFAULT_TIERS = ((1.0, 3600), (10.0, 2160), (60.0, 1440))
+
+
+class Tier:
+    """Ring of fixed-width time buckets holding min / max / mean of the samples in each."""
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.capacity = capacity
+        self.t = array('d', bytes(8 * capacity))      # bucket start time
+        self.lo = array('f', bytes(4 * capacity))
+        self.hi = array('f', bytes(4 * capacity))
+        self.avg = array('f', bytes(4 * capacity))
+        self.n = array('I', bytes(4 * capacity))
+        self.head = 0
+        self.count = 0
+        self.bucket = None  # id of the bucket at head - 1
+
+    def add(self, value, t):
+        bucket = int(t // self.width)
+        if bucket != self.bucket:
+            i = self.head
+            self.head = i + 1 if i + 1 < self.capacity else 0
+            if self.count < self.capacity:
+                self.count += 1
+            self.bucket = bucket
+            self.t[i] = bucket * self.width
+            self.lo[i] = self.hi[i] = self.avg[i] = value
+            self.n[i] = 1
+            return
+        i = self.head - 1
+        n = self.n[i] + 1
+        self.n[i] = n
+        self.avg[i] += (value - self.avg[i]) / n
+        if value < self.lo[i]:
+            self.lo[i] = value
+        elif value > self.hi[i]:
+            self.hi[i] = value
+
+    def newest(self, since):
+        """Ring indices of the buckets starting at or after `since`, oldest first."""
+        indices = []
+        i = self.head
+        for _ in range(self.count):
+            i = i - 1 if i else self.capacity - 1
+            if self.t[i] < since:
+                break
+            indices.append(i)
+        indices.reverse()
+        return indices
+
+    def covering(self, since):
+        # Bucket count the range would need; cheaper than walking the ring
+        if not self.count:
+            return 0
+        last = self.t[self.head - 1]
+        return min(self.count, int((last - since) // self.width) + 1)
+
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the shape."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        count = end - start
+        avg_x = sum(xs[start:end]) / count
+        avg_y = sum(ys[start:end]) / count
+
+        lo = int(i * every) + 1
+        hi = start
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+class TieredSeries:
+    """Time series kept at several bucket resolutions at once.
+
+    Every sample updates one bucket per tier, so appends stay O(tiers) and
+    a long range is read from a coarse tier instead of from raw samples.
+    view() picks the finest tier with at most two buckets per output point,
+    expands buckets that hold several samples into their min and max so
+    spikes survive, and reduces the result with LTTB. The work per view is
+    bounded by the number of points asked for, not by the time range.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = [Tier(width, capacity) for width, capacity in tiers]
+        self.version = 0
+        self.latest = float('nan')
+        self.latest_time = 0.0
+        self.out = array('f')
+        self.cached = None
+
+    def append(self, value, t=None):
+        if value != value:
+            return  # NaN: the metric was not available this sample
+        t = time.monotonic() if t is None else t
+        for tier in self.tiers:
+            tier.add(value, t)
+        self.latest = value
+        self.latest_time = t
+        self.version += 1
+
+    def last(self, default=float('nan')):
+        return self.latest if self.version else default
+
+    def __len__(self):
+        return self.tiers[0].count
+
+    def tier_for(self, duration, points):
+        since = self.latest_time - duration
+        for tier in self.tiers:
+            if tier.covering(since) <= 2 * points:
+                return tier
+        return self.tiers[-1]
+
+    def view(self, duration, points):
+        """(values, count) for the last `duration` seconds in at most `points` points.
+
+        The result is cached until the next append or a different request;
+        `values` is reused between calls and must not be kept.
+        """
+        key = (self.version, duration, points)
+        if self.cached and self.cached[0] == key:
+            return self.out, self.cached[1]
+
+        tier = self.tier_for(duration, points)
+        xs, ys = [], []
+        half = tier.width / 2
+        t, lo, hi, avg, n = tier.t, tier.lo, tier.hi, tier.avg, tier.n
+        for i in tier.newest(self.latest_time - duration):
+            if n[i] > 1 and lo[i] != hi[i]:
+                xs.append(t[i])
+                xs.append(t[i] + half)
+                ys.append(lo[i])
+                ys.append(hi[i])
+            else:
+                xs.append(t[i])
+                ys.append(avg[i])
+
+        if len(ys) > points:
+            ys = [ys[i] for i in lttb(xs, ys, points)]
+        if len(self.out) < len(ys):
+            self.out = array('f', bytes(4 * len(ys)))
+        self.out[:len(ys)] = array('f', ys)
+        self.cached = (key, len(ys))
+        return self.out, len(ys)
+
+
+class HistoryStore:
+    """Named tiered series: CPU load plus every PM table metric."""
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        self.tiers = tiers
+        self.series = {}
+
+    def add_series(self, name, tiers=None):
+        series = self.series.get(name)
+        if series is None:
+            series = TieredSeries(tiers or self.tiers)
+            self.series[name] = series
+        return series
+
+    def get(self, name):
+        return self.series.get(name)
+
+    def append(self, name, value, t=None):
+        series = self.series.get(name)
+        if series is None:
+            series = self.add_series(name)
+        series.append(value, t)
+
+    def record_snapshot(self, snapshot):
+        layout = snapshot.layout
+        if layout.raw:
+            return  # no series for unnamed entries of an unknown table version
+        t = snapshot.timestamp
+        for name, value in zip(layout.names, snapshot.decode()):
+            self.append(name, value, t)
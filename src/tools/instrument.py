@@ -0,0 +1,158 @@
+import json
+import math
+import time
+from array import array
+
+# Histogram buckets grow by 2**(1/4) (~19%) from 1 µs, covering up to ~70 s
+BUCKET_RATIO = 2 ** 0.25
+BUCKET_COUNT = 105
+LOG_RATIO = math.log(BUCKET_RATIO)
+
+
+class Histogram:
+    """Fixed-size log-bucketed latency histogram."""
+
+    def __init__(self):
+        self.buckets = array('L', bytes(array('L').itemsize * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        index = int(math.log(us) / LOG_RATIO) if us > 1 else 0
+        self.buckets[min(index, BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_RATIO ** (index + 1) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total * 1000 / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class _Span:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+    """Named spans feeding latency histograms.
+
+    Disabled, span() hands back one shared no-op context manager, so an
+    instrumented call site costs a method call and nothing else.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.started = time.time()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self.histogram(name))
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def reset(self):
+        self.histograms = {}
+        self.started = time.time()
+
+    def summary(self):
+        return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def export(self, path, startup=None):
+        data = {
+            'started': self.started,
+            'exported': time.time(),
+            'bucket_ratio': BUCKET_RATIO,
+            'spans': {name: dict(h.summary(), buckets=list(h.buckets))
+                      for name, h in sorted(self.histograms.items())},
+        }
+        if startup is not None:
+            data['startup'] = [{'phase': phase, 'elapsed_ms': elapsed * 1000, 'ms': took * 1000}
+                               for phase, elapsed, took in startup.phases]
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+class StartupTimer:
+    """Startup phase breakdown, timed from when this module was imported.
+
+    Each mark() records (phase, seconds since start, seconds since the
+    previous mark). Collected whether or not spans are enabled.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+        self.marked = set()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.start, now - self.last))
+        self.marked.add(phase)
+        self.last = now
+
+    def once(self, phase):
+        # For milestones reached from a hot path, e.g. the first frame
+        if phase not in self.marked:
+            self.mark(phase)
+
+
+# Process-wide instances used by the app and tools
+INSTRUMENTS = Instrumentation()
+STARTUP = StartupTimer()
+span = INSTRUMENTS.span
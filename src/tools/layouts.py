@@ -0,0 +1,124 @@
+"""PM table layouts keyed by table version.
+
+A layout names table entries and gives each a scale and unit. Layouts are
+data files in tools/pm_layouts/*.ini:
+
+    [Layout]
+    name = Renoir / Cezanne
+    versions = 0x370000-0x370005, 0x400001-0x400005
+
+    [Fields]
+    ; name = byte offset, scale, unit
+    stapm-value = 0x0144, 0.1, W
+
+Field indices and scales are precomputed as tuples, so decode() turns a
+whole table into scaled values with one itemgetter call and one map(),
+both looping in C. A table version without a layout gets a raw layout:
+every entry named by its offset, unscaled.
+"""
+import os
+import configparser
+from operator import itemgetter, mul
+
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pm_layouts')
+
+
+class Layout:
+    def __init__(self, name, versions, fields, raw=False):
+        self.name = name
+        self.versions = frozenset(versions)
+        # name -> (table index, scale, unit), in display order
+        self.fields = dict(fields)
+        self.names = tuple(self.fields)
+        self.indices = tuple(f[0] for f in self.fields.values())
+        self.scales = tuple(f[1] for f in self.fields.values())
+        self.raw = raw
+        if len(self.indices) > 1:
+            self.getter = itemgetter(*self.indices)
+        elif self.indices:
+            index = self.indices[0]
+            self.getter = lambda values: (values[index],)
+        else:
+            self.getter = lambda values: ()
+
+    def decode(self, values):
+        """Scaled values of every field, in `names` order."""
+        return tuple(map(mul, self.getter(values), self.scales))
+
+    def sized(self, size):
+        """This layout without the fields beyond a table of `size` entries."""
+        if all(index < size for index in self.indices):
+            return self
+        fields = {n: f for n, f in self.fields.items() if f[0] < size}
+        return Layout(self.name, self.versions, fields, self.raw)
+
+
+def raw_layout(size):
+    return Layout('raw', (), {f"0x{i * 4:04x}": (i, 1.0, '') for i in range(size)}, raw=True)
+
+
+def parse_versions(text):
+    versions = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (int(p, 0) for p in part.split('-', 1))
+            versions.update(range(first, last + 1))
+        else:
+            versions.add(int(part, 0))
+    return versions
+
+
+def load_layout(path):
+    """Read one layout file; raises ValueError when it is malformed."""
+    parser = configparser.ConfigParser(inline_comment_prefixes=(';',))
+    parser.optionxform = str  # field names are case sensitive
+    with open(path, encoding='utf-8') as f:
+        parser.read_file(f)
+    if 'Layout' not in parser or 'Fields' not in parser:
+        raise ValueError(f"{path}: needs [Layout] and [Fields] sections")
+    fields = {}
+    for name, value in parser['Fields'].items():
+        parts = [p.strip() for p in value.split(',')]
+        if len(parts) != 3:
+            raise ValueError(f"{path}: {name} must be 'offset, scale, unit'")
+        offset, scale, unit = parts
+        fields[name] = (int(offset, 0) // 4, float(scale), unit)
+    header = parser['Layout']
+    return Layout(header.get('name', os.path.basename(path)),
+                  parse_versions(header.get('versions', '')), fields)
+
+
+class LayoutRegistry:
+    def __init__(self, directory=LAYOUT_DIR):
+        self.layouts = []
+        self.by_version = {}
+        self.raw = {}
+        self.errors = []
+        if os.path.isdir(directory):
+            for entry in sorted(os.listdir(directory)):
+                if entry.endswith('.ini'):
+                    try:
+                        self.add(load_layout(os.path.join(directory, entry)))
+                    except (OSError, ValueError, configparser.Error) as e:
+                        self.errors.append(str(e))
+
+    def add(self, layout):
+        # Later files win for a version listed twice
+        self.layouts.append(layout)
+        for version in layout.versions:
+            self.by_version[version] = layout
+
+    def for_version(self, version, size):
+        layout = self.by_version.get(version)
+        if layout is not None:
+            return layout.sized(size)
+        raw = self.raw.get(size)
+        if raw is None:
+            raw = self.raw[size] = raw_layout(size)
+        return raw
+
+
+REGISTRY = LayoutRegistry()
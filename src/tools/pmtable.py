@@ -0,0 +1,128 @@
+import os
+import time
+import struct
+from ctypes import c_float, memmove
+
+from tools.layouts import REGISTRY, raw_layout
+
+class PMTableSnapshot:
+    """One PM table sample held in a preallocated c_float buffer.
+
+    `values` and `bits` are float / uint32 memoryviews over the same buffer,
+    created once per slot, so a refresh costs a single memmove and no new
+    Python objects. `layout` (tools.layouts) names and scales the entries;
+    without one every entry is exposed raw by its offset.
+    """
+
+    def __init__(self, size, layout=None):
+        self.size = size
+        self.buffer = (c_float * size)()
+        self.raw = memoryview(self.buffer).cast('B')
+        self.values = self.raw.cast('f')
+        self.bits = self.raw.cast('I')
+        self.layout = layout.sized(size) if layout is not None else raw_layout(size)
+        self.fields = self.layout.fields
+        self.version = 0
+        self.timestamp = 0.0
+        self.table_version = 0
+        self.decoded = None  # decode() cache, dropped by every fill
+
+    def fill_from(self, ptr):
+        memmove(self.buffer, ptr, self.size * 4)
+        self.decoded = None
+
+    def fill_from_bytes(self, data):
+        self.raw[:] = data
+        self.decoded = None
+
+    def decode(self):
+        """Every layout field, scaled, in layout order; computed once per fill."""
+        if self.decoded is None:
+            self.decoded = self.layout.decode(self.values)
+        return self.decoded
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def get(self, name, default=None):
+        field = self.fields.get(name)
+        if field is None:
+            return default
+        return self.values[field[0]] * field[1]
+
+    def unit(self, name):
+        return self.fields[name][2]
+
+    def offset(self, name):
+        return f"0x{self.fields[name][0] * 4:04x}"
+
+    def hexdata(self, name):
+        return f"0x{self.bits[self.fields[name][0]]:08x}"
+
+
+class SnapshotRing:
+    """A few preallocated snapshot slots reused round-robin.
+
+    The backend fills the slot returned by acquire() while readers keep using
+    the previously published one, so the GUI never sees a half-written table.
+    """
+
+    def __init__(self, slots=3, registry=REGISTRY):
+        self.count = slots
+        self.registry = registry
+        self.slots = []
+        self.key = None
+        self.index = 0
+        self.version = 0
+        self.latest = None
+
+    def acquire(self, size, table_version=0):
+        # The layout is picked once per (size, table version), not per refresh
+        if self.key != (size, table_version):
+            layout = self.registry.for_version(table_version, size)
+            self.slots = [PMTableSnapshot(size, layout) for _ in range(self.count)]
+            self.key = (size, table_version)
+            self.index = 0
+        slot = self.slots[self.index]
+        self.index = (self.index + 1) % self.count
+        return slot
+
+    def publish(self, slot):
+        self.version += 1
+        slot.version = self.version
+        slot.timestamp = time.monotonic()
+        self.latest = slot
+        return slot
+
+
+# Last-snapshot cache: magic, table size, table version, then the raw table
+SNAPSHOT_HEADER = struct.Struct('<4sII')
+SNAPSHOT_MAGIC = b'BRCS'
+
+
+def save_snapshot(snapshot, path):
+    """Write the snapshot atomically so a crash never leaves a torn cache."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, snapshot.size, snapshot.table_version))
+        f.write(snapshot.raw)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path, registry=REGISTRY):
+    """The snapshot saved by save_snapshot(), or None if missing or invalid."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    magic, size, table_version = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or len(data) != SNAPSHOT_HEADER.size + 4 * size:
+        return None
+    snapshot = PMTableSnapshot(size, registry.for_version(table_version, size))
+    snapshot.fill_from_bytes(data[SNAPSHOT_HEADER.size:])
+    snapshot.table_version = table_version
+    return snapshot
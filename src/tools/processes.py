@@ -0,0 +1,153 @@
+"""Top CPU consumers, cheap enough to refresh every couple of seconds.
+
+ProcessTracker keeps one entry per live process across refreshes, keyed
+by pid: the psutil.Process object, its name (read once, when the process
+first shows up) and its CPU time at the previous refresh. The first
+refresh is one process_iter(attrs=['name', 'cpu_times']) pass that
+fetches only those two attributes. After that a refresh lists the pids
+and asks each cached Process whether it still runs and for its CPU times,
+a subtraction per process; only new or reused pids create a Process.
+is_running() compares the pid's current create time with the one the
+Process was made with, so a pid the OS hands to a new process starts a
+new entry instead of inheriting the old one's name and CPU time.
+process_iter() skips that check on cached processes.
+
+A process that exits, or whose pid is reused, is dropped in the same
+refresh: it is left out of `top` and `shares` rather than keeping the CPU
+share it had last time.
+
+The entries stay in one list sorted by CPU share. Shares change little
+between refreshes, so re-sorting that list is close to a single pass
+(Timsort keeps the runs of the previous order) rather than a full sort.
+
+`top` and `shares` are replaced as a whole on every refresh and are safe
+to read from any thread. `shares` sums the CPU share per executable name
+over all processes, which is what rules match with `busy = ...`
+(tools.rules).
+"""
+import os
+import time
+from collections import namedtuple
+from operator import attrgetter
+
+# One row of the panel; cpu is % of the whole machine, like the CPU Usage figure
+TopProcess = namedtuple('TopProcess', 'pid name cpu')
+
+TOP_COUNT = 10
+
+
+class Entry:
+    __slots__ = ('process', 'pid', 'name', 'times', 'cpu', 'seen')
+
+    def __init__(self, process, name, times):
+        self.process = process
+        self.pid = process.pid
+        self.name = name
+        self.times = times
+        self.cpu = 0.0
+        self.seen = 0
+
+
+class ProcessTracker:
+    def __init__(self, count=TOP_COUNT):
+        self.count = count
+        self.entries = {}  # pid -> Entry of the process holding it now
+        self.order = []    # every Entry, highest cpu first as of the last refresh
+        self.cpus = os.cpu_count() or 1
+        self.last = None
+        self.span = 0.0    # seconds the last shares were measured over
+        self.generation = 0
+        self.top = []
+        self.shares = {}   # lower-case executable name -> summed cpu
+
+    def refresh(self):
+        """Measure every process; returns the new top list."""
+        import psutil
+        now = time.monotonic()
+        span = now - self.last if self.last is not None else 0.0
+        scale = 100.0 / (span * self.cpus) if span > 0 else 0.0
+        self.generation += 1
+        generation = self.generation
+        entries = self.entries
+        added = []
+        if not entries:
+            # First pass: one process_iter() fetching just the two attributes
+            for process in psutil.process_iter(attrs=['name', 'cpu_times'], ad_value=None):
+                info = process.info
+                if process.pid == 0 or info['name'] is None:
+                    continue  # the idle "process" on Windows, or gone
+                times = info['cpu_times']
+                entry = entries[process.pid] = Entry(process, info['name'],
+                                                     None if times is None else times.user + times.system)
+                entry.seen = generation
+                added.append(entry)
+        else:
+            for pid in psutil.pids():
+                entry = entries.get(pid)
+                if entry is not None:
+                    if entry.process.is_running():  # same pid and create time
+                        if entry.times is None:
+                            entry.seen = generation
+                            continue  # access denied when it was first seen
+                        try:
+                            times = entry.process.cpu_times()
+                        except psutil.NoSuchProcess:
+                            continue  # exited just now; dropped below
+                        except psutil.Error:
+                            entry.cpu = 0.0
+                            entry.seen = generation
+                            continue
+                        times = times.user + times.system
+                        entry.cpu = max(times - entry.times, 0.0) * scale
+                        entry.times = times
+                        entry.seen = generation
+                        continue
+                    # Exited, and the pid may already belong to another process
+                    del entries[pid]
+                if pid == 0:
+                    continue
+                # New process: name it once and start measuring
+                try:
+                    process = psutil.Process(pid)
+                    with process.oneshot():
+                        name = process.name()
+                        try:
+                            times = process.cpu_times()
+                            times = times.user + times.system
+                        except psutil.AccessDenied:
+                            times = None
+                except psutil.Error:
+                    continue
+                entry = entries[pid] = Entry(process, name, times)
+                entry.seen = generation
+                added.append(entry)
+
+        # Drop the processes that exited before any share is published
+        order = [e for e in self.order if e.seen == generation and entries.get(e.pid) is e]
+        if len(order) + len(added) != len(entries):
+            for pid in [pid for pid, e in entries.items() if e.seen != generation]:
+                del entries[pid]
+        order.extend(added)
+        order.sort(key=attrgetter('cpu'), reverse=True)
+        self.order = order
+        self.last = now
+        self.span = span
+        self.top = [TopProcess(e.pid, e.name, e.cpu) for e in order[:self.count]] if span else []
+        shares = {}
+        for e in order:
+            if e.cpu <= 0.0:
+                break  # sorted: the rest are idle
+            key = e.name.lower()
+            shares[key] = shares.get(key, 0.0) + e.cpu
+        self.shares = shares
+        return self.top
+
+    def reset(self):
+        """Forget the last measurement but keep the cache, e.g. while nothing shows it."""
+        self.last = None
+        self.span = 0.0
+        self.top = []
+        self.shares = {}
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,36 @@
+import os
+
+from tools.ryzenadj import RA_FIELDS
+
+# Limit profiles live next to [Settings] in settings.ini as [Profile.<name>]
+# sections, holding PARAMETERS keys in ryzenadj units (mW, mA, MHz, °C).
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'settings.ini')
+SECTION_PREFIX = 'Profile.'
+DEFAULT_PROFILE = 'default'
+
+
+def profile_names(config):
+    return [s[len(SECTION_PREFIX):] for s in config.sections() if s.startswith(SECTION_PREFIX)]
+
+
+def load_profile(config, name=DEFAULT_PROFILE):
+    section = SECTION_PREFIX + name
+    if section not in config:
+        return {}
+    profile = {}
+    for key, value in config[section].items():
+        if key in RA_FIELDS and value.strip():
+            try:
+                profile[key] = int(float(value))
+            except ValueError:
+                continue
+    return profile
+
+
+def save_profile(config, name, values):
+    config[SECTION_PREFIX + name] = {k: str(v) for k, v in values.items() if k in RA_FIELDS and str(v)}
+
+
+def write_config(config, path=SETTINGS_PATH):
+    with open(path, 'w') as f:
+        config.write(f)
@@ -0,0 +1,259 @@
+"""Append-only PM table recordings.
+
+Data file: b'BRCREC1\\0', uint32 header length, JSON header (table version,
+table size, field map), then chunks. Every chunk is a '<4sIIIdd' header
+(b'CHNK', rows, raw length, stored length, first and last timestamp)
+followed by rows of float64 wall-clock time + float32 * table size,
+zlib-compressed when enabled.
+
+Index file (<data>.idx): one '<ddQI' record per chunk (first/last time,
+chunk offset, rows), so a time range is found by binary search over the
+mmapped index instead of scanning the data file.
+"""
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+
+from tools.telemetry import TelemetryBackend
+
+MAGIC = b'BRCREC1\0'
+FILE_HEADER = struct.Struct('<8sI')
+CHUNK_HEADER = struct.Struct('<4sIIIdd')
+CHUNK_MAGIC = b'CHNK'
+INDEX_ENTRY = struct.Struct('<ddQI')
+TIMESTAMP = struct.Struct('<d')
+
+
+def free_path(path):
+    """`path`, or name-2.brr, name-3.brr, ... if a recording is already there."""
+    base, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(path) or os.path.exists(path + '.idx'):
+        n += 1
+        path = f"{base}-{n}{ext}"
+    return path
+
+
+class Recorder:
+    """Streams snapshots into a recording, one chunk per `chunk_rows` rows."""
+
+    def __init__(self, path, table_size, table_version=0, fields=None,
+                 chunk_rows=64, compress=True, flush_interval=10.0):
+        path = free_path(path)
+        self.path = path
+        self.size = table_size
+        self.table_version = table_version
+        self.row_size = TIMESTAMP.size + 4 * table_size
+        self.chunk_rows = chunk_rows
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.rows = bytearray(self.row_size * chunk_rows)
+        self.count = 0
+        self.first = 0.0
+        self.last = 0.0
+        self.total = 0
+        self.last_flush = time.monotonic()
+
+        header = json.dumps({
+            'table_version': table_version,
+            'table_size': table_size,
+            'fields': fields or {},
+            'created': time.time(),
+            'compress': compress,
+        }).encode()
+        self.data = open(path, 'xb')
+        self.data.write(FILE_HEADER.pack(MAGIC, len(header)) + header)
+        self.data.flush()
+        self.index = open(path + '.idx', 'wb')
+
+    def append(self, snapshot, timestamp=None):
+        if snapshot.size != self.size:
+            raise ValueError(f"table size changed from {self.size} to {snapshot.size}")
+        timestamp = time.time() if timestamp is None else timestamp
+        offset = self.count * self.row_size
+        TIMESTAMP.pack_into(self.rows, offset, timestamp)
+        self.rows[offset + TIMESTAMP.size:offset + self.row_size] = snapshot.raw
+        if not self.count:
+            self.first = timestamp
+        self.last = timestamp
+        self.count += 1
+        self.total += 1
+        if (self.count == self.chunk_rows
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.count:
+            return
+        payload = bytes(memoryview(self.rows)[:self.count * self.row_size])
+        stored = zlib.compress(payload, 1) if self.compress else payload
+        offset = self.data.tell()
+        self.data.write(CHUNK_HEADER.pack(CHUNK_MAGIC, self.count, len(payload), len(stored),
+                                          self.first, self.last))
+        self.data.write(stored)
+        self.data.flush()
+        self.index.write(INDEX_ENTRY.pack(self.first, self.last, offset, self.count))
+        self.index.flush()
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+
+class Recording:
+    """Read-only view of a recording through mmap."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        self.header = json.loads(self.mm[FILE_HEADER.size:FILE_HEADER.size + length])
+        self.data_start = FILE_HEADER.size + length
+        self.table_size = self.header['table_size']
+        self.table_version = self.header['table_version']
+        self.row_size = TIMESTAMP.size + 4 * self.table_size
+        self.index = self.load_index(path + '.idx')
+        self.chunks = len(self.index) // INDEX_ENTRY.size
+        self.cached = (None, None)
+
+    def load_index(self, path):
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Index missing (e.g. copied without it): rebuild from chunk headers
+        index = bytearray()
+        offset = self.data_start
+        while offset + CHUNK_HEADER.size <= len(self.mm):
+            magic, rows, _, stored, first, last = CHUNK_HEADER.unpack_from(self.mm, offset)
+            if magic != CHUNK_MAGIC:
+                break
+            index += INDEX_ENTRY.pack(first, last, offset, rows)
+            offset += CHUNK_HEADER.size + stored
+        return index
+
+    def entry(self, i):
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+
+    @property
+    def start(self):
+        return self.entry(0)[0] if self.chunks else 0.0
+
+    @property
+    def end(self):
+        return self.entry(self.chunks - 1)[1] if self.chunks else 0.0
+
+    def find_chunk(self, t):
+        """First chunk whose last timestamp is >= t."""
+        lo, hi = 0, self.chunks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[1] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def chunk(self, i):
+        """Row bytes of chunk i; a direct mmap view when stored uncompressed."""
+        if self.cached[0] == i:
+            return self.cached[1]
+        offset = self.entry(i)[2]
+        _, rows, raw, stored, _, _ = CHUNK_HEADER.unpack_from(self.mm, offset)
+        start = offset + CHUNK_HEADER.size
+        data = memoryview(self.mm)[start:start + stored]
+        if stored != raw:
+            data = memoryview(zlib.decompress(data))
+        self.cached = (i, data)
+        return data
+
+    def timestamp(self, rows, row):
+        return TIMESTAMP.unpack_from(rows, row * self.row_size)[0]
+
+    def row(self, rows, row):
+        # A copy: a slice of the mmap view would keep the mmap from closing
+        offset = row * self.row_size + TIMESTAMP.size
+        return bytes(rows[offset:offset + 4 * self.table_size])
+
+    def read_range(self, t0, t1):
+        """Yield (timestamp, row bytes) for every row with t0 <= t <= t1."""
+        for i in range(self.find_chunk(t0), self.chunks):
+            first, last, _, count = self.entry(i)
+            if first > t1:
+                break
+            rows = self.chunk(i)
+            for row in range(count):
+                t = self.timestamp(rows, row)
+                if t0 <= t <= t1:
+                    yield t, self.row(rows, row)
+
+    def row_at(self, t):
+        """The last row recorded at or before t, as (timestamp, row bytes)."""
+        i = min(self.find_chunk(t), self.chunks - 1)
+        if i < 0:
+            return None
+        if self.entry(i)[0] > t:
+            if i == 0:
+                return None
+            i -= 1
+        rows = self.chunk(i)
+        lo, hi = 0, self.entry(i)[3]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(rows, mid) <= t:
+                lo = mid + 1
+            else:
+                hi = mid
+        row = max(lo - 1, 0)
+        return self.timestamp(rows, row), self.row(rows, row)
+
+    def close(self):
+        data = self.cached[1]
+        self.cached = (None, None)
+        if data is not None:
+            data.release()  # also invalidates it in a generator left suspended
+        self.mm.close()
+        if isinstance(self.index, mmap.mmap):
+            self.index.close()
+
+
+class ReplayBackend(TelemetryBackend):
+    """Feeds a recording back as if it were live, looping at the end."""
+    name = 'replay'
+
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.recording = None
+        self.started = 0.0
+
+    def open(self):
+        if self.recording is None:
+            self.recording = Recording(self.path)
+            if not self.recording.chunks:
+                raise RuntimeError(f"{self.path} has no recorded rows")
+            self.table_size = self.recording.table_size
+            self.table_version = self.recording.table_version
+            self.started = time.monotonic()
+
+    def close(self):
+        if self.recording is not None:
+            self.recording.close()
+            self.recording = None
+
+    def read_into(self, snapshot):
+        self.open()
+        rec = self.recording
+        span = max(rec.end - rec.start, 1e-6)
+        elapsed = ((time.monotonic() - self.started) * self.speed) % span
+        _, row = rec.row_at(rec.start + elapsed)
+        snapshot.fill_from_bytes(row)
+        snapshot.table_version = self.table_version
@@ -0,0 +1,234 @@
+"""Automatic profile switching.
+
+Rules are [Rule.<name>] sections in settings.ini, next to the [Profile.<name>]
+sections they select:
+
+    [Rule.battery]
+    profile = quiet
+    power = battery
+    priority = 10
+
+    [Rule.render]
+    profile = performance
+    process = blender.exe, HandBrake.exe
+    cpu_above = 60
+    for = 15
+    dwell = 60
+
+    [Rule.compile]
+    profile = performance
+    busy = cl.exe, rustc.exe, msbuild.exe
+    busy_above = 40
+
+Conditions, all of which must hold: power = ac | battery; cpu_above /
+cpu_below (%); temp_above / temp_below (°C, thm-core); process = foreground
+executable names; busy = executable names whose processes together use
+at least busy_above % (default 25) of the CPU, foreground or not
+(tools.processes). A matched threshold only releases once the value is
+`hysteresis` (default 5) back past it. `for` is how many seconds the
+conditions must hold before the rule becomes active, `dwell` how many
+seconds its profile then stays selected at least. The highest-priority
+active rule wins (ties: first in the file); with none active the default
+profile is used.
+"""
+from collections import namedtuple
+
+from tools.profiles import SECTION_PREFIX as PROFILE_PREFIX, DEFAULT_PROFILE
+
+SECTION_PREFIX = 'Rule.'
+
+# What rules are evaluated against; any field may be None when unknown
+Context = namedtuple('Context', 'time power cpu temp process busy')
+
+THRESHOLDS = {
+    'cpu_above': ('cpu', True),
+    'cpu_below': ('cpu', False),
+    'temp_above': ('temp', True),
+    'temp_below': ('temp', False),
+}
+OPTIONS = {'profile', 'priority', 'for', 'dwell', 'hysteresis', 'power', 'process', 'busy', 'busy_above'}
+BUSY_ABOVE = 25.0
+
+
+class Threshold:
+    """value > limit (or < limit) with hysteresis."""
+    __slots__ = ('attr', 'limit', 'above', 'hysteresis', 'state')
+
+    def __init__(self, attr, limit, above, hysteresis):
+        self.attr = attr
+        self.limit = limit
+        self.above = above
+        self.hysteresis = hysteresis
+        self.state = False
+
+    def __call__(self, ctx):
+        value = getattr(ctx, self.attr)
+        if value is None or value != value:
+            self.state = False
+        elif self.above:
+            self.state = value > (self.limit - self.hysteresis if self.state else self.limit)
+        else:
+            self.state = value < (self.limit + self.hysteresis if self.state else self.limit)
+        return self.state
+
+
+class Busy:
+    """The named executables use more than `limit` % of the CPU, with hysteresis."""
+    __slots__ = ('names', 'limit', 'hysteresis', 'state')
+
+    def __init__(self, names, limit, hysteresis):
+        self.names = tuple(frozenset(n.lower() for n in names))
+        self.limit = limit
+        self.hysteresis = hysteresis
+        self.state = False
+
+    def __call__(self, ctx):
+        shares = ctx.busy
+        if shares is None:
+            self.state = False
+        else:
+            value = sum(shares.get(name, 0.0) for name in self.names)
+            self.state = value > (self.limit - self.hysteresis if self.state else self.limit)
+        return self.state
+
+
+def power_is(source):
+    return lambda ctx: ctx.power == source
+
+
+def process_in(names):
+    names = frozenset(n.lower() for n in names)
+    return lambda ctx: ctx.process is not None and ctx.process.lower() in names
+
+
+class Rule:
+    def __init__(self, name, profile, conditions, priority=0, hold=0.0, dwell=0.0, needs=()):
+        self.name = name
+        self.profile = profile
+        self.conditions = conditions
+        self.priority = priority
+        self.hold = hold
+        self.dwell = dwell
+        self.needs = frozenset(needs)
+        self.since = None  # when all conditions started holding
+        self.active = False
+
+    def update(self, ctx):
+        # Every condition runs so thresholds keep their hysteresis state
+        held = True
+        for condition in self.conditions:
+            if not condition(ctx):
+                held = False
+        if not held:
+            self.since = None
+        elif self.since is None:
+            self.since = ctx.time
+        self.active = held and ctx.time - self.since >= self.hold
+        return self.active
+
+
+def compile_rule(name, section, profiles):
+    unknown = set(section) - OPTIONS - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f"[{SECTION_PREFIX}{name}]: unknown option(s) {', '.join(sorted(unknown))}")
+    profile = section.get('profile', '').strip()
+    if not profile:
+        raise ValueError(f"[{SECTION_PREFIX}{name}]: no profile")
+    if profile != DEFAULT_PROFILE and profile not in profiles:
+        raise ValueError(f"[{SECTION_PREFIX}{name}]: no [{PROFILE_PREFIX}{profile}] section")
+
+    hysteresis = section.getfloat('hysteresis', 5.0)
+    conditions = []
+    needs = set()
+    if 'power' in section:
+        source = section['power'].strip().lower()
+        if source not in ('ac', 'battery'):
+            raise ValueError(f"[{SECTION_PREFIX}{name}]: power must be ac or battery")
+        conditions.append(power_is(source))
+        needs.add('power')
+    if 'process' in section:
+        names = [n.strip() for n in section['process'].split(',') if n.strip()]
+        conditions.append(process_in(names))
+        needs.add('process')
+    if 'busy' in section:
+        names = [n.strip() for n in section['busy'].split(',') if n.strip()]
+        conditions.append(Busy(names, section.getfloat('busy_above', BUSY_ABOVE), hysteresis))
+        needs.add('busy')
+    elif 'busy_above' in section:
+        raise ValueError(f"[{SECTION_PREFIX}{name}]: busy_above without busy")
+    for option, (attr, above) in THRESHOLDS.items():
+        if option in section:
+            conditions.append(Threshold(attr, section.getfloat(option), above, hysteresis))
+            needs.add(attr)
+    return Rule(name, profile, conditions,
+                priority=section.getint('priority', 0),
+                hold=section.getfloat('for', 0.0),
+                dwell=section.getfloat('dwell', 0.0),
+                needs=needs)
+
+
+def compile_rules(config):
+    """All [Rule.*] sections, highest priority first; raises ValueError."""
+    profiles = {s[len(PROFILE_PREFIX):] for s in config.sections() if s.startswith(PROFILE_PREFIX)}
+    rules = [compile_rule(s[len(SECTION_PREFIX):], config[s], profiles)
+             for s in config.sections() if s.startswith(SECTION_PREFIX)]
+    rules.sort(key=lambda r: -r.priority)  # stable: file order breaks ties
+    return rules
+
+
+class RuleEngine:
+    """Picks the profile of the highest-priority active rule on every tick.
+
+    on_switch(rule, profile) is called when the selection changes; rule is
+    None when falling back to the default profile.
+    """
+
+    def __init__(self, rules, default=DEFAULT_PROFILE, on_switch=None):
+        self.rules = rules
+        self.default = default
+        self.on_switch = on_switch
+        self.needs = frozenset().union(*(r.needs for r in rules))
+        self.rule = None
+        self.profile = None
+        self.switched_at = 0.0
+
+    def evaluate(self, ctx):
+        """Returns the newly selected profile, or None if nothing changed."""
+        winner = None
+        for rule in self.rules:
+            if rule.update(ctx) and winner is None:
+                winner = rule
+        profile = winner.profile if winner else self.default
+        if profile == self.profile:
+            self.rule = winner
+            return None
+        if self.profile is not None and self.rule is not None:
+            if ctx.time - self.switched_at < self.rule.dwell:
+                return None
+        self.rule = winner
+        self.profile = profile
+        self.switched_at = ctx.time
+        if self.on_switch:
+            self.on_switch(winner, profile)
+        return profile
+
+
+def power_source():
+    """'ac' or 'battery'; desktops without a battery report 'ac'."""
+    import psutil
+    battery = psutil.sensors_battery()
+    if battery is None or battery.power_plugged is None:
+        return 'ac'
+    return 'ac' if battery.power_plugged else 'battery'
+
+
+def foreground_process():
+    """Executable name of the foreground window's process, None if unknown."""
+    try:
+        import win32gui
+        import win32process
+        import psutil
+        _, pid = win32process.GetWindowThreadProcessId(win32gui.GetForegroundWindow())
+        return psutil.Process(pid).name()
+    except Exception:
+        return None
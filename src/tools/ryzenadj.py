@@ -1,7 +1,11 @@
 import subprocess
 import sys
+import json
+import time
 import argparse
 import configparser
+import concurrent.futures
+from collections import namedtuple
 
 # 定义可调整参数及其分类
 PARAMETERS = {
@@ -29,6 +33,40 @@ PARAMETERS = {
     ],
 }
 
+# libryzenadj set_/get_ function suffix for each parameter. `scale` converts
+# the get_* reading (W / A) into the unit set_* takes (mW / mA); fields
+# without a getter can not be read back.
+Field = namedtuple('Field', 'setter getter scale')
+
+RA_FIELDS = {
+    'stapm': Field('stapm_limit', 'stapm_limit', 1000),
+    'fast': Field('fast_limit', 'fast_limit', 1000),
+    'slow': Field('slow_limit', 'slow_limit', 1000),
+    'vrm': Field('vrm_current', 'vrm_current', 1000),
+    'vrmsoc': Field('vrmsoc_current', 'vrmsoc_current', 1000),
+    'edc': Field('vrmmax_current', 'vrmmax_current', 1000),
+    'edcsoc': Field('vrmsocmax_current', 'vrmsocmax_current', 1000),
+    'max-socclk': Field('max_socclk_freq', None, 1),
+    'min-socclk': Field('min_socclk_freq', None, 1),
+    'max-gfxclk': Field('max_gfxclk_freq', None, 1),
+    'min-gfxclk': Field('min_gfxclk_freq', None, 1),
+    'tctl-temp': Field('tctl_temp', 'tctl_temp', 1),
+    'apu-skin-temp': Field('apu_skin_temp_limit', 'apu_skin_temp_limit', 1),
+    'dgpu-skin-temp': Field('dgpu_skin_temp_limit', 'dgpu_skin_temp_limit', 1),
+}
+
+# set_* return codes, as in ryzenadj/readjust.py
+ERROR_MESSAGES = {
+    -1: "{:s} is not supported on this family",
+    -3: "{:s} is not supported on this SMU",
+    -4: "{:s} is rejected by SMU"
+}
+
+
+def describe_error(function_name, res):
+    return ERROR_MESSAGES.get(res, "{:s} did fail with {:d}").format(function_name, res)
+
+
 def list_parameters():
     print("Available RyzenAdj parameters:\n")
     for group, items in PARAMETERS.items():
@@ -50,26 +88,221 @@ def call_ryzenadj(args_list):
         sys.exit(1)
 
 
+def parse_limit_args(args_list):
+    """{key: value} for `--key=value` / `--key value` limits, or None if
+    anything else is in args_list."""
+    values = {}
+    args = iter(args_list)
+    for arg in args:
+        if not arg.startswith('--'):
+            return None
+        key, sep, value = arg[2:].partition('=')
+        if not sep:
+            value = next(args, '')
+        if key not in RA_FIELDS:
+            return None
+        try:
+            values[key] = int(float(value))
+        except ValueError:
+            return None
+    return values or None
+
+
+def apply_with_service(values):
+    """Apply through a running tools.service; None when there is none."""
+    from tools.service import ServiceClient, ServiceError
+    try:
+        client = ServiceClient()
+    except ServiceError:
+        return None
+    try:
+        report = client.call('apply', values=values)
+    except ServiceError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    for key, result in report.items():
+        print(f"{key}: {result['message']}")
+    return 1 if any(result['code'] for result in report.values()) else 0
+
+
+def open_client(backend_kind=None):
+    """A client with call(op, **args): the control service when it runs (and
+    no backend is forced), otherwise one in-process backend handle."""
+    from tools.service import ServiceClient, ServiceError, LocalClient, open_smu_backend
+    from tools.profiles import SETTINGS_PATH
+    if backend_kind is None:
+        try:
+            return ServiceClient()
+        except ServiceError:
+            pass
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {}})
+    config.read(SETTINGS_PATH)
+    return LocalClient(open_smu_backend(config, backend_kind))
+
+
+def emit(message):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+
+# What a client call can raise besides bad arguments: ServiceError (a
+# RuntimeError), the SMU executor's concurrent.futures.TimeoutError (only an
+# alias of the builtin TimeoutError from Python 3.11), EOFError or OSError
+# from a broken connection
+CLIENT_ERRORS = (RuntimeError, TimeoutError, concurrent.futures.TimeoutError, EOFError, OSError)
+
+
+def describe_failure(e):
+    from tools.service import ServiceError
+    message = str(e)
+    return message if isinstance(e, ServiceError) and message else f"{type(e).__name__}: {message}"
+
+
+def stream(client, lines, reconnect=None):
+    """Answer one JSON request per input line with one JSON line, in order.
+
+    Requests are the tools.service ones: {"id": 1, "op": "set", "key":
+    "stapm", "value": 15000}, {"op": "apply", "profile": "quiet"},
+    {"op": "snapshot"}, {"op": "limits"}.
+
+    A failed request is answered with {"ok": false, "error": ...}. When the
+    connection itself is gone, `reconnect()` opens a new client for the
+    next request; without it, or if that fails too, the stream ends with 1.
+    """
+    from tools.service import ConnectionLost
+    lost = (ConnectionLost, EOFError, ConnectionError)
+    opened = None  # a client this function made, closed here
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                emit({'id': None, 'ok': False, 'error': "malformed request"})
+                continue
+            rid = request.pop('id', None)
+            op = request.pop('op', None)
+            try:
+                result = client.call(op, **request)
+            except CLIENT_ERRORS as e:
+                emit({'id': rid, 'ok': False, 'error': describe_failure(e)})
+                if not isinstance(e, lost):
+                    continue
+                if opened is not None:
+                    opened.close()
+                    opened = None
+                if reconnect is None:
+                    return 1
+                try:
+                    client = opened = reconnect()
+                except Exception as error:
+                    emit({'id': None, 'ok': False, 'error': f"could not reconnect: {describe_failure(error)}"})
+                    return 1
+                continue
+            emit({'id': rid, 'ok': True, 'result': result})
+        return 0
+    finally:
+        if opened is not None:
+            opened.close()
+
+
+def watch(client, interval, count=None, raw=False):
+    """Emit a snapshot every `interval` seconds over the one client handle."""
+    from tools.service import ServiceClient
+    emitted = 0
+
+    def publish(snapshot):
+        if not raw:
+            snapshot.pop('table', None)
+        emit(snapshot)
+
+    if isinstance(client, ServiceClient):
+        client.call('subscribe', interval=interval)
+        while count is None or emitted < count:
+            event = client.next_event(interval * 2 + 1)
+            if event is not None:
+                event.pop('event', None)
+                publish(event)
+                emitted += 1
+        return 0
+    # In-process: a fresh read per tick, on deadlines that do not drift
+    deadline = time.monotonic()
+    while True:
+        publish(client.call('snapshot', max_age=0))
+        emitted += 1
+        if count is not None and emitted >= count:
+            return 0
+        deadline += interval
+        time.sleep(max(0.0, deadline - time.monotonic()))
+
+
+def run_persistent(args):
+    try:
+        client = open_client(args.backend)
+    except Exception as e:
+        print(f"Error: RyzenAdj could not get initialized: {e}", file=sys.stderr)
+        return 1
+    try:
+        if args.watch is not None:
+            return watch(client, max(0.05, args.watch), args.count, args.raw)
+        return stream(client, sys.stdin, lambda: open_client(args.backend))
+    except (KeyboardInterrupt, BrokenPipeError):
+        return 0
+    except CLIENT_ERRORS as e:
+        emit({'id': None, 'ok': False, 'error': describe_failure(e)})
+        return 1
+    finally:
+        client.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
-        description='UI wrapper for ryzenadj.exe'
+        description='UI wrapper for ryzenadj.exe; limits go through the control service when it runs',
+        allow_abbrev=False,  # never swallow a ryzenadj option by prefix
     )
     parser.add_argument('--list', action='store_true', help='List adjustable parameters')
+    parser.add_argument('--stream', action='store_true',
+                        help='Answer JSON-lines requests from stdin over one persistent handle')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='Print a JSON telemetry snapshot every SECONDS')
+    parser.add_argument('--count', type=int, help='Stop --watch after this many snapshots')
+    parser.add_argument('--raw', action='store_true', help='Include the raw table in --watch output')
+    parser.add_argument('--backend', choices=['libryzenadj', 'fake', 'simulator'],
+                        help='Use this backend in-process instead of the control service')
     # 接受任意 ryzenadj 参数
     parser.add_argument('ryzenargs', nargs=argparse.REMAINDER,
                         help='Arguments passed to ryzenadj.exe')
-    args = parser.parse_args()
+    args, unknown = parser.parse_known_args()
+    # REMAINDER does not take a leading --option; then all of argv is for ryzenadj
+    ryzenargs = sys.argv[1:] if unknown else args.ryzenargs
 
     if args.list:
         list_parameters()
         sys.exit(0)
 
-    if not args.ryzenargs:
+    if args.stream or args.watch is not None:
+        sys.exit(run_persistent(args))
+
+    if not ryzenargs:
         parser.print_help()
         sys.exit(0)
 
+    # Limits only: no privileges needed if the control service is running
+    values = parse_limit_args(ryzenargs)
+    if values:
+        res = apply_with_service(values)
+        if res is not None:
+            sys.exit(res)
+
     # 调用 ryzenadj
-    call_ryzenadj(args.ryzenargs)
+    call_ryzenadj(ryzenargs)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import namedtuple
+
+from tools.instrument import INSTRUMENTS
+
+# Published sample; the UI only ever reads these
+Sample = namedtuple('Sample', 'version timestamp value')
+
+
+class SampleGroup:
+    def __init__(self, name, interval, fn, blocking=False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.blocking = blocking
+        self.span_name = 'sampler.' + name
+        self.next_due = 0.0
+        self.version = 0
+        self.latest = None
+        self.error = None
+        # Blocking groups only: their own thread, woken once per due tick
+        self.worker = None
+        self.wake = threading.Event()
+        self.due_at = 0.0
+        self.removed = False
+
+
+class Sampler:
+    """Background thread that runs each metric group on its own fixed cadence.
+
+    Deadlines advance by exactly one interval from the previous deadline, not
+    from when the work finished, so sampling does not drift with run time
+    and is independent of the render loop.
+
+    Groups added with blocking=True (SMU reads that wait on the executor,
+    process scans) run on a thread of their own: the sampler thread only
+    wakes it, so a slow or hung call cannot delay the other groups. Ticks
+    that come due while such a group is still running collapse into one
+    run right after it.
+    """
+
+    def __init__(self, on_error=None):
+        self.groups = {}
+        self.on_error = on_error
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    def add_group(self, name, interval, fn, blocking=False):
+        with self.lock:
+            group = SampleGroup(name, interval, fn, blocking)
+            group.next_due = time.monotonic()
+            self.groups[name] = group
+        self.wake.set()
+        return group
+
+    def remove_group(self, name):
+        with self.lock:
+            group = self.groups.pop(name, None)
+        if group is not None:
+            group.removed = True
+            group.wake.set()
+
+    def set_interval(self, name, interval):
+        group = self.groups[name]
+        if group.interval != interval:
+            with self.lock:
+                group.interval = interval
+                group.next_due = min(group.next_due, time.monotonic() + interval)
+            self.wake.set()
+
+    def trigger(self, name):
+        """Run a group as soon as possible, e.g. for a manual refresh."""
+        with self.lock:
+            self.groups[name].next_due = time.monotonic()
+        self.wake.set()
+
+    def latest(self, name):
+        group = self.groups.get(name)
+        return group.latest if group else None
+
+    def start(self):
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name='sampler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # Blocking workers may be stuck in a call; they exit once it returns
+        with self.lock:
+            groups = list(self.groups.values())
+        for group in groups:
+            group.wake.set()
+
+    def run_group(self, group, now):
+        try:
+            with INSTRUMENTS.span(group.span_name):
+                value = group.fn()
+        except Exception as e:
+            group.error = e
+            if self.on_error:
+                self.on_error(group.name, e)
+            return
+        group.error = None
+        group.version += 1
+        group.latest = Sample(group.version, now, value)
+
+    def dispatch(self, group, now):
+        group.due_at = now
+        if group.worker is None:
+            group.worker = threading.Thread(target=self.work, args=(group,),
+                                            name='sampler.' + group.name, daemon=True)
+            group.worker.start()
+        group.wake.set()
+
+    def work(self, group):
+        while True:
+            group.wake.wait()
+            group.wake.clear()
+            if self.stopping or group.removed:
+                break
+            self.run_group(group, group.due_at)
+        group.worker = None
+
+    def run(self):
+        while not self.stopping:
+            now = time.monotonic()
+            with self.lock:
+                due = [g for g in self.groups.values() if g.next_due <= now]
+                for group in due:
+                    group.next_due += group.interval
+                    if group.next_due <= now:
+                        # Fell behind (sleep, long call); keep the phase, skip missed ticks
+                        missed = (now - group.next_due) // group.interval + 1
+                        group.next_due += missed * group.interval
+            for group in due:
+                if group.blocking:
+                    self.dispatch(group, now)
+                else:
+                    self.run_group(group, now)
+
+            with self.lock:
+                next_due = min((g.next_due for g in self.groups.values()), default=None)
+            timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+            self.wake.wait(timeout)
+            self.wake.clear()
@@ -0,0 +1,570 @@
+"""Privileged control service: the one process that talks to the SMU.
+
+Run it elevated (`python -m tools.service`, or `main.py --service`); the GUI
+and tools/ryzenadj.py then connect as unprivileged clients instead of each
+opening their own ryzenadj handle.
+
+Transport is multiprocessing.connection on 127.0.0.1 with an HMAC challenge
+on a key generated at every start. The service writes its address and that
+key to SERVICE_FILE, so whoever can read the file can change limits: it is
+created readable by the service's user only (mode 0o600, or on Windows a
+protected DACL for that user), and clients must run as the same user.
+Messages are JSON, never pickles, since the service runs privileged.
+
+Requests are {"id": n, "op": ..., args}; every reply echoes the id, as
+{"id": n, "ok": true, "result": ...} or {"id": n, "ok": false, "error": ...}.
+
+    hello                       backend name, table size and version
+    snapshot   [max_age]        the PM table: decoded values plus the raw table
+    limits     [current]        last applied value per ryzenadj key, or with
+                                current the values in the PM table now
+    apply      values|profile [force]
+                                {key: FieldResult as an object}; force writes
+                                even the keys the service counts as applied
+    set        key, value       the same for a single key
+    subscribe  [interval]       then {"event": "snapshot", ...} every interval
+    unsubscribe
+
+All writes go through one ApplyPipeline on one SMUExecutor: applies that
+arrive within `batch_window` of each other are merged and written together,
+only limits that differ from the applied ones (or are forced) reach the
+SMU, and every client gets the results for its own keys back. The GUI,
+tools/ryzenadj.py and the watchdog (tools.watchdog) all write this way.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import secrets
+import argparse
+import threading
+import configparser
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import (Listener, Client, AuthenticationError,
+                                        deliver_challenge, answer_challenge)
+
+from tools.ryzenadj import RA_FIELDS
+from tools.telemetry import TelemetryBackend, open_backend
+from tools.pmtable import SnapshotRing
+from tools.profiles import SETTINGS_PATH, DEFAULT_PROFILE, load_profile
+from tools.apply import ApplyPipeline, FieldResult, read_limits
+from tools.executor import SMUExecutor, DEFAULT_TIMEOUT
+from tools.sampler import Sampler
+from tools.watchdog import log
+
+SERVICE_FILE = os.path.join(os.path.dirname(SETTINGS_PATH), 'cache', 'service.json')
+HOST = '127.0.0.1'
+MAX_MESSAGE = 1 << 20
+BATCH_WINDOW = 0.05       # s
+SNAPSHOT_MAX_AGE = 0.25   # s a refresh is shared between clients
+MIN_INTERVAL = 0.1        # s, fastest subscription
+
+
+class ServiceError(RuntimeError):
+    """The service replied with an error, or there is no service to talk to."""
+
+
+class ConnectionLost(ServiceError):
+    """The connection to the service broke; only a new ServiceClient helps."""
+
+
+def encode(message):
+    return json.dumps(message).encode()
+
+
+def open_private(path):
+    """Create `path` for writing, readable and writable by this user only.
+
+    Mode 0o600 restricts nothing on Windows; there the file is created with
+    a protected DACL holding one entry, for the user this process runs as,
+    so no other process can open it before the key is written.
+    """
+    if sys.platform != 'win32':
+        return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w')
+    import msvcrt
+    import win32api
+    import win32con
+    import win32file
+    import win32security
+    import ntsecuritycon
+    token = win32security.OpenProcessToken(win32api.GetCurrentProcess(), ntsecuritycon.TOKEN_QUERY)
+    user = win32security.GetTokenInformation(token, win32security.TokenUser)[0]
+    dacl = win32security.ACL()
+    dacl.AddAccessAllowedAce(win32security.ACL_REVISION, ntsecuritycon.FILE_ALL_ACCESS, user)
+    descriptor = win32security.SECURITY_DESCRIPTOR()
+    descriptor.SetSecurityDescriptorDacl(1, dacl, 0)
+    # Protected: nothing is inherited from the directory
+    descriptor.SetSecurityDescriptorControl(ntsecuritycon.SE_DACL_PROTECTED, ntsecuritycon.SE_DACL_PROTECTED)
+    attributes = win32security.SECURITY_ATTRIBUTES()
+    attributes.SECURITY_DESCRIPTOR = descriptor
+    handle = win32file.CreateFile(path, win32con.GENERIC_WRITE, 0, attributes,
+                                  win32con.CREATE_NEW, win32con.FILE_ATTRIBUTE_NORMAL, None)
+    return os.fdopen(msvcrt.open_osfhandle(handle.Detach(), os.O_WRONLY), 'w')
+
+
+def write_service_file(path, address, authkey):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    try:
+        os.remove(tmp)  # left by a crash; created anew so its permissions are ours
+    except FileNotFoundError:
+        pass
+    with open_private(tmp) as f:
+        json.dump({'address': list(address), 'authkey': authkey.hex(), 'pid': os.getpid()}, f)
+    os.replace(tmp, path)
+
+
+def read_service_file(path=SERVICE_FILE):
+    try:
+        with open(path) as f:
+            info = json.load(f)
+        return tuple(info['address']), bytes.fromhex(info['authkey'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise ServiceError(f"no control service is running ({e})") from None
+
+
+def snapshot_message(snapshot):
+    return {
+        'version': snapshot.version,
+        'time': time.time(),
+        'table_version': snapshot.table_version,
+        'layout': snapshot.layout.name,
+        'values': {} if snapshot.layout.raw else dict(zip(snapshot.layout.names, snapshot.decode())),
+        'table': base64.b64encode(snapshot.raw).decode(),  # float32, little-endian
+    }
+
+
+class _Session:
+    """One client connection; replies and pushed events share its send lock."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.interval = None  # subscription interval, None when not subscribed
+        self.next_push = 0.0
+
+    def send(self, message):
+        data = encode(message)
+        with self.lock:
+            self.conn.send_bytes(data)
+
+
+class ControlService:
+    def __init__(self, backend, batch_window=BATCH_WINDOW, log=log):
+        self.backend = backend
+        self.batch_window = batch_window
+        self.log = log
+        self.executor = SMUExecutor()
+        self.pipeline = ApplyPipeline(lambda: backend, executor=self.executor)
+        self.snapshots = SnapshotRing()
+        self.latest = None  # snapshot_message() of the newest refresh
+        self.latest_at = 0.0
+        self.lock = threading.Lock()
+        self.batch = []  # (values, Future) waiting for the next apply
+        self.sessions = set()
+        self.sampler = Sampler(on_error=lambda name, e: self.log(f"{name}: {e}"))
+        self.listener = None
+        self.authkey = None
+        self.path = None
+        self.stopping = False
+
+    # -- SMU side, on the executor thread
+
+    def refresh(self):
+        backend = self.backend
+        slot = self.snapshots.acquire(backend.table_size, backend.table_version)
+        with backend.lock:
+            backend.read_into(slot)
+        self.latest = snapshot_message(self.snapshots.publish(slot))
+        self.latest_at = time.monotonic()
+        return self.latest
+
+    def flush(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+        if not batch:
+            return
+        merged = {}
+        forced = set()
+        for values, _, force in batch:
+            merged.update(values)  # later requests win
+            if force:
+                forced.update(values)
+        try:
+            report = self.pipeline.apply(merged, forced)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for values, future, _ in batch:
+            future.set_result({k: self.result(k, v, merged[k], report) for k, v in values.items()})
+
+    @staticmethod
+    def result(key, requested, merged, report):
+        result = report.get(key) or FieldResult(key, merged, 0, None, "unchanged")
+        if merged != requested:
+            result = result._replace(requested=requested,
+                                     message=f"superseded by {merged}; {result.message}")
+        return result
+
+    # -- client side, on session threads
+
+    def read(self, max_age=SNAPSHOT_MAX_AGE):
+        latest = self.latest
+        if latest is not None and time.monotonic() - self.latest_at <= max_age:
+            return latest
+        return self.executor.call(self.refresh, key='refresh')
+
+    def apply(self, values, force=False):
+        """Queue limits for the next batch; the Future holds their FieldResults.
+
+        With `force` they are written even where the pipeline counts them as
+        applied, for a caller that saw the SMU revert them.
+        """
+        future = Future()
+        with self.lock:
+            self.batch.append((values, future, force))
+        # Joins an apply that is still waiting out its window
+        self.executor.submit(self.flush, key='apply', delay=self.batch_window)
+        return future
+
+    def wait(self, future):
+        report = future.result(self.executor.timeout + self.batch_window)
+        return {k: r._asdict() for k, r in report.items()}
+
+    def op_hello(self, session, request):
+        backend = self.backend
+        return {'backend': backend.name, 'table_size': backend.table_size,
+                'table_version': backend.table_version, 'pid': os.getpid()}
+
+    def op_snapshot(self, session, request):
+        return self.read(float(request.get('max_age', SNAPSHOT_MAX_AGE)))
+
+    def op_limits(self, session, request):
+        if request.get('current'):
+            return self.executor.call(lambda: read_limits(self.backend))
+        return self.executor.call(lambda: dict(self.pipeline.applied))
+
+    def op_apply(self, session, request):
+        if 'profile' in request:
+            config = configparser.ConfigParser()
+            config.read(SETTINGS_PATH)
+            values = load_profile(config, request['profile'] or DEFAULT_PROFILE)
+            if not values:
+                raise ValueError(f"profile '{request['profile']}' is empty or missing")
+        else:
+            values = request.get('values')
+            if not isinstance(values, dict) or not values:
+                raise ValueError("apply needs 'values' or 'profile'")
+            unknown = set(values) - set(RA_FIELDS)
+            if unknown:
+                raise ValueError(f"unknown key(s) {', '.join(sorted(unknown))}")
+            values = {k: int(v) for k, v in values.items()}
+        return self.wait(self.apply(values, bool(request.get('force'))))
+
+    def op_set(self, session, request):
+        return self.op_apply(session, {'values': {request['key']: request['value']}})
+
+    def op_subscribe(self, session, request):
+        session.interval = max(MIN_INTERVAL, float(request.get('interval', 1.0)))
+        session.next_push = 0.0
+        self.update_push_interval()
+        return {'interval': session.interval}
+
+    def op_unsubscribe(self, session, request):
+        session.interval = None
+        self.update_push_interval()
+        return {}
+
+    OPS = {'hello', 'snapshot', 'limits', 'apply', 'set', 'subscribe', 'unsubscribe'}
+
+    def dispatch(self, session, request):
+        op = request.get('op')
+        if op not in self.OPS:
+            raise ValueError(f"unknown op {op!r}")
+        return getattr(self, 'op_' + op)(session, request)
+
+    def serve_session(self, conn):
+        try:
+            # On the session thread, so a stalled client can not block accept()
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+        except (AuthenticationError, EOFError, OSError):
+            conn.close()
+            return
+        session = _Session(conn)
+        with self.lock:
+            self.sessions.add(session)
+        try:
+            while True:
+                try:
+                    data = conn.recv_bytes(MAX_MESSAGE)
+                except (EOFError, OSError):
+                    break
+                try:
+                    request = json.loads(data)
+                    rid = request.get('id')
+                except (ValueError, AttributeError):
+                    session.send({'id': None, 'ok': False, 'error': "malformed request"})
+                    continue
+                try:
+                    reply = {'id': rid, 'ok': True, 'result': self.dispatch(session, request)}
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'id': rid, 'ok': False, 'error': str(e)}
+                except Exception as e:
+                    reply = {'id': rid, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                session.send(reply)
+        except OSError:
+            pass  # client went away mid-reply
+        finally:
+            with self.lock:
+                self.sessions.discard(session)
+            conn.close()
+            self.update_push_interval()
+
+    # -- subscriptions, on the sampler thread
+
+    def update_push_interval(self):
+        with self.lock:
+            intervals = [s.interval for s in self.sessions if s.interval]
+        self.sampler.set_interval('push', min(intervals, default=1.0))
+
+    def push(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [s for s in self.sessions if s.interval and now >= s.next_push]
+        if not due:
+            return
+        message = dict(self.read(max_age=min(s.interval for s in due) / 2), event='snapshot')
+        for session in due:
+            session.next_push = now + session.interval
+            try:
+                session.send(message)
+            except OSError:
+                pass  # its session thread cleans up
+
+    # -- lifecycle
+
+    def open(self):
+        self.executor.start()
+        self.executor.call(self.pipeline.sync)
+
+    def start(self, address=(HOST, 0), path=SERVICE_FILE):
+        self.listener = Listener(address)  # the challenge runs per session
+        self.authkey = secrets.token_bytes(32)
+        self.open()
+        self.sampler.add_group('push', 1.0, self.push)
+        self.sampler.start()
+        write_service_file(path, self.listener.address, self.authkey)
+        self.path = path
+
+    def serve_forever(self):
+        while not self.stopping:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if self.stopping:
+                    break
+                raise
+            threading.Thread(target=self.serve_session, args=(conn,), name='session', daemon=True).start()
+
+    def stop(self):
+        self.stopping = True
+        try:
+            if self.path:
+                os.remove(self.path)
+        except OSError:
+            pass
+        self.listener.close()
+        self.sampler.stop()
+        self.executor.stop()
+        with self.lock:
+            for session in self.sessions:
+                session.conn.close()
+
+
+class ServiceClient:
+    """Blocking client. Safe to share between threads; calls are serialized."""
+
+    def __init__(self, path=SERVICE_FILE, timeout=DEFAULT_TIMEOUT):
+        address, authkey = read_service_file(path)
+        try:
+            self.conn = Client(address, authkey=authkey)
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise ServiceError(f"could not connect to the control service: {e}") from None
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.events = deque(maxlen=64)
+
+    def receive(self, timeout):
+        try:
+            if not self.conn.poll(timeout):
+                return None
+            return json.loads(self.conn.recv_bytes(MAX_MESSAGE))
+        except (EOFError, OSError) as e:
+            raise ConnectionLost(f"lost the connection to the control service: {e}") from None
+
+    def call(self, op, **args):
+        """Send one request and wait for its result; raises ServiceError."""
+        with self.lock:
+            self.next_id += 1
+            rid = self.next_id
+            try:
+                self.conn.send_bytes(encode(dict(args, id=rid, op=op)))
+            except OSError as e:
+                raise ConnectionLost(f"lost the connection to the control service: {e}") from None
+            deadline = time.monotonic() + self.timeout
+            while True:
+                message = self.receive(max(0.0, deadline - time.monotonic()))
+                if message is None:
+                    raise ServiceError(f"the control service did not answer {op} within {self.timeout:g} s")
+                if 'event' in message:
+                    self.events.append(message)
+                elif message.get('id') == rid:
+                    if not message['ok']:
+                        raise ServiceError(message['error'])
+                    return message['result']
+
+    def next_event(self, timeout=None):
+        """The next pushed event after subscribe(), or None on timeout."""
+        with self.lock:
+            if self.events:
+                return self.events.popleft()
+            message = self.receive(timeout)
+            while message is not None and 'event' not in message:
+                message = self.receive(0)  # a stray reply to a timed-out call
+            return message
+
+    def close(self):
+        self.conn.close()
+
+
+class LocalClient:
+    """ServiceClient.call() against an in-process ControlService, for when no
+    service is running. Needs the privileges the backend needs."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.service = ControlService(backend, batch_window=0.0)
+        self.service.open()
+
+    def call(self, op, **args):
+        if op in ('subscribe', 'unsubscribe'):
+            raise ServiceError(f"{op} needs the control service")
+        try:
+            return self.service.dispatch(None, dict(args, op=op))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ServiceError(str(e)) from None
+
+    def close(self):
+        self.service.executor.stop()
+        self.backend.close()
+
+
+def service_available(path=SERVICE_FILE):
+    try:
+        ServiceClient(path).close()
+        return True
+    except ServiceError:
+        return False
+
+
+class ServiceBackend(TelemetryBackend):
+    """Reads the PM table and applies limits through a running ControlService."""
+    name = 'service'
+
+    def __init__(self, path=SERVICE_FILE):
+        super().__init__()
+        self.path = path
+        self.client = None
+
+    def open(self):
+        if self.client is None:
+            client = ServiceClient(self.path)
+            info = client.call('hello')
+            self.table_size = info['table_size']
+            self.table_version = info['table_version']
+            self.client = client
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def call(self, op, **args):
+        self.open()
+        try:
+            return self.client.call(op, **args)
+        except ServiceError:
+            self.close()  # reconnect on the next call
+            raise
+
+    def read_into(self, snapshot):
+        message = self.call('snapshot')
+        table = array('f', base64.b64decode(message['table']))
+        self.table_version = message['table_version']
+        if len(table) != snapshot.size:
+            self.table_size = len(table)
+            raise ServiceError("the PM table size changed; it is picked up on the next refresh")
+        snapshot.fill_from_bytes(table.tobytes())
+        snapshot.table_version = self.table_version
+
+    def apply(self, changes, force=False):
+        report = self.call('apply', values=changes, force=force)
+        return {k: FieldResult(**r) for k, r in report.items()}
+
+    def limits(self, current=False):
+        return self.call('limits', current=current)
+
+
+def open_smu_backend(config, backend_kind=None):
+    """The in-process backend a service (or LocalClient) writes through."""
+    settings = config['Settings']
+    kind = backend_kind or settings.get('telemetry_backend', 'auto')
+    if kind in ('auto', 'service', 'ryzenadj.exe'):
+        kind = 'libryzenadj'  # writes and read-back need the in-process handle
+    return open_backend(settings.get('ra_path', 'ryzenadj.exe'), kind)
+
+
+def run_service(config, backend_kind=None, path=SERVICE_FILE):
+    if service_available(path):
+        log("A control service is already running")
+        return 1
+    try:
+        backend = open_smu_backend(config, backend_kind)
+    except Exception as e:
+        log(f"RyzenAdj could not get initialized: {e}")
+        return 1
+    service = ControlService(backend)
+    service.start(path=path)
+    log(f"Serving {backend.name} on {service.listener.address[0]}:{service.listener.address[1]}")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        backend.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Own the SMU and serve limits and telemetry to clients')
+    parser.add_argument('--config', default=SETTINGS_PATH, help='settings.ini to read the backend from')
+    parser.add_argument('--backend', choices=['libryzenadj', 'fake', 'simulator'],
+                        help='Override telemetry_backend')
+    parser.add_argument('--file', default=SERVICE_FILE, help='Where to publish the address and key')
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {}})
+    config.read(args.config)
+    return run_service(config, args.backend, args.file)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""Shared-memory export of PM table snapshots.
+
+The process that polls the SMU publishes every snapshot into one named
+segment; any number of readers (other tools, monitoring agents, the HTTP
+endpoint below) read it from there without touching the SMU.
+
+Segment layout, little-endian:
+
+    header   '<8sIIIIIQII'  magic, format, closed flag, table size, table
+                            version, slots, published count, layout offset,
+                            layout length
+    layout   JSON: layout name, raw flag and {field: [index, scale, unit]}
+    slots    `slots` times: '<QdQ' seq, wall-clock time, snapshot version,
+             followed by table size * float32
+
+Slot n % slots holds snapshot n. Each slot is a seqlock: the writer makes
+seq odd, writes the slot, then makes it even again; a reader copies the
+slot and keeps the copy only if seq was even and unchanged across the copy.
+When the table size or layout changes the segment is marked closed and
+recreated, and readers reattach.
+
+    python -m tools.shm                 print the latest snapshot
+    python -m tools.shm --serve 9465    HTTP: /metrics (Prometheus), /snapshot.json
+"""
+import sys
+import json
+import time
+import struct
+import argparse
+from array import array
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from tools.layouts import Layout, raw_layout
+
+SEGMENT_NAME = 'BetterRyzenController.telemetry'
+MAGIC = b'BRCSHM1\0'
+FORMAT = 1
+HEADER = struct.Struct('<8sIIIIIQII')
+SLOT_HEADER = struct.Struct('<QdQ')
+SEQ = struct.Struct('<Q')
+COUNT_OFFSET = struct.calcsize('<8sIIIII')
+CLOSED_OFFSET = struct.calcsize('<8sI')
+DEFAULT_SLOTS = 16
+
+# A snapshot as seen by readers; values is an array('f') of the raw table
+Sample = namedtuple('Sample', 'index version time table_version values')
+
+# Segments a Publisher in this process created (and will unlink)
+_owned = set()
+
+
+def attach(name):
+    """Open an existing segment without letting this process's exit unlink it."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if sys.platform != 'win32' and name not in _owned:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class Publisher:
+    """Writer side, owned by the one process that polls the SMU."""
+
+    def __init__(self, name=SEGMENT_NAME, slots=DEFAULT_SLOTS):
+        self.name = name
+        self.slots = slots
+        self.shm = None
+        self.key = None
+        self.count = 0
+
+    def create(self, snapshot):
+        self.close()
+        layout = snapshot.layout
+        meta = json.dumps({
+            'name': layout.name,
+            'raw': layout.raw,
+            'fields': {} if layout.raw else {n: list(f) for n, f in layout.fields.items()},
+        }).encode()
+        self.slot_size = SLOT_HEADER.size + 4 * snapshot.size
+        self.data_offset = HEADER.size + len(meta)
+        size = self.data_offset + self.slots * self.slot_size
+        try:
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a crashed run (POSIX) or still held by a reader
+            stale = attach(self.name)
+            stale.buf[CLOSED_OFFSET:CLOSED_OFFSET + 4] = b'\1\0\0\0'
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        _owned.add(self.name)
+        buf = self.shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, FORMAT, 0, snapshot.size, snapshot.table_version,
+                         self.slots, 0, HEADER.size, len(meta))
+        buf[HEADER.size:self.data_offset] = meta
+        self.count = 0
+        self.key = (snapshot.size, snapshot.table_version, layout)
+
+    def publish(self, snapshot):
+        if self.key != (snapshot.size, snapshot.table_version, snapshot.layout):
+            self.create(snapshot)
+        buf = self.shm.buf
+        offset = self.data_offset + (self.count % self.slots) * self.slot_size
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, seq + 1)  # odd: write in progress
+        SLOT_HEADER.pack_into(buf, offset, seq + 1, time.time(), snapshot.version)
+        start = offset + SLOT_HEADER.size
+        buf[start:start + 4 * snapshot.size] = snapshot.raw
+        SEQ.pack_into(buf, offset, seq + 2)
+        self.count += 1
+        struct.pack_into('<Q', buf, COUNT_OFFSET, self.count)
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.buf[CLOSED_OFFSET:CLOSED_OFFSET + 4] = b'\1\0\0\0'
+            self.shm.close()
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            _owned.discard(self.name)
+            self.shm = None
+            self.key = None
+
+
+class Reader:
+    """Reader side: attach by name, then latest() / recent() as often as needed."""
+
+    def __init__(self, name=SEGMENT_NAME, retries=100):
+        self.name = name
+        self.retries = retries
+        self.shm = None
+
+    def open(self):
+        if self.shm is not None:
+            if struct.unpack_from('<I', self.shm.buf, CLOSED_OFFSET)[0] == 0:
+                return
+            self.close()  # writer recreated the segment
+        shm = attach(self.name)
+        (magic, fmt, closed, size, table_version, slots, _,
+         layout_offset, layout_length) = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            shm.close()
+            raise ValueError(f"{self.name} is not a telemetry segment")
+        meta = json.loads(bytes(shm.buf[layout_offset:layout_offset + layout_length]))
+        self.shm = shm
+        self.size = size
+        self.table_version = table_version
+        self.slots = slots
+        self.slot_size = SLOT_HEADER.size + 4 * size
+        self.data_offset = layout_offset + layout_length
+        if meta['raw']:
+            self.layout = raw_layout(size)
+        else:
+            self.layout = Layout(meta['name'], (table_version,),
+                                 {n: tuple(f) for n, f in meta['fields'].items()})
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    @property
+    def count(self):
+        return struct.unpack_from('<Q', self.shm.buf, COUNT_OFFSET)[0]
+
+    def read(self, index):
+        """Snapshot number `index`, or None once it has been overwritten."""
+        buf = self.shm.buf
+        offset = self.data_offset + (index % self.slots) * self.slot_size
+        start = offset + SLOT_HEADER.size
+        for _ in range(self.retries):
+            seq, t, version = SLOT_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue  # being written
+            values = array('f')
+            values.frombytes(buf[start:start + 4 * self.size])
+            if SEQ.unpack_from(buf, offset)[0] == seq:
+                if self.count - index > self.slots:
+                    return None
+                return Sample(index, version, t, self.table_version, values)
+        return None
+
+    def latest(self):
+        self.open()
+        count = self.count
+        return self.read(count - 1) if count else None
+
+    def recent(self, n):
+        """Up to n most recent snapshots, oldest first."""
+        self.open()
+        count = self.count
+        samples = (self.read(i) for i in range(max(0, count - min(n, self.slots)), count))
+        return [s for s in samples if s is not None]
+
+    def decode(self, sample):
+        """{field: scaled value} for a sample, through the published layout."""
+        return dict(zip(self.layout.names, self.layout.decode(sample.values)))
+
+
+def prometheus(reader, derived=None):
+    sample = reader.latest()
+    if sample is None:
+        return ''
+    lines = [
+        '# TYPE brc_pm_table_version gauge',
+        f'brc_pm_table_version {reader.table_version}',
+        '# TYPE brc_snapshot_age_seconds gauge',
+        f'brc_snapshot_age_seconds {time.time() - sample.time:.3f}',
+        '# TYPE brc_pm gauge',
+    ]
+    for name, value in reader.decode(sample).items():
+        unit = reader.layout.fields[name][2]
+        lines.append(f'brc_pm{{field="{name}",unit="{unit}"}} {value:g}')
+    if derived is not None:
+        lines.append('# TYPE brc_derived gauge')
+        for name, value, unit in derived():
+            lines.append(f'brc_derived{{metric="{name}",unit="{unit}"}} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot_json(reader, derived=None):
+    sample = reader.latest()
+    if sample is None:
+        return {}
+    data = {'version': sample.version, 'time': sample.time,
+            'table_version': sample.table_version, 'layout': reader.layout.name,
+            'values': reader.decode(sample)}
+    if derived is not None:
+        data['derived'] = {name: value for name, value, _ in derived()}
+    return data
+
+
+def make_server(port, name=SEGMENT_NAME, host='127.0.0.1', derived=None):
+    """ThreadingHTTPServer serving /metrics and /snapshot.json from the segment.
+
+    `derived`, when given, returns [(name, value, unit)] served next to the
+    raw fields (tools.derived, from the app's own engine).
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            reader = Reader(name)
+            try:
+                if self.path == '/metrics':
+                    body = prometheus(reader, derived).encode()
+                    kind = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path == '/snapshot.json':
+                    body = json.dumps(snapshot_json(reader, derived)).encode()
+                    kind = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+            except (FileNotFoundError, ValueError) as e:
+                self.send_error(503, str(e))
+                return
+            finally:
+                reader.close()
+            self.send_response(200)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Read the shared-memory telemetry segment')
+    parser.add_argument('--name', default=SEGMENT_NAME)
+    parser.add_argument('--serve', type=int, metavar='PORT', help='Serve HTTP on 127.0.0.1:PORT')
+    args = parser.parse_args(argv)
+    if args.serve:
+        server = make_server(args.serve, args.name)
+        print(f"Serving http://127.0.0.1:{args.serve}/metrics")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    reader = Reader(args.name)
+    try:
+        print(json.dumps(snapshot_json(reader), indent=2))
+    except FileNotFoundError:
+        print(f"No telemetry segment named {args.name}; is the app publishing?", file=sys.stderr)
+        return 1
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
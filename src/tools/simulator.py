@@ -0,0 +1,207 @@
+"""Simulated SMU: the libryzenadj call surface backed by a thermal/power model.
+
+SimulatedRyzenAdjLib is a drop-in for tools.fakeadj.FakeRyzenAdjLib whose
+PM table evolves over time: the workload asks for power, the fast / slow /
+STAPM / current limits and the temperature limits decide how much it gets,
+and temperature, skin temperature and clocks follow. With `step` set, every
+refresh_table() advances a fixed amount of simulated time so runs are
+deterministic. Faults makes writes or table refreshes fail, adds latency
+or reverts limits.
+
+`python -m tools.simulator --dump-table` prints the table in ryzenadj.exe
+format for the DumpTableBackend path; --hang and --fail stand in for a
+ryzenadj.exe that stops responding or can not initialize.
+"""
+import sys
+import math
+import time
+import random
+import argparse
+
+from tools.fakeadj import FakeRyzenAdjLib, FIELD_INDEX, DEFAULT_TABLE, dump_table_text
+
+# Model constants
+AMBIENT = 30.0          # °C
+IDLE_POWER = 4.0        # W
+MAX_DEMAND = 65.0       # W the workload asks for at load 1.0
+THERMAL_RES = 1.1       # °C per W, die to ambient
+THERMAL_TAU = 6.0       # s
+SKIN_RES = 0.35         # °C per W
+SKIN_TAU = 90.0         # s
+SLOW_TAU = 10.0         # s, PPT slow averaging window
+STAPM_TAU = 200.0       # s, STAPM averaging window
+CORE_VOLTAGE = 1.2      # V, power to VDD current
+SOC_SHARE = 0.15        # share of power drawn through the SoC rail
+BASE_CLOCK = 1800.0     # MHz
+MAX_CLOCK = 4400.0      # MHz
+
+LIMIT_INDICES = {FIELD_INDEX[f] for f in (
+    'stapm_limit', 'fast_limit', 'slow_limit', 'apu_slow_limit',
+    'vrm_current', 'vrmsoc_current', 'vrmmax_current', 'vrmsocmax_current',
+    'tctl_temp', 'apu_skin_temp_limit', 'dgpu_skin_temp_limit')}
+
+
+class Faults:
+    """Fault injection settings, all off by default.
+
+    set_errors: set_* field -> return code, e.g. {'fast_limit': -4} for a
+        rejected write or -1 for a field unsupported on this family.
+    refresh_error: refresh_table() return code, e.g. -1 for a PM table the
+        driver could not read.
+    latency: (probability, seconds) added to any call.
+    revert_every: simulated seconds between firmware resets of all limits.
+    fail_init: init_ryzenadj() returns NULL.
+    """
+
+    def __init__(self, set_errors=None, refresh_error=0, latency=None, revert_every=None,
+                 fail_init=False):
+        self.set_errors = dict(set_errors or {})
+        self.refresh_error = refresh_error
+        self.latency = latency
+        self.revert_every = revert_every
+        self.fail_init = fail_init
+
+
+def burst_load(t):
+    """Default workload: 30 s at full load, 30 s mostly idle."""
+    return 1.0 if (t // 30) % 2 == 0 else 0.1
+
+
+class SimulatedRyzenAdjLib(FakeRyzenAdjLib):
+    def __init__(self, load=burst_load, step=None, faults=None, seed=0):
+        super().__init__()
+        self.load = load
+        self.step = step
+        self.faults = faults or Faults()
+        self.random = random.Random(seed)
+        self.sim_time = 0.0
+        self.wall = time.monotonic()
+        self.last_revert = 0.0
+        self.power = IDLE_POWER
+        self.slow_avg = IDLE_POWER
+        self.stapm_avg = IDLE_POWER
+        self.temp = AMBIENT + IDLE_POWER * THERMAL_RES
+        self.skin = AMBIENT + IDLE_POWER * SKIN_RES
+        self.clock = BASE_CLOCK
+        self.init_ryzenadj.fn = lambda: 0 if self.faults.fail_init else self.HANDLE
+        self.publish()
+
+    def delay(self):
+        latency = self.faults.latency
+        if latency and self.random.random() < latency[0]:
+            time.sleep(latency[1])
+
+    def demand(self):
+        load = self.load(self.sim_time) if callable(self.load) else self.load
+        return IDLE_POWER + max(0.0, min(1.0, load)) * (MAX_DEMAND - IDLE_POWER)
+
+    def allowed_power(self):
+        t = self.table
+        allowed = t[FIELD_INDEX['fast_limit']]
+        # Slow and STAPM limits only bite once their running averages reach them
+        if self.slow_avg >= t[FIELD_INDEX['slow_limit']]:
+            allowed = min(allowed, t[FIELD_INDEX['slow_limit']])
+        if self.stapm_avg >= t[FIELD_INDEX['stapm_limit']]:
+            allowed = min(allowed, t[FIELD_INDEX['stapm_limit']])
+        # Current limits (A) through the core and SoC rails
+        allowed = min(allowed, t[FIELD_INDEX['vrm_current']] * CORE_VOLTAGE / (1 - SOC_SHARE),
+                      t[FIELD_INDEX['vrmmax_current']] * CORE_VOLTAGE / (1 - SOC_SHARE),
+                      t[FIELD_INDEX['vrmsoc_current']] * CORE_VOLTAGE / SOC_SHARE)
+        # Temperature limits: sustainable power plus a proportional margin
+        tctl = t[FIELD_INDEX['tctl_temp']]
+        allowed = min(allowed, (tctl - AMBIENT) / THERMAL_RES + 2.0 * (tctl - self.temp))
+        skin = t[FIELD_INDEX['apu_skin_temp_limit']]
+        allowed = min(allowed, (skin - AMBIENT) / SKIN_RES + 4.0 * (skin - self.skin))
+        return max(IDLE_POWER, allowed)
+
+    def advance(self, dt):
+        """Advance the model by dt simulated seconds."""
+        while dt > 0:
+            h = min(dt, 0.1)
+            self.sim_time += h
+            self.power = min(self.demand(), self.allowed_power())
+            self.slow_avg += (self.power - self.slow_avg) * (1 - math.exp(-h / SLOW_TAU))
+            self.stapm_avg += (self.power - self.stapm_avg) * (1 - math.exp(-h / STAPM_TAU))
+            self.temp += (AMBIENT + self.power * THERMAL_RES - self.temp) * (1 - math.exp(-h / THERMAL_TAU))
+            self.skin += (AMBIENT + self.power * SKIN_RES - self.skin) * (1 - math.exp(-h / SKIN_TAU))
+            dt -= h
+        # Clocks scale with roughly the cube root of power
+        share = max(0.0, (self.power - IDLE_POWER) / (MAX_DEMAND - IDLE_POWER))
+        self.clock = BASE_CLOCK + (MAX_CLOCK - BASE_CLOCK) * share ** (1 / 3)
+
+        revert = self.faults.revert_every
+        if revert and self.sim_time - self.last_revert >= revert:
+            self.last_revert = self.sim_time
+            self.reset_limits()
+        self.publish()
+
+    def publish(self):
+        t = self.table
+        core_current = self.power * (1 - SOC_SHARE) / CORE_VOLTAGE
+        soc_current = self.power * SOC_SHARE / CORE_VOLTAGE
+        t[FIELD_INDEX['stapm_value']] = self.stapm_avg
+        t[FIELD_INDEX['fast_value']] = self.power
+        t[FIELD_INDEX['slow_value']] = self.slow_avg
+        t[FIELD_INDEX['apu_slow_value']] = self.slow_avg
+        t[FIELD_INDEX['vrm_current_value']] = core_current
+        t[FIELD_INDEX['vrmmax_current_value']] = core_current
+        t[FIELD_INDEX['vrmsoc_current_value']] = soc_current
+        t[FIELD_INDEX['vrmsocmax_current_value']] = soc_current
+        t[FIELD_INDEX['tctl_temp_value']] = self.temp
+        t[FIELD_INDEX['apu_skin_temp_value']] = self.skin
+        t[FIELD_INDEX['dgpu_skin_temp_value']] = AMBIENT
+        # Entries the GUI map reads (powers stored 10x)
+        t[26] = self.clock
+        t[27] = BASE_CLOCK
+        t[81] = self.stapm_avg * 10
+        t[84] = self.power * 10
+        t[85] = self.slow_avg * 10
+        t[165] = self.skin
+        t[169] = self.temp
+
+    def _refresh(self, ry):
+        self.delay()
+        if self.faults.refresh_error:
+            return self.faults.refresh_error
+        if self.step is not None:
+            dt = self.step
+        else:
+            now = time.monotonic()
+            dt, self.wall = now - self.wall, now
+        self.advance(dt)
+        return 0
+
+    def _set(self, field, ry, value=None):
+        self.delay()
+        code = self.faults.set_errors.get(field)
+        if code:
+            return code
+        return super()._set(field, ry, value)
+
+    def reset_limits(self):
+        for index, value in DEFAULT_TABLE.items():
+            if index in LIMIT_INDICES:
+                self.table[index] = value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulated ryzenadj')
+    parser.add_argument('--dump-table', action='store_true', help='Print the PM table like ryzenadj.exe')
+    parser.add_argument('--seconds', type=float, default=60.0, help='Simulated time before dumping')
+    parser.add_argument('--load', type=float, help='Constant load 0..1 instead of bursts')
+    parser.add_argument('--hang', type=float, default=0.0, help='Seconds to sleep before answering')
+    parser.add_argument('--fail', action='store_true', help='Fail like ryzenadj.exe without access to the SMU')
+    args, _ = parser.parse_known_args(argv)  # ignore ryzenadj set arguments
+    time.sleep(args.hang)
+    if args.fail:
+        print("Unable to init ryzenadj, check permission", file=sys.stderr)
+        return 1
+    lib = SimulatedRyzenAdjLib(load=burst_load if args.load is None else args.load, step=1.0)
+    lib.advance(args.seconds)
+    if args.dump_table:
+        sys.stdout.write(dump_table_text(lib))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,411 @@
+"""Power-limit sweep: measure performance per watt and keep the Pareto front.
+
+Every point of the search applies a set of power / current limits, lets the
+system settle under a fixed workload, then measures throughput, package
+power and temperature over a window. Points nothing else beats on all of
+throughput, watts and temperature form the Pareto frontier; the most
+efficient of them can be saved as [Profile.<name>] sections.
+
+    python -m tools.sweep --backend simulator
+    python -m tools.sweep --grid stapm=15000:45000:10000 fast=25000:55000:10000
+    python -m tools.sweep --adaptive --rounds 8 --save 3
+
+Against tools.simulator the workload is simulated as well (throughput is the
+modelled core clock) and the whole sweep runs in simulated time, in seconds
+of wall-clock. Elsewhere a pool of processes hashes data for the window and
+throughput is hashes per second; each point then takes real time.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import configparser
+import multiprocessing
+from collections import namedtuple
+
+from tools.ryzenadj import PARAMETERS
+from tools.telemetry import open_backend
+from tools.pmtable import SnapshotRing
+from tools.apply import ApplyPipeline
+from tools.profiles import SETTINGS_PATH, save_profile, write_config
+
+# Keys that may be swept: the power and current limit groups
+SWEEP_KEYS = [key for group in ('Power Limits', 'Current Limits') for key, _ in PARAMETERS[group]]
+
+# Default search: the three power limits, in mW
+DEFAULT_GRID = {
+    'stapm': (10000, 50000, 10000),
+    'slow': (10000, 50000, 10000),
+    'fast': (15000, 55000, 10000),
+}
+
+# One measured point; power in W, temperatures in °C
+Result = namedtuple('Result', 'limits throughput power temp peak_temp')
+
+
+def efficiency(result):
+    return result.throughput / result.power if result.power > 0 else 0.0
+
+
+# Ordered limits, each at most the next; valid() checks neighbours that are set
+ORDER = ('stapm', 'slow', 'fast')
+
+
+def valid(limits):
+    """STAPM <= slow <= fast where set; firmware rejects or reorders the rest."""
+    stapm, slow, fast = limits.get('stapm'), limits.get('slow'), limits.get('fast')
+    if stapm is not None and slow is not None and stapm > slow:
+        return False
+    if slow is not None and fast is not None and slow > fast:
+        return False
+    return True
+
+
+def parse_grid(specs):
+    """['stapm=15000:45000:10000', 'fast=30000'] -> {key: (first, last, step)}."""
+    grid = {}
+    for spec in specs:
+        key, sep, value = spec.partition('=')
+        if not sep or key not in SWEEP_KEYS:
+            raise ValueError(f"{spec}: expected <key>=<first>[:<last>:<step>] with key in {', '.join(SWEEP_KEYS)}")
+        parts = [int(float(p)) for p in value.split(':')]
+        if len(parts) == 1:
+            parts = [parts[0], parts[0], 1]
+        if len(parts) != 3 or parts[2] <= 0 or parts[1] < parts[0]:
+            raise ValueError(f"{spec}: expected first <= last and a positive step")
+        grid[key] = tuple(parts)
+    return grid
+
+
+def move(limits, key, value, grid):
+    """limits with key at value, and the limits ordered against it pushed
+    along onto their own grid so STAPM <= slow <= fast still holds; None
+    when one would have to leave its range."""
+    moved = dict(limits, **{key: value})
+    if key in ORDER:
+        i = ORDER.index(key)
+        # Up the order: raise what is now below us; down it: lower what is above
+        for above, below in zip(ORDER[i + 1:], ORDER[i:]):
+            if above not in moved:
+                break
+            if moved[above] < moved[below]:
+                if above not in grid:
+                    return None
+                first, last, step = grid[above]
+                moved[above] = snap_up(moved[below], first, step)
+        for below, above in zip(ORDER[i - 1::-1] if i else (), ORDER[i:0:-1]):
+            if below not in moved:
+                break
+            if moved[below] > moved[above]:
+                if below not in grid:
+                    return None
+                first, last, step = grid[below]
+                moved[below] = snap(moved[above], first, step)
+    for k, (first, last, step) in grid.items():
+        if not first <= moved[k] <= last:
+            return None
+    return moved if valid(moved) else None
+
+
+def grid_points(grid):
+    points = [{}]
+    for key, (first, last, step) in grid.items():
+        points = [dict(p, **{key: v}) for p in points for v in range(first, last + 1, step)]
+    return [p for p in points if valid(p)]
+
+
+def dominates(a, b):
+    """a is at least as good as b everywhere and better somewhere."""
+    at_least = (a.throughput >= b.throughput and a.power <= b.power and a.temp <= b.temp)
+    better = (a.throughput > b.throughput or a.power < b.power or a.temp < b.temp)
+    return at_least and better
+
+
+def pareto_front(results):
+    """Non-dominated results, most efficient first."""
+    front = [r for r in results if not any(dominates(o, r) for o in results)]
+    front.sort(key=efficiency, reverse=True)
+    return front
+
+
+def hash_kernel(window):
+    # Worker process: hash a fixed block until the window is over
+    block = os.urandom(1 << 16)
+    count = 0
+    deadline = time.perf_counter() + window
+    while time.perf_counter() < deadline:
+        for _ in range(16):
+            hashlib.sha256(block).digest()
+        count += 16
+    return count
+
+
+class ProcessWorkload:
+    """`processes` workers hashing in parallel; throughput in hashes per second."""
+
+    def __init__(self, processes=None, interval=1.0):
+        self.processes = processes or os.cpu_count() or 1
+        self.interval = interval
+        self.pool = None
+
+    def start(self):
+        # spawn: the same behaviour on Windows and elsewhere
+        self.pool = multiprocessing.get_context('spawn').Pool(self.processes)
+
+    def run(self, window, sample):
+        """Load every worker for `window` seconds, calling sample() every interval."""
+        job = self.pool.map_async(hash_kernel, [window] * self.processes)
+        while not job.ready():
+            sample()
+            job.wait(self.interval)
+        return sum(job.get()) / window
+
+    def idle(self, seconds, sample):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            sample()
+            time.sleep(self.interval)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+class SimulatedWorkload:
+    """Full load on a tools.simulator backend; throughput is core clock x cores
+    (MHz), in simulated time: every sample() advances the model one step."""
+
+    def __init__(self, lib, cores=8, step=1.0):
+        self.lib = lib
+        self.cores = cores
+        self.step = step
+        lib.step = step
+
+    def start(self):
+        pass
+
+    def run(self, window, sample):
+        self.lib.load = 1.0
+        work = 0.0
+        for _ in range(max(1, round(window / self.step))):
+            sample()
+            work += self.lib.clock * self.cores * self.step
+        return work / window
+
+    def idle(self, seconds, sample):
+        self.lib.load = 0.0
+        for _ in range(round(seconds / self.step)):
+            sample()
+
+    def close(self):
+        pass
+
+
+class Sweep:
+    def __init__(self, backend, workload, window=60.0, settle=30.0, cooldown=30.0,
+                 power_field='ppt-fast', temp_field='thm-core', log=None):
+        self.backend = backend
+        self.workload = workload
+        self.window = window
+        self.settle = settle
+        self.cooldown = cooldown
+        self.power_field = power_field
+        self.temp_field = temp_field
+        self.log = log or (lambda message: None)
+        self.pipeline = ApplyPipeline(lambda: backend)
+        self.snapshots = SnapshotRing()
+        self.results = {}  # frozen limits -> Result
+        self.samples = None
+
+    def sample(self):
+        backend = self.backend
+        slot = self.snapshots.acquire(backend.table_size, backend.table_version)
+        with backend.lock:
+            backend.read_into(slot)
+        snapshot = self.snapshots.publish(slot)
+        if self.samples is not None:
+            self.samples.append((snapshot.get(self.power_field, float('nan')),
+                                 snapshot.get(self.temp_field, float('nan'))))
+
+    def measure(self, limits):
+        key = tuple(sorted(limits.items()))
+        if key in self.results:
+            return self.results[key]
+        report = self.pipeline.apply(limits)
+        failed = {k: r.message for k, r in report.items() if r.code}
+        if failed:
+            self.log(f"{limits}: not applied ({failed})")
+            return None
+        self.samples = None
+        if self.cooldown:
+            self.workload.idle(self.cooldown, self.sample)
+        if self.settle:
+            self.workload.run(self.settle, self.sample)
+        self.samples = []
+        throughput = self.workload.run(self.window, self.sample)
+        samples = [s for s in self.samples if s[0] == s[0] and s[1] == s[1]]
+        self.samples = None
+        if not samples:
+            self.log(f"{limits}: no {self.power_field} / {self.temp_field} readings")
+            return None
+        result = Result(dict(limits), throughput,
+                        sum(s[0] for s in samples) / len(samples),
+                        sum(s[1] for s in samples) / len(samples),
+                        max(s[1] for s in samples))
+        self.results[key] = result
+        self.log(describe(result))
+        return result
+
+    def grid(self, grid):
+        for limits in grid_points(grid):
+            self.measure(limits)
+        return list(self.results.values())
+
+    def adaptive(self, grid, rounds=8, min_throughput=0.0):
+        """Coordinate search for the best throughput per watt.
+
+        Starts from the lowest valid point around the middle of every range
+        with steps of half a range, moves to the best neighbour while one
+        improves and halves the steps when none does. A neighbour moves one
+        key; the limits ordered against it (see move()) follow, so a step
+        is not lost to an invalid STAPM / slow / fast order. With
+        min_throughput (a fraction of the throughput at the top of every
+        range) slower points do not count as improvements.
+        """
+        top = self.measure({k: last for k, (first, last, step) in grid.items()})
+        floor = top.throughput * min_throughput if top else 0.0
+
+        def score(result):
+            if result is None or result.throughput < floor:
+                return -1.0
+            return efficiency(result)
+
+        current = {k: snap(first + (last - first) // 2, first, step) for k, (first, last, step) in grid.items()}
+        # Lowest valid midpoint: from the top of the order down, bounded limits come down
+        for key in reversed(ORDER):
+            if key in current:
+                current = move(current, key, current[key], grid) or current
+        steps = {k: max(step, snap((last - first) // 2, 0, step)) for k, (first, last, step) in grid.items()}
+        best = self.measure(current) if valid(current) else None
+        for _ in range(rounds):
+            candidates = []
+            for key in grid:
+                for sign in (-1, 1):
+                    candidate = move(current, key, current[key] + sign * steps[key], grid)
+                    if candidate is not None and candidate != current and candidate not in candidates:
+                        candidates.append(candidate)
+            scored = [(score(self.measure(c)), c) for c in candidates]
+            scored.sort(key=lambda s: s[0], reverse=True)
+            if scored and scored[0][0] > score(best):
+                current = scored[0][1]
+                best = self.results[tuple(sorted(current.items()))]
+            elif all(steps[k] <= grid[k][2] for k in grid):
+                break  # finest steps and no better neighbour
+            else:
+                steps = {k: max(grid[k][2], snap(s // 2, 0, grid[k][2])) for k, s in steps.items()}
+        return list(self.results.values())
+
+    def restore(self, limits):
+        if limits:
+            self.pipeline.apply(limits)
+
+
+def snap(value, origin, step):
+    """value rounded down onto origin + n * step."""
+    return origin + (value - origin) // step * step
+
+
+def snap_up(value, origin, step):
+    """value rounded up onto origin + n * step."""
+    return origin - (origin - value) // step * step
+
+
+def describe(result):
+    limits = ' '.join(f"{k}={v}" for k, v in result.limits.items())
+    return (f"{limits:<40} throughput {result.throughput:12.1f}  {result.power:6.2f} W  "
+            f"{result.temp:5.1f} °C (peak {result.peak_temp:5.1f})  {efficiency(result):9.2f} per W")
+
+
+def save_profiles(results, count, prefix, path=SETTINGS_PATH):
+    config = configparser.ConfigParser()
+    config.read(path)
+    names = []
+    for i, result in enumerate(results[:count], 1):
+        name = f"{prefix}-{i}"
+        save_profile(config, name, result.limits)
+        names.append(name)
+    write_config(config, path)
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sweep power limits and report the performance per watt frontier')
+    parser.add_argument('--backend', default='auto', help='Telemetry backend (simulator runs in simulated time)')
+    parser.add_argument('--config', default=SETTINGS_PATH, help='settings.ini for ra_path and profiles')
+    parser.add_argument('--grid', nargs='*', default=[], metavar='KEY=FIRST:LAST:STEP',
+                        help=f"Limits to sweep, in mW / mA; keys: {', '.join(SWEEP_KEYS)}")
+    parser.add_argument('--adaptive', action='store_true', help='Coordinate search instead of the full grid')
+    parser.add_argument('--rounds', type=int, default=8)
+    parser.add_argument('--min-throughput', type=float, default=0.0,
+                        help='Adaptive: ignore points below this fraction of the throughput at maximum limits')
+    parser.add_argument('--window', type=float, default=60.0, help='Seconds measured per point')
+    parser.add_argument('--settle', type=float, default=30.0, help='Seconds under load before measuring')
+    parser.add_argument('--cooldown', type=float, default=30.0, help='Seconds idle before each point')
+    parser.add_argument('--processes', type=int, help='Workload processes (default: one per CPU)')
+    parser.add_argument('--power-field', default='ppt-fast')
+    parser.add_argument('--temp-field', default='thm-core')
+    parser.add_argument('--json', help='Write every result to this file')
+    parser.add_argument('--save', type=int, default=0, metavar='N', help='Save the N most efficient frontier points as profiles')
+    parser.add_argument('--prefix', default='sweep', help='Profile name prefix for --save')
+    args = parser.parse_args(argv)
+
+    try:
+        grid = parse_grid(args.grid) if args.grid else dict(DEFAULT_GRID)
+    except ValueError as e:
+        parser.error(str(e))
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {}})
+    config.read(args.config)
+    backend = open_backend(config['Settings'].get('ra_path', 'ryzenadj.exe'), args.backend)
+    if args.backend == 'simulator':
+        workload = SimulatedWorkload(backend.lib, cores=args.processes or 8)
+    else:
+        workload = ProcessWorkload(args.processes)
+
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    sweep = Sweep(backend, workload, args.window, args.settle, args.cooldown,
+                  args.power_field, args.temp_field, log)
+    sweep.pipeline.sync()
+    original = {k: v for k, v in sweep.pipeline.applied.items() if k in grid}
+    workload.start()
+    try:
+        if args.adaptive:
+            results = sweep.adaptive(grid, args.rounds, args.min_throughput)
+        else:
+            results = sweep.grid(grid)
+    except KeyboardInterrupt:
+        results = list(sweep.results.values())
+    finally:
+        workload.close()
+        sweep.restore(original)
+        backend.close()
+
+    front = pareto_front(results)
+    print(f"{len(results)} points measured, {len(front)} on the Pareto frontier:")
+    for result in front:
+        print(describe(result))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'results': [r._asdict() for r in results],
+                       'frontier': [r._asdict() for r in front]}, f, indent=2)
+    if args.save and front:
+        names = save_profiles(front, args.save, args.prefix, args.config)
+        print("Saved profiles: " + ", ".join(names))
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
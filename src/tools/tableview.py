@@ -0,0 +1,97 @@
+"""Display strings and filtering for PM table views.
+
+Labels, offsets and units depend only on the layout and are built once per
+layout. Values and hex words are formatted the first time a row is drawn
+after a refresh and then reused until the next snapshot, so a frame costs
+the rows on screen, not the size of the table.
+"""
+
+
+def format_value(value, whole=False):
+    if value != value:
+        return 'NaN'
+    return f"{value:.0f}" if whole else f"{value:.2f}"
+
+
+class TableView:
+    def __init__(self):
+        self.layout = None
+        self.snapshot = None
+        self.version = None
+        # Per table index, built per layout
+        self.labels = []
+        self.offsets = []
+        self.units = []
+        self.scales = []
+        self.named = []
+        self.whole = []   # shown without decimals (clocks)
+        self.search = []  # lower-case label and offset
+        self.index = {}   # field name -> table index
+        # Per table index, per snapshot
+        self.values = []
+        self.hexes = []
+        # Filtered indices and what they were computed for
+        self.rows = []
+        self.filter_key = None
+
+    def sync(self, snapshot):
+        """Point the view at the snapshot to draw; cheap when nothing changed."""
+        layout = snapshot.layout
+        if layout is not self.layout or len(self.labels) != snapshot.size:
+            size = snapshot.size
+            self.layout = layout
+            self.offsets = [f"0x{i * 4:04x}" for i in range(size)]
+            self.labels = list(self.offsets)
+            self.units = [''] * size
+            self.scales = [1.0] * size
+            self.named = [False] * size
+            self.whole = [False] * size
+            self.index = {}
+            for name, (i, scale, unit) in layout.fields.items():
+                self.index[name] = i
+                if layout.raw:
+                    continue
+                self.labels[i] = name.replace('-', ' ').title()
+                self.units[i] = unit
+                self.scales[i] = scale
+                self.named[i] = True
+                self.whole[i] = 'freq' in name
+            self.search = [f"{label.lower()} {offset}" for label, offset in zip(self.labels, self.offsets)]
+            self.filter_key = None
+        if snapshot is not self.snapshot or snapshot.version != self.version:
+            self.snapshot = snapshot
+            self.version = snapshot.version
+            self.values = [None] * snapshot.size
+            self.hexes = [None] * snapshot.size
+
+    def value(self, i):
+        text = self.values[i]
+        if text is None:
+            value = format_value(self.snapshot.values[i] * self.scales[i], self.whole[i])
+            text = self.values[i] = f"{value} {self.units[i]}" if self.units[i] else value
+        return text
+
+    def hex(self, i):
+        text = self.hexes[i]
+        if text is None:
+            text = self.hexes[i] = f"0x{self.snapshot.bits[i]:08x}"
+        return text
+
+    def filter(self, query='', named_only=False, hide_zero=False):
+        """Table indices matching the search (label or offset) and filters."""
+        key = (query, named_only, hide_zero, self.version if hide_zero else None)
+        if key == self.filter_key:
+            return self.rows
+        query = query.strip().lower()
+        rows = range(len(self.labels))
+        if named_only:
+            rows = [i for i in rows if self.named[i]]
+        if query:
+            search = self.search
+            rows = [i for i in rows if query in search[i]]
+        if hide_zero:
+            values = self.snapshot.values
+            rows = [i for i in rows if values[i] != 0.0]
+        self.rows = list(rows)
+        self.filter_key = key
+        return self.rows
@@ -0,0 +1,247 @@
+import os
+import sys
+import subprocess
+import threading
+from ctypes import cdll, c_void_p, c_float, c_ulong, POINTER
+from shutil import copyfile
+from tools.pmtable import PMTableSnapshot
+from tools.instrument import INSTRUMENTS
+
+
+def parse_dump_table(text, snapshot):
+    """Parse the output of `ryzenadj --dump-table` straight into a snapshot slot."""
+    values = snapshot.values
+    snapshot.table_version = 0
+    snapshot.decoded = None
+    count = 0
+
+    for line in text.splitlines():
+        if line.startswith('PM Table Version:'):
+            snapshot.table_version = int(line.split(':')[1], 16)
+            continue
+        parts = [p.strip() for p in line.split('|') if p.strip()]
+        if len(parts) >= 3:
+            try:
+                index = int(parts[0], 16) // 4
+            except ValueError:
+                continue  # Skip header
+            if index >= snapshot.size:
+                continue
+            try:
+                values[index] = float(parts[2])
+            except ValueError:
+                values[index] = float('nan')
+            count = max(count, index + 1)
+    return count
+
+
+def load_library(lib_path):
+    """Load libryzenadj from lib_path the same way readjust.py does."""
+    if sys.platform == 'win32' or sys.platform == 'cygwin':
+        try:
+            os.add_dll_directory(lib_path)
+        except AttributeError:
+            pass #not needed for old python version
+
+        winring0_driver_file_path = os.path.join(os.path.dirname(os.path.abspath(sys.executable)), 'WinRing0x64.sys')
+        if not os.path.isfile(winring0_driver_file_path):
+            copyfile(os.path.join(lib_path, 'WinRing0x64.sys'), winring0_driver_file_path)
+
+        return cdll.LoadLibrary(os.path.join(lib_path, 'libryzenadj.dll'))
+    return cdll.LoadLibrary(os.path.join(lib_path, 'libryzenadj.so'))
+
+
+class TelemetryBackend:
+    """Source of PM table samples. Subclasses implement read_into()."""
+    name = 'none'
+    table_size = 0
+    table_version = 0
+
+    def __init__(self):
+        # Held around every call sequence that must not interleave with
+        # another thread's (refresh + read, set + read back)
+        self.lock = threading.RLock()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read_into(self, snapshot):
+        """Refresh the PM table and copy it into a tools.pmtable snapshot slot."""
+        raise NotImplementedError
+
+
+class DumpTableBackend(TelemetryBackend):
+    """Fallback: spawn `ryzenadj --dump-table` for every refresh."""
+    name = 'ryzenadj.exe'
+
+    def __init__(self, command, timeout=10.0):
+        super().__init__()
+        self.command = [command] if isinstance(command, str) else list(command)
+        self.timeout = timeout  # a hung ryzenadj.exe is killed after this
+        self.table_size = 0
+
+    def dump_table(self):
+        proc = subprocess.run(self.command + ['--dump-table'],
+                              capture_output=True, text=True, check=True,
+                              timeout=self.timeout)
+        return proc.stdout
+
+    def open(self):
+        if not self.table_size:
+            # Learn the table size once, later dumps are parsed in place
+            probe = PMTableSnapshot(4096)
+            self.table_size = parse_dump_table(self.dump_table(), probe)
+            self.table_version = probe.table_version
+
+    def read_into(self, snapshot):
+        self.open()
+        with INSTRUMENTS.span('telemetry.spawn'):
+            text = self.dump_table()
+        with INSTRUMENTS.span('telemetry.parse'):
+            parse_dump_table(text, snapshot)
+        self.table_version = snapshot.table_version
+
+
+class LibRyzenAdjBackend(TelemetryBackend):
+    """Keeps one init_ryzenadj() handle open and reads the PM table in-process.
+
+    `lib` can be any object with the libryzenadj call surface, e.g.
+    tools.fakeadj.FakeRyzenAdjLib, so the path runs without AMD hardware.
+    """
+    name = 'libryzenadj'
+
+    def __init__(self, lib_path=None, lib=None):
+        super().__init__()
+        self.lib_path = lib_path
+        self.lib = lib
+        self.ry = None
+        self.table = None
+        self.table_size = 0
+        self.table_version = 0
+        self.functions = {}
+
+    def open(self):
+        if self.ry:
+            return
+        if self.lib is None:
+            self.lib = load_library(self.lib_path)
+        lib = self.lib
+
+        # define ctype mappings for types which can not be mapped automatically
+        lib.init_ryzenadj.restype = c_void_p
+        lib.get_table_ver.argtypes = [c_void_p]
+        lib.get_table_size.argtypes = [c_void_p]
+        lib.get_table_values.restype = POINTER(c_float)
+        lib.get_table_values.argtypes = [c_void_p]
+        lib.refresh_table.argtypes = [c_void_p]
+
+        ry = lib.init_ryzenadj()
+        if not ry:
+            raise RuntimeError("RyzenAdj could not get initialized")
+        self.ry = ry
+
+        if lib.refresh_table(ry):
+            raise RuntimeError("RyzenAdj could not read the PM table")
+        self.table_version = lib.get_table_ver(ry)
+        self.table_size = lib.get_table_size(ry) // 4
+        self.table = lib.get_table_values(ry)
+
+    def close(self):
+        # Waits out a read still running on a caller that gave up on it, so
+        # the table is not freed under it
+        with self.lock:
+            if self.ry and hasattr(self.lib, 'cleanup_ryzenadj'):
+                self.lib.cleanup_ryzenadj.argtypes = [c_void_p]
+                self.lib.cleanup_ryzenadj(self.ry)
+            self.ry = None
+            self.table = None
+            self.functions = {}
+
+    def function(self, name, argtypes, restype=None):
+        fn = self.functions.get(name)
+        if fn is None:
+            fn = getattr(self.lib, name)
+            fn.argtypes = argtypes
+            if restype is not None:
+                fn.restype = restype
+            self.functions[name] = fn
+        return fn
+
+    def refresh(self):
+        self.open()
+        res = self.lib.refresh_table(self.ry)
+        if res:
+            raise RuntimeError(f"refresh_table did fail with {res}")
+
+    def read_into(self, snapshot):
+        with INSTRUMENTS.span('telemetry.refresh'):
+            self.refresh()
+        snapshot.fill_from(self.table)
+        snapshot.table_version = self.table_version
+
+    def adjust(self, field, value):
+        """Call set_<field>(ry, value); returns the libryzenadj result code."""
+        self.open()
+        return self.function('set_' + field, [c_void_p, c_ulong])(self.ry, value)
+
+    def enable(self, field):
+        self.open()
+        return self.function('set_' + field, [c_void_p])(self.ry)
+
+    def read_field(self, field):
+        """get_<field>(ry) from the last refreshed table."""
+        self.open()
+        return self.function('get_' + field, [c_void_p], c_float)(self.ry)
+
+
+BACKENDS = ['auto', 'service', 'libryzenadj', 'ryzenadj.exe', 'fake', 'simulator', 'replay']
+
+
+def open_backend(ra_path, kind='auto', replay_path=None):
+    """Open a telemetry backend for the given ryzenadj.exe path.
+
+    'auto' prefers a running tools.service control service, then the
+    in-process libryzenadj next to ra_path, and falls back to spawning
+    ryzenadj.exe when the library can not be loaded. 'fake' and
+    'simulator' need no hardware; 'replay' plays back a tools.recorder
+    recording from replay_path.
+    """
+    if kind == 'replay':
+        from tools.recorder import ReplayBackend
+        backend = ReplayBackend(replay_path)
+        backend.open()
+        return backend
+
+    if kind in ('fake', 'simulator'):
+        if kind == 'fake':
+            from tools.fakeadj import FakeRyzenAdjLib as Lib
+        else:
+            from tools.simulator import SimulatedRyzenAdjLib as Lib
+        backend = LibRyzenAdjBackend(lib=Lib())
+        backend.name = kind
+        backend.open()
+        return backend
+
+    if kind in ('auto', 'service'):
+        from tools.service import ServiceBackend, ServiceError
+        backend = ServiceBackend()
+        try:
+            backend.open()
+            return backend
+        except ServiceError:
+            if kind == 'service':
+                raise
+
+    if kind in ('auto', 'libryzenadj'):
+        backend = LibRyzenAdjBackend(os.path.dirname(os.path.abspath(ra_path)))
+        try:
+            backend.open()
+            return backend
+        except (OSError, AttributeError, RuntimeError):
+            if kind == 'libryzenadj':
+                raise
+
+    return DumpTableBackend(ra_path)
@@ -0,0 +1,193 @@
+"""Headless watchdog: reapply a limit profile when firmware reverts it.
+
+Replaces ryzenadj/readjust.py and the monitorField / monitorPowerSlider loop
+of readjustService.ps1. Run from src/ with `python -m tools.watchdog` or
+`main.py --daemon`.
+
+When the control service (tools.service) runs, the watchdog is one of its
+clients: reapplies are batched with everyone else's writes there instead
+of reaching the SMU behind its back.
+"""
+import sys
+import time
+import argparse
+import threading
+import configparser
+
+from tools.ryzenadj import RA_FIELDS, describe_error
+from tools.telemetry import open_backend
+from tools.apply import read_limits
+from tools.profiles import SETTINGS_PATH, DEFAULT_PROFILE, load_profile
+
+
+def read_power_slider():
+    """Windows power slider overlay scheme GUIDs (AC, DC), None elsewhere."""
+    if sys.platform != 'win32':
+        return None
+    import winreg
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                            r"SYSTEM\ControlSet001\Control\Power\User\PowerSchemes") as key:
+            return (winreg.QueryValueEx(key, "ActiveOverlayACPowerScheme")[0],
+                    winreg.QueryValueEx(key, "ActiveOverlayDCPowerScheme")[0])
+    except OSError:
+        return None
+
+
+def log(message):
+    print(time.strftime('%H:%M:%S'), message, flush=True)
+
+
+class Watchdog:
+    """Polls the applied limits and reapplies only the ones that drifted.
+
+    After every apply the values read back become the reference, since the
+    SMU may clamp a request (e.g. to 90% on battery). The poll interval grows
+    by `backoff` while nothing changes and drops to `min_interval` after a
+    revert.
+
+    `backend` is an in-process one (adjust / read_field) or a
+    tools.service.ServiceBackend (apply / limits).
+    """
+
+    def __init__(self, backend, profile, min_interval=1.0, max_interval=30.0,
+                 backoff=1.5, log=log):
+        self.backend = backend
+        self.targets = {k: v for k, v in profile.items() if k in RA_FIELDS}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.log = log
+        self.expected = {}  # key -> value read back after our last apply
+        self.interval = min_interval
+        self.slider = read_power_slider()
+        self.reapplies = 0
+
+    def apply(self, keys):
+        if hasattr(self.backend, 'adjust'):
+            with self.backend.lock:
+                for key in keys:
+                    field = RA_FIELDS[key]
+                    res = self.backend.adjust(field.setter, self.targets[key])
+                    if res:
+                        self.log(describe_error('set_' + field.setter, res))
+        else:
+            # Forced: the service still counts the reverted values as applied
+            report = self.backend.apply({key: self.targets[key] for key in keys}, force=True)
+            for result in report.values():
+                if result.code:
+                    self.log(result.message)
+        current = self.read()
+        for key in keys:
+            if RA_FIELDS[key].getter is None:
+                continue
+            if key in current:
+                self.expected[key] = current[key]
+            else:
+                self.expected.pop(key, None)  # the getter is unsupported here
+
+    def read(self):
+        """Current value per key with a getter, in set_* units."""
+        if hasattr(self.backend, 'adjust'):
+            return read_limits(self.backend)
+        return self.backend.limits(current=True)
+
+    def drifted(self):
+        current = self.read()
+        keys = []
+        for key, expected in self.expected.items():
+            value = current.get(key)
+            if value != expected:
+                self.log(f"{key} unexpectedly changed from {expected} to {value}")
+                keys.append(key)
+        return keys
+
+    def step(self):
+        """One poll; returns the seconds to wait before the next one."""
+        slider = read_power_slider()
+        if slider != self.slider:
+            self.slider = slider
+            self.log("Power slider changed")
+            keys = list(self.targets)
+        else:
+            keys = self.drifted()
+            if keys:
+                # Fields without a getter can't be checked, resend them with any revert
+                keys += [k for k in self.targets if RA_FIELDS[k].getter is None]
+
+        if keys:
+            self.reapplies += 1
+            self.log("reapply " + ", ".join(keys))
+            self.apply(keys)
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        self.apply(list(self.targets))
+        self.log(f"Monitoring {len(self.targets)} limits")
+        interval = self.min_interval
+        while not stop.wait(interval):
+            try:
+                interval = self.step()
+            except Exception as e:
+                self.log(f"Error: {e}")
+                interval = self.max_interval
+
+
+def open_watchdog_backend(settings, backend_kind=None):
+    """The control service when it runs (and no backend is forced), otherwise
+    an in-process handle."""
+    from tools.service import ServiceBackend, service_available
+    if backend_kind is None and service_available():
+        backend = ServiceBackend()
+        backend.open()
+        return backend
+    kind = backend_kind or settings.get('telemetry_backend', 'auto')
+    if kind in ('auto', 'service', 'ryzenadj.exe'):
+        kind = 'libryzenadj'  # writes need the in-process handle
+    return open_backend(settings.get('ra_path', 'ryzenadj.exe'), kind)
+
+
+def run_daemon(config, profile_name=DEFAULT_PROFILE, backend_kind=None,
+               min_interval=1.0, max_interval=30.0):
+    settings = config['Settings']
+    profile = load_profile(config, profile_name)
+    if not profile:
+        log(f"Profile '{profile_name}' is empty, nothing to apply")
+        return 1
+    try:
+        backend = open_watchdog_backend(settings, backend_kind)
+    except Exception as e:
+        log(f"RyzenAdj could not get initialized: {e}")
+        return 1
+    log(f"Writing through {backend.name}")
+    watchdog = Watchdog(backend, profile, min_interval, max_interval)
+    try:
+        watchdog.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reapply a Better Ryzen Controller profile when it gets reverted')
+    parser.add_argument('--config', default=SETTINGS_PATH, help='settings.ini to read profiles from')
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help='Profile name')
+    parser.add_argument('--backend', choices=['libryzenadj', 'fake'], help='Override telemetry_backend')
+    parser.add_argument('--min-interval', type=float, default=1.0)
+    parser.add_argument('--max-interval', type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read_dict({'Settings': {}})
+    config.read(args.config)
+    return run_daemon(config, args.profile, args.backend, args.min_interval, args.max_interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())